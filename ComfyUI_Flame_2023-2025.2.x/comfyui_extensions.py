@@ -10,16 +10,247 @@ including queue management, real-time progress monitoring, and workflow presets.
 """
 
 import os
+import atexit
+import hashlib
+import importlib
 import json
+import math
+import mmap
+import random
+import re
+import struct
 import time
 import threading
 import queue
 import uuid
+import weakref
+import zlib
+from collections import Counter, OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime
 from enum import Enum
-import websocket
-import requests
-from typing import Dict, List, Optional, Callable, Any
+from io import BytesIO
+from typing import Dict, List, Optional, Callable, Any, Tuple
+
+# Try to import flame module when run in Flame
+try:
+    import flame
+except ImportError:
+    flame = None
+
+# Network dependencies (websocket-client, requests) are optional and imported on
+# first use, so the logging and queue helpers load fast and work without them
+_optional_modules: Dict[str, Any] = {}
+
+def optional_import(name: str):
+    """Import an optional dependency the first time it is needed; None if it isn't installed"""
+    if name not in _optional_modules:
+        try:
+            _optional_modules[name] = importlib.import_module(name)
+        except ImportError:
+            _optional_modules[name] = None
+    return _optional_modules[name]
+
+# =============================================================================
+# EVENT BUS
+# =============================================================================
+
+class EventSubscription:
+    """A subscriber and the events queued for it"""
+
+    __slots__ = ('event', 'callback', 'main_thread', 'pending', 'dropped', 'retired')
+
+    def __init__(self, event: str, callback: Callable, main_thread: bool = False):
+        self.event = event
+        self.callback = callback
+        self.main_thread = main_thread
+        # key -> (args, kwargs); coalesced events reuse their key and keep their position
+        self.pending: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.dropped = 0
+        # Retired subscriptions are removed once their pending events are delivered
+        self.retired = False
+
+class EventBus:
+    """
+    Asynchronous, coalescing event dispatch.
+
+    Publishing never runs subscriber code: events are queued per subscriber and
+    delivered by a dedicated dispatcher thread, so a slow callback cannot stall
+    the thread that publishes. Events published with a coalesce_key only keep
+    their latest value until they are delivered. Subscribers registered with
+    main_thread=True receive their events in batches on Flame's main thread
+    (flame.PyCallback), at most ui_rate_hz times per second.
+    """
+
+    def __init__(self, name: str = "events", ui_rate_hz: float = 10.0, max_pending: int = 1000):
+        self.name = name
+        self.ui_interval = 1.0 / ui_rate_hz if ui_rate_hz > 0 else 0.0
+        self.max_pending = max_pending
+        self.subscriptions: Dict[str, List[EventSubscription]] = {}
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.thread = None
+        self.running = False
+        self.busy = False
+        self.ui_in_flight = False
+        self.last_ui_post = 0.0
+
+    def subscribe(self, event: str, callback: Callable, main_thread: bool = False) -> EventSubscription:
+        """Register a callback for an event"""
+        subscription = EventSubscription(event, callback, main_thread)
+        with self.condition:
+            self.subscriptions.setdefault(event, []).append(subscription)
+        return subscription
+
+    def unsubscribe(self, event: str, callback: Callable):
+        """Remove every subscription of callback to event"""
+        with self.condition:
+            self.subscriptions[event] = [s for s in self.subscriptions.get(event, []) if s.callback is not callback]
+
+    def retire(self, event: str):
+        """Remove every subscription to event once its already-published events are delivered"""
+        with self.condition:
+            subscriptions = self.subscriptions.get(event)
+            if subscriptions is None:
+                return
+            remaining = [s for s in subscriptions if s.pending]
+            for subscription in remaining:
+                subscription.retired = True
+            if remaining:
+                self.subscriptions[event] = remaining
+            else:
+                del self.subscriptions[event]
+
+    def publish(self, event: str, *args, coalesce_key: Any = None, **kwargs):
+        """Queue an event for every subscriber; never blocks on subscriber code"""
+        with self.condition:
+            subscriptions = self.subscriptions.get(event)
+            if not subscriptions:
+                return
+            if coalesce_key is None:
+                self.sequence += 1
+                key = self.sequence
+            else:
+                key = ('coalesce', coalesce_key)
+            for subscription in subscriptions:
+                pending = subscription.pending
+                if key not in pending and len(pending) >= self.max_pending:
+                    pending.popitem(last=False)
+                    subscription.dropped += 1
+                pending[key] = (args, kwargs)
+            self._ensure_dispatcher()
+            self.condition.notify()
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every worker-thread event has been delivered"""
+        deadline = time.time() + timeout
+        with self.condition:
+            while self.busy or any(s.pending for subs in self.subscriptions.values() for s in subs if not s.main_thread):
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(min(remaining, 0.05))
+        return True
+
+    def stop(self):
+        """Stop the dispatcher thread"""
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+    def _ensure_dispatcher(self):
+        """Start the dispatcher thread on first use (condition must be held)"""
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._dispatch_loop, name=f"{self.name}-dispatcher", daemon=True)
+        self.thread.start()
+
+    def _collect(self):
+        """Take the deliverable events out of the subscriber queues (condition must be held)"""
+        worker_batch = []
+        ui_batch = []
+        ui_waiting = False
+        ui_ready = not self.ui_in_flight and time.time() - self.last_ui_post >= self.ui_interval
+
+        drained = False
+
+        for subscriptions in self.subscriptions.values():
+            for subscription in subscriptions:
+                if not subscription.pending:
+                    continue
+                if subscription.main_thread and _main_thread_available():
+                    if not ui_ready:
+                        ui_waiting = True
+                        continue
+                    target = ui_batch
+                else:
+                    target = worker_batch
+                items = list(subscription.pending.values())
+                subscription.pending.clear()
+                target.append((subscription, items))
+                drained = drained or subscription.retired
+
+        if drained:
+            for event in [e for e, subs in self.subscriptions.items() if any(s.retired for s in subs)]:
+                remaining = [s for s in self.subscriptions[event] if not (s.retired and not s.pending)]
+                if remaining:
+                    self.subscriptions[event] = remaining
+                else:
+                    del self.subscriptions[event]
+        return worker_batch, ui_batch, ui_waiting
+
+    def _dispatch_loop(self):
+        while True:
+            with self.condition:
+                self.busy = False
+                self.condition.notify_all()
+                while self.running:
+                    worker_batch, ui_batch, ui_waiting = self._collect()
+                    if worker_batch or ui_batch:
+                        break
+                    wait = None
+                    if ui_waiting and not self.ui_in_flight:
+                        wait = max(0.001, self.ui_interval - (time.time() - self.last_ui_post))
+                    self.condition.wait(wait)
+                if not self.running:
+                    return
+                self.busy = bool(worker_batch)
+                if ui_batch:
+                    self.ui_in_flight = True
+                    self.last_ui_post = time.time()
+
+            if ui_batch:
+                self._post_to_main_thread(ui_batch)
+            self._deliver(worker_batch)
+
+    def _deliver(self, batch):
+        for subscription, items in batch:
+            for args, kwargs in items:
+                try:
+                    subscription.callback(*args, **kwargs)
+                except Exception as e:
+                    print(f"Callback error ({subscription.event}): {e}")
+
+    def _post_to_main_thread(self, batch):
+        """Deliver one batch of UI events with a single flame.PyCallback"""
+        def deliver_batch():
+            try:
+                self._deliver(batch)
+            finally:
+                with self.condition:
+                    self.ui_in_flight = False
+                    self.condition.notify()
+
+        try:
+            flame.PyCallback(deliver_batch)
+        except Exception as e:
+            print(f"Error scheduling UI callback: {e}")
+            deliver_batch()
+
+def _main_thread_available() -> bool:
+    """True when running inside Flame with main-thread callbacks available"""
+    return flame is not None and hasattr(flame, 'PyCallback')
 
 # =============================================================================
 # QUEUE MANAGEMENT SYSTEM
@@ -36,6 +267,13 @@ class JobStatus(Enum):
 class ComfyUIJob:
     """Represents a single ComfyUI processing job"""
 
+    # Jobs are kept for the whole Flame session, so keep each record compact
+    __slots__ = (
+        'job_id', 'clip', 'clip_name', 'workflow_path', 'workflow_name',
+        'parameters', 'status', 'progress', 'current_frame', 'total_frames',
+        'start_time', 'end_time', 'error_message', 'result_path', 'prompt_id'
+    )
+
     def __init__(self, job_id: str, clip, workflow_path: str, parameters: Dict = None):
         self.job_id = job_id
         self.clip = clip
@@ -76,6 +314,10 @@ class ComfyUIJob:
         self.status = JobStatus.CANCELLED
         self.end_time = time.time()
 
+    def release_clip(self):
+        """Drop the reference to the Flame clip once it is no longer needed (after export)"""
+        self.clip = None
+
     def update_progress(self, progress: float, current_frame: int = None):
         """Update job progress"""
         self.progress = min(100.0, max(0.0, progress))
@@ -112,35 +354,117 @@ class ComfyUIJob:
             'error_message': self.error_message
         }
 
+class JobHistory:
+    """
+    Bounded history of finished jobs.
+
+    The most recent records are kept in memory as a ring buffer; records pushed
+    out of the buffer are appended to a JSONL file so they can still be looked up.
+    """
+
+    def __init__(self, max_size: int = 100, spill_path: Optional[str] = None):
+        self.max_size = max(1, max_size)
+        self.spill_path = spill_path
+        self.records: deque = deque()
+        self.spill_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def append(self, job: ComfyUIJob) -> Optional[ComfyUIJob]:
+        """Add a finished job, returning the record evicted from memory (if any)"""
+        self.records.append(job)
+        if len(self.records) > self.max_size:
+            return self.records.popleft()
+        return None
+
+    def recent(self, count: int) -> List[ComfyUIJob]:
+        """Return the last `count` records, oldest first"""
+        start = max(0, len(self.records) - count)
+        return [self.records[i] for i in range(start, len(self.records))]
+
+    def clear(self):
+        """Forget all in-memory records"""
+        self.records.clear()
+
+    def spill(self, job: ComfyUIJob):
+        """Append an evicted record to the on-disk history"""
+        if not self.spill_path:
+            return
+        try:
+            with self.spill_lock:
+                with open(self.spill_path, "a") as f:
+                    f.write(json.dumps(job.to_dict()) + "\n")
+        except Exception as e:
+            print(f"Error spilling job history: {e}")
+
+    def find_spilled(self, job_id: str) -> Optional[Dict]:
+        """Look up a record that was spilled to disk"""
+        if not self.spill_path or not os.path.exists(self.spill_path):
+            return None
+        try:
+            with self.spill_lock:
+                with open(self.spill_path, "r") as f:
+                    for line in f:
+                        if job_id in line:
+                            record = json.loads(line)
+                            if record.get('job_id') == job_id:
+                                return record
+        except Exception as e:
+            print(f"Error reading job history: {e}")
+        return None
+
 class QueueMode(Enum):
     """Queue processing mode"""
     SEQUENTIAL = "sequential"
     PARALLEL = "parallel"
 
+def _withdraw_reported_jobs(registry: 'MetricsRegistry', reported_counts: Dict[str, int]):
+    """Subtract a garbage-collected queue's last reported jobs from the jobs-per-state gauge"""
+    for state, count in reported_counts.items():
+        if count:
+            registry.inc('flame_comfyui_jobs', -count, state=state)
+
 class ComfyUIQueueManager:
     """
     Manages multiple ComfyUI processing jobs with support for
     sequential and parallel processing modes.
     """
 
-    def __init__(self, max_parallel_jobs: int = 2, mode: QueueMode = QueueMode.SEQUENTIAL):
+    def __init__(self, max_parallel_jobs: int = 2, mode: QueueMode = QueueMode.SEQUENTIAL,
+                 history_size: int = 100,
+                 history_file: Optional[str] = "/tmp/flame_comfyui_job_history.jsonl"):
         self.max_parallel_jobs = max_parallel_jobs
         self.mode = mode
-        self.jobs: List[ComfyUIJob] = []
-        self.processing_jobs: List[ComfyUIJob] = []
-        self.completed_jobs: List[ComfyUIJob] = []
-        self.failed_jobs: List[ComfyUIJob] = []
+        # Pending jobs in submission order, keyed by job id
+        self.jobs: "OrderedDict[str, ComfyUIJob]" = OrderedDict()
+        self.processing_jobs: Dict[str, ComfyUIJob] = {}
+        # Finished jobs: bounded in memory, older records spilled to history_file
+        self.completed_jobs = JobHistory(history_size, history_file)
+        self.failed_jobs = JobHistory(history_size, history_file)
+        # job_id -> job for every record still held in memory
+        self.job_index: Dict[str, ComfyUIJob] = {}
         self.is_processing = False
         self.stop_requested = False
         self.pause_requested = False
         self.lock = threading.Lock()
-        self.callbacks: Dict[str, List[Callable]] = {
-            'on_job_start': [],
-            'on_job_progress': [],
-            'on_job_complete': [],
-            'on_job_failed': [],
-            'on_queue_complete': []
-        }
+        self.event_names = (
+            'on_job_start',
+            'on_job_progress',
+            'on_job_complete',
+            'on_job_failed',
+            'on_queue_complete'
+        )
+        self.events = EventBus("queue")
+        # Jobs per state last added to the flame_comfyui_jobs gauge, taken back out
+        # when the queue is garbage-collected
+        self.reported_counts: Dict[str, int] = {}
+        registry = get_metrics()
+        registry.add_collector(self._collect_metrics)
+        weakref.finalize(self, _withdraw_reported_jobs, registry, self.reported_counts)
 
     def add_job(self, clip, workflow_path: str, parameters: Dict = None) -> str:
         """Add a job to the queue"""
@@ -148,7 +472,8 @@ class ComfyUIQueueManager:
         job = ComfyUIJob(job_id, clip, workflow_path, parameters)
 
         with self.lock:
-            self.jobs.append(job)
+            self.jobs[job_id] = job
+            self.job_index[job_id] = job
 
         return job_id
 
@@ -163,31 +488,63 @@ class ComfyUIQueueManager:
     def get_job(self, job_id: str) -> Optional[ComfyUIJob]:
         """Get job by ID"""
         with self.lock:
-            for job in self.jobs + self.processing_jobs + self.completed_jobs + self.failed_jobs:
-                if job.job_id == job_id:
-                    return job
-        return None
+            return self.job_index.get(job_id)
+
+    def get_archived_job(self, job_id: str) -> Optional[Dict]:
+        """Get the record of a job that was spilled from the in-memory history"""
+        return self.completed_jobs.find_spilled(job_id)
 
     def remove_job(self, job_id: str) -> bool:
         """Remove a pending job from queue"""
         with self.lock:
-            for i, job in enumerate(self.jobs):
-                if job.job_id == job_id:
-                    self.jobs.pop(i)
-                    return True
-        return False
+            if self.jobs.pop(job_id, None) is None:
+                return False
+            del self.job_index[job_id]
+            return True
 
     def clear_queue(self):
         """Clear all pending jobs"""
         with self.lock:
+            for job_id in self.jobs:
+                self.job_index.pop(job_id, None)
             self.jobs.clear()
 
     def clear_completed(self):
         """Clear completed jobs history"""
         with self.lock:
+            for job in list(self.completed_jobs) + list(self.failed_jobs):
+                self.job_index.pop(job.job_id, None)
             self.completed_jobs.clear()
             self.failed_jobs.clear()
 
+    def _finish_job(self, job: ComfyUIJob, history: JobHistory):
+        """Move a job from processing to a history buffer and drop its clip reference"""
+        job.release_clip()
+        with self.lock:
+            self.processing_jobs.pop(job.job_id, None)
+            evicted = history.append(job)
+            if evicted is not None:
+                self.job_index.pop(evicted.job_id, None)
+        if evicted is not None:
+            history.spill(evicted)
+        get_metrics().inc('flame_comfyui_jobs_finished_total',
+                          workflow=os.path.basename(job.workflow_path or ''), status=job.status.value)
+
+    def _collect_metrics(self, registry: 'MetricsRegistry'):
+        """
+        Add this queue's pending and processing jobs to the jobs-per-state gauge.
+        The hook counts its own jobs in the same gauge, so changes are added
+        rather than set. Finished jobs are only counted by flame_comfyui_jobs_finished_total.
+        """
+        with self.lock:
+            counts = {'pending': len(self.jobs), 'processing': len(self.processing_jobs)}
+            changes = {state: count - self.reported_counts.get(state, 0) for state, count in counts.items()}
+            # Updated in place: the finalizer holds this dict
+            self.reported_counts.update(counts)
+        for state, change in changes.items():
+            if change:
+                registry.inc('flame_comfyui_jobs', change, state=state)
+
     def get_status(self) -> Dict:
         """Get queue status"""
         with self.lock:
@@ -198,25 +555,24 @@ class ComfyUIQueueManager:
                 'processing_count': len(self.processing_jobs),
                 'completed_count': len(self.completed_jobs),
                 'failed_count': len(self.failed_jobs),
-                'pending_jobs': [job.to_dict() for job in self.jobs],
-                'processing_jobs': [job.to_dict() for job in self.processing_jobs],
-                'completed_jobs': [job.to_dict() for job in self.completed_jobs[-10:]],  # Last 10
-                'failed_jobs': [job.to_dict() for job in self.failed_jobs[-10:]]  # Last 10
+                'pending_jobs': [job.to_dict() for job in self.jobs.values()],
+                'processing_jobs': [job.to_dict() for job in self.processing_jobs.values()],
+                'completed_jobs': [job.to_dict() for job in self.completed_jobs.recent(10)],  # Last 10
+                'failed_jobs': [job.to_dict() for job in self.failed_jobs.recent(10)]  # Last 10
             }
 
-    def register_callback(self, event: str, callback: Callable):
-        """Register a callback for events"""
-        if event in self.callbacks:
-            self.callbacks[event].append(callback)
+    def register_callback(self, event: str, callback: Callable, main_thread: bool = False):
+        """
+        Register a callback for events.
+        Callbacks run on the event dispatcher thread, or batched on Flame's
+        main thread when main_thread is True (use this for UI updates).
+        """
+        if event in self.event_names:
+            self.events.subscribe(event, callback, main_thread)
 
-    def _trigger_callback(self, event: str, *args, **kwargs):
-        """Trigger callbacks for an event"""
-        if event in self.callbacks:
-            for callback in self.callbacks[event]:
-                try:
-                    callback(*args, **kwargs)
-                except Exception as e:
-                    print(f"Callback error: {e}")
+    def _trigger_callback(self, event: str, *args, coalesce_key: Any = None, **kwargs):
+        """Queue an event for its callbacks without waiting for them"""
+        self.events.publish(event, *args, coalesce_key=coalesce_key, **kwargs)
 
     def process_queue(self, process_function: Callable):
         """
@@ -224,7 +580,8 @@ class ComfyUIQueueManager:
 
         Args:
             process_function: Function to process a single job
-                             Should accept (job, progress_callback) and return result_path or None
+                             Should accept (job, progress_callback) and return result_path or None.
+                             It may call job.release_clip() as soon as the clip is exported.
         """
         if self.is_processing:
             print("Queue is already processing")
@@ -253,8 +610,8 @@ class ComfyUIQueueManager:
                         can_process = len(self.processing_jobs) < self.max_parallel_jobs
 
                     if can_process and len(self.jobs) > 0:
-                        job = self.jobs.pop(0)
-                        self.processing_jobs.append(job)
+                        _, job = self.jobs.popitem(last=False)
+                        self.processing_jobs[job.job_id] = job
 
                 if job is None:
                     # No jobs available, check if we're done
@@ -265,6 +622,7 @@ class ComfyUIQueueManager:
                     continue
 
                 # Process the job
+                succeeded = False
                 try:
                     job.start()
                     self._trigger_callback('on_job_start', job)
@@ -272,27 +630,27 @@ class ComfyUIQueueManager:
                     # Progress callback for the job
                     def progress_callback(progress: float, current_frame: int = None):
                         job.update_progress(progress, current_frame)
-                        self._trigger_callback('on_job_progress', job)
+                        self._trigger_callback('on_job_progress', job, coalesce_key=job.job_id)
 
                     # Process
                     result_path = process_function(job, progress_callback)
 
                     if result_path:
                         job.complete(result_path)
-                        with self.lock:
-                            self.processing_jobs.remove(job)
-                            self.completed_jobs.append(job)
-                        self._trigger_callback('on_job_complete', job)
+                        succeeded = True
                     else:
                         raise Exception("Processing returned no result")
 
                 except Exception as e:
                     error_msg = str(e)
                     job.fail(error_msg)
-                    with self.lock:
-                        self.processing_jobs.remove(job)
-                        self.failed_jobs.append(job)
-                    self._trigger_callback('on_job_failed', job)
+
+                # Record the outcome once, after everything that can fail
+                self._finish_job(job, self.completed_jobs if succeeded else self.failed_jobs)
+                try:
+                    self._trigger_callback('on_job_complete' if succeeded else 'on_job_failed', job)
+                except Exception as e:
+                    print(f"Error publishing the end of job {job.job_id}: {e}")
 
             # Processing complete
             self.is_processing = False
@@ -318,39 +676,275 @@ class ComfyUIQueueManager:
 # WEBSOCKET PROGRESS MONITOR
 # =============================================================================
 
+# Relative cost of node types when weighting node progress into job progress.
+# Nodes not listed count as 1.
+NODE_PROGRESS_WEIGHTS = {
+    'KSampler': 10.0,
+    'KSamplerAdvanced': 10.0,
+    'UltimateSDUpscale': 20.0,
+    'ImageUpscaleWithModel': 5.0,
+    'RIFE VFI': 5.0,
+    'VAEDecode': 2.0,
+    'VAEEncode': 2.0,
+    'CheckpointLoaderSimple': 0.5,
+    'UpscaleModelLoader': 0.5,
+    'LoraLoader': 0.5
+}
+
+class PromptProgress:
+    """
+    Progress accounting for one monitored prompt.
+
+    When the workflow is known, every node contributes its weight to the job
+    progress: finished and cached nodes count fully, the executing node counts
+    with its step fraction. Without a workflow, progress is the step progress
+    of the current node.
+    """
+
+    __slots__ = ('prompt_id', 'total_steps', 'current_step', 'current_node',
+                 'node_weights', 'total_weight', 'done_weight', 'done_nodes',
+                 'node_fraction', 'cached_nodes', 'status')
+
+    def __init__(self, prompt_id: str, total_steps: int = 20, workflow: Dict = None):
+        self.prompt_id = prompt_id
+        self.total_steps = total_steps
+        self.current_step = 0
+        self.current_node = None
+        self.node_weights: Dict[str, float] = {}
+        if workflow:
+            for node_id, node in workflow.items():
+                if isinstance(node, dict) and 'class_type' in node:
+                    self.node_weights[str(node_id)] = NODE_PROGRESS_WEIGHTS.get(node['class_type'], 1.0)
+        self.total_weight = sum(self.node_weights.values())
+        self.done_weight = 0.0
+        self.done_nodes = set()
+        self.node_fraction = 0.0
+        self.cached_nodes = 0
+        self.status = 'queued'
+
+    def _finish_node(self, node):
+        if node is None or node in self.done_nodes:
+            return
+        self.done_nodes.add(node)
+        self.done_weight += self.node_weights.get(node, 0.0)
+
+    def start_node(self, node: str):
+        """A node started executing; the previous one is finished"""
+        self.status = 'running'
+        if node != self.current_node:
+            self._finish_node(self.current_node)
+            self.current_node = node
+            self.current_step = 0
+            self.node_fraction = 0.0
+
+    def cache_nodes(self, nodes: List[str]):
+        """Nodes served from ComfyUI's cache count as finished"""
+        self.status = 'running'
+        for node in nodes or []:
+            if node not in self.done_nodes:
+                self.cached_nodes += 1
+            self._finish_node(str(node))
+
+    def step(self, node: Optional[str], value: int, max_value: int):
+        """Step progress inside the executing node"""
+        if node is not None and node != self.current_node:
+            self.start_node(node)
+        self.current_step = value
+        self.node_fraction = (value / max_value) if max_value > 0 else 0.0
+
+    def complete(self):
+        self._finish_node(self.current_node)
+        self.current_node = None
+        self.node_fraction = 0.0
+        self.status = 'completed'
+
+    @property
+    def progress(self) -> float:
+        """Overall job progress in percent"""
+        if self.status == 'completed':
+            return 100.0
+        if self.total_weight <= 0:
+            return self.node_fraction * 100.0
+        current_weight = 0.0
+        if self.current_node is not None and self.current_node not in self.done_nodes:
+            current_weight = self.node_weights.get(self.current_node, 0.0) * self.node_fraction
+        return min(100.0, (self.done_weight + current_weight) / self.total_weight * 100.0)
+
+    def to_dict(self) -> Dict:
+        return {
+            'prompt_id': self.prompt_id,
+            'status': self.status,
+            'total_steps': self.total_steps,
+            'current_step': self.current_step,
+            'current_node': self.current_node,
+            'node_progress': self.node_fraction * 100.0,
+            'completed_nodes': len(self.done_nodes),
+            'cached_nodes': self.cached_nodes,
+            'total_nodes': len(self.node_weights),
+            'progress': self.progress
+        }
+
+# Binary WebSocket event types sent by ComfyUI
+WS_BINARY_PREVIEW_IMAGE = 1
+WS_BINARY_PREVIEW_IMAGE_WITH_METADATA = 4
+WS_PREVIEW_IMAGE_FORMATS = {1: 'JPEG', 2: 'PNG'}
+
+class PreviewFrame:
+    """
+    A live preview decoded from a binary WebSocket message.
+    `data` is a memoryview into the received message, so no image bytes are copied.
+    """
+
+    __slots__ = ('prompt_id', 'node_id', 'image_format', 'data', 'timestamp')
+
+    def __init__(self, prompt_id: Optional[str], node_id: Optional[str], image_format: str, data: memoryview):
+        self.prompt_id = prompt_id
+        self.node_id = node_id
+        self.image_format = image_format
+        self.data = data
+        self.timestamp = time.time()
+
+    def thumbnail(self, size=(320, 180)) -> Optional[Dict]:
+        """
+        Downscale the preview to fit `size`.
+        Returns {'width', 'height', 'format', 'data'} with JPEG bytes, or the
+        original image bytes when Pillow is not available.
+        """
+        try:
+            from PIL import Image
+        except ImportError:
+            return {'width': None, 'height': None, 'format': self.image_format, 'data': self.data.tobytes()}
+
+        try:
+            image = Image.open(BytesIO(self.data))
+            if self.image_format == 'JPEG':
+                # Let the JPEG decoder scale down while decoding
+                image.draft('RGB', size)
+            image = image.convert('RGB')
+            image.thumbnail(size)
+            output = BytesIO()
+            image.save(output, format='JPEG', quality=80)
+            return {'width': image.width, 'height': image.height, 'format': 'JPEG', 'data': output.getvalue()}
+        except Exception as e:
+            print(f"Error creating preview thumbnail: {e}")
+            return None
+
+def decode_preview_message(message: bytes, fallback_prompt_id: Optional[str] = None) -> Optional[PreviewFrame]:
+    """
+    Decode a binary ComfyUI WebSocket message into a PreviewFrame.
+    Header and image are sliced out of the message without copying.
+    """
+    view = memoryview(message)
+    if len(view) < 8:
+        return None
+
+    event_type = struct.unpack_from('>I', view, 0)[0]
+
+    if event_type == WS_BINARY_PREVIEW_IMAGE:
+        image_type = struct.unpack_from('>I', view, 4)[0]
+        image_format = WS_PREVIEW_IMAGE_FORMATS.get(image_type, 'JPEG')
+        return PreviewFrame(fallback_prompt_id, None, image_format, view[8:])
+
+    if event_type == WS_BINARY_PREVIEW_IMAGE_WITH_METADATA:
+        metadata_length = struct.unpack_from('>I', view, 4)[0]
+        metadata_end = 8 + metadata_length
+        if metadata_end > len(view):
+            return None
+        metadata = json.loads(view[8:metadata_end].tobytes())
+        image_format = 'PNG' if metadata.get('image_type') == 'image/png' else 'JPEG'
+        return PreviewFrame(
+            metadata.get('prompt_id') or fallback_prompt_id,
+            metadata.get('display_node_id') or metadata.get('node_id'),
+            image_format,
+            view[metadata_end:]
+        )
+
+    return None
+
 class ComfyUIProgressMonitor:
     """
     Real-time progress tracking via WebSocket connection to ComfyUI
     """
 
-    def __init__(self, comfyui_url: str = "http://127.0.0.1:8188"):
+    def __init__(self, comfyui_url: str = "http://127.0.0.1:8188", preview_size=(320, 180),
+                 client_id: Optional[str] = None, auto_reconnect: bool = True,
+                 reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
         self.comfyui_url = comfyui_url
-        self.ws_url = comfyui_url.replace('http://', 'ws://').replace('https://', 'wss://') + '/ws'
+        self.preview_size = tuple(preview_size)
+        # One client_id for the whole session, so ComfyUI keeps routing our prompts' events after a reconnect
+        self.client_id = client_id or f"flame_comfyui_{uuid.uuid4().hex[:12]}"
+        self.ws_url = (comfyui_url.replace('http://', 'ws://').replace('https://', 'wss://')
+                       + f'/ws?clientId={self.client_id}')
         self.ws = None
         self.is_connected = False
-        self.callbacks: Dict[str, List[Callable]] = {
-            'on_progress': [],
-            'on_preview': [],
-            'on_complete': [],
-            'on_error': []
-        }
-        self.monitored_prompts: Dict[str, Dict] = {}  # prompt_id -> info
+        self.auto_reconnect = auto_reconnect
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+        self.reconnect_attempts = 0
+        self.has_connected = False
+        self.ws_thread: Optional[threading.Thread] = None
+        self.stop_event = threading.Event()
+        self.event_names = (
+            'on_progress',
+            'on_prompt_start',
+            'on_prompt_progress',
+            'on_node_executing',
+            'on_node_executed',
+            'on_nodes_cached',
+            'on_preview',
+            'on_preview_frame',
+            'on_preview_thumbnail',
+            'on_complete',
+            'on_error',
+            'on_prompt_error'
+        )
+        # Events whose first argument is the prompt id; these can also be subscribed per prompt
+        self.prompt_event_names = (
+            'on_preview',
+            'on_prompt_start',
+            'on_prompt_progress',
+            'on_node_executing',
+            'on_node_executed',
+            'on_nodes_cached',
+            'on_preview_frame',
+            'on_preview_thumbnail',
+            'on_complete',
+            'on_prompt_error'
+        )
+        self.events = EventBus("monitor")
+        # Latest live preview per monitored prompt
+        self.latest_previews: Dict[str, PreviewFrame] = {}
+        self.thumbnailer_registered = False
+        self.profiler: Optional['NodeProfiler'] = None
+        self.monitored_prompts: Dict[str, PromptProgress] = {}  # prompt_id -> progress
+        # Prompt currently executing on the server, for messages without a prompt_id
+        self.active_prompt: Optional[str] = None
+        # Messages of prompts nobody follows yet, replayed by subscribe_prompt(): a prompt
+        # can start, or even finish, before its submitter has read the prompt_id back
+        self.unclaimed_messages: "OrderedDict[str, deque]" = OrderedDict()
+        self.max_unclaimed_prompts = 32
         self.lock = threading.Lock()
+        # Serializes message handling with subscribe_prompt()'s replay, so events stay in order
+        self.message_lock = threading.RLock()
 
     def connect(self) -> bool:
-        """Establish WebSocket connection"""
+        """
+        Establish WebSocket connection.
+        With auto_reconnect the connection is re-established in the background
+        whenever it drops, until disconnect() is called.
+        """
+        if optional_import("websocket") is None:
+            print("WebSocket monitor unavailable: websocket-client is not installed")
+            return False
+
         try:
-            self.ws = websocket.WebSocketApp(
-                self.ws_url,
-                on_message=self._on_message,
-                on_error=self._on_error,
-                on_close=self._on_close,
-                on_open=self._on_open
-            )
+            self.stop_event.clear()
 
             # Start WebSocket in background thread
-            wst = threading.Thread(target=self.ws.run_forever, daemon=True)
-            wst.start()
+            with self.lock:
+                if not self.ws_thread or not self.ws_thread.is_alive():
+                    self.ws_thread = threading.Thread(target=self._run_connection, daemon=True)
+                    self.ws_thread.start()
 
             # Wait for connection
             for _ in range(50):  # 5 seconds timeout
@@ -366,50 +960,208 @@ class ComfyUIProgressMonitor:
 
     def disconnect(self):
         """Close WebSocket connection"""
+        self.stop_event.set()
         if self.ws:
             self.ws.close()
         self.is_connected = False
 
-    def monitor_prompt(self, prompt_id: str, total_steps: int = 20):
-        """Start monitoring a prompt"""
+    def _run_connection(self):
+        """Run the WebSocket, reconnecting with jittered exponential backoff"""
+        while not self.stop_event.is_set():
+            try:
+                self.ws = optional_import("websocket").WebSocketApp(
+                    self.ws_url,
+                    on_message=self._on_message,
+                    on_error=self._on_error,
+                    on_close=self._on_close,
+                    on_open=self._on_open
+                )
+                # Pings detect half-open sockets left behind by a server restart
+                self.ws.run_forever(ping_interval=20, ping_timeout=10)
+            except Exception as e:
+                print(f"WebSocket connection error: {e}")
+
+            self.is_connected = False
+            if not self.auto_reconnect or self.stop_event.is_set():
+                break
+
+            delay = self._next_reconnect_delay()
+            print(f"WebSocket reconnecting in {delay:.1f}s (attempt {self.reconnect_attempts})")
+            self.stop_event.wait(delay)
+
+    def _next_reconnect_delay(self) -> float:
+        """
+        Full-jitter backoff: anywhere from 0 to the exponential ceiling, so Flame
+        sessions dropped by the same server restart spread their reconnects out
+        """
+        self.reconnect_attempts += 1
+        ceiling = min(self.max_reconnect_delay, self.reconnect_delay * (2 ** (self.reconnect_attempts - 1)))
+        return random.uniform(0, ceiling)
+
+    def reconcile_prompts(self):
+        """
+        Resolve monitored prompts against /history and /queue.
+        Catches prompts that finished or failed while the socket was down.
+        """
         with self.lock:
-            self.monitored_prompts[prompt_id] = {
-                'total_steps': total_steps,
-                'current_step': 0,
-                'current_node': None,
-                'progress': 0.0
-            }
+            prompt_ids = list(self.monitored_prompts.keys())
+        if not prompt_ids:
+            return
+
+        requests = optional_import("requests")
+        try:
+            response = requests.get(f"{self.comfyui_url}/queue", timeout=10)
+            response.raise_for_status()
+            queue_data = response.json()
+            queued_ids = set()
+            for entry in queue_data.get('queue_running', []) + queue_data.get('queue_pending', []):
+                if len(entry) > 1:
+                    queued_ids.add(entry[1])
+        except Exception as e:
+            print(f"Error reconciling prompts with queue: {e}")
+            return
+
+        for prompt_id in prompt_ids:
+            if prompt_id in queued_ids:
+                continue
+            try:
+                response = requests.get(f"{self.comfyui_url}/history/{prompt_id}", timeout=10)
+                response.raise_for_status()
+                entry = response.json().get(prompt_id)
+            except Exception as e:
+                print(f"Error reconciling prompt {prompt_id}: {e}")
+                continue
+
+            if not entry:
+                # Neither queued nor in history (yet); keep waiting on the socket
+                continue
+
+            status = entry.get('status', {})
+            if status.get('status_str') == 'error':
+                with self.lock:
+                    info = self.monitored_prompts.pop(prompt_id, None)
+                    self.latest_previews.pop(prompt_id, None)
+                if info:
+                    self._trigger_callback('on_prompt_error', prompt_id, {'prompt_id': prompt_id, 'status': status})
+            else:
+                self._complete_prompt(prompt_id)
+
+    def monitor_prompt(self, prompt_id: str, total_steps: int = 20, workflow: Dict = None):
+        """
+        Start monitoring a prompt.
+        Pass the submitted workflow to weight node progress into job progress.
+        """
+        with self.lock:
+            self.monitored_prompts[prompt_id] = PromptProgress(prompt_id, total_steps, workflow)
 
     def unmonitor_prompt(self, prompt_id: str):
         """Stop monitoring a prompt"""
         with self.lock:
             if prompt_id in self.monitored_prompts:
                 del self.monitored_prompts[prompt_id]
+            self.latest_previews.pop(prompt_id, None)
+
+    def enable_profiling(self, stats_path: str = "/tmp/flame_comfyui/node_profiles.json") -> 'NodeProfiler':
+        """Attach a NodeProfiler (once) and return it"""
+        with self.lock:
+            if self.profiler is None:
+                self.profiler = NodeProfiler(stats_path)
+                attach = True
+            else:
+                attach = False
+        if attach:
+            self.profiler.attach(self)
+        return self.profiler
+
+    def get_latest_preview(self, prompt_id: str) -> Optional[PreviewFrame]:
+        """Get the most recent live preview received for a prompt"""
+        with self.lock:
+            return self.latest_previews.get(prompt_id)
 
     def get_progress(self, prompt_id: str) -> Optional[Dict]:
         """Get current progress for a prompt"""
         with self.lock:
-            return self.monitored_prompts.get(prompt_id)
+            info = self.monitored_prompts.get(prompt_id)
+            return info.to_dict() if info else None
 
-    def register_callback(self, event: str, callback: Callable):
-        """Register callback for events"""
-        if event in self.callbacks:
-            self.callbacks[event].append(callback)
+    def register_callback(self, event: str, callback: Callable, main_thread: bool = False):
+        """
+        Register callback for events (see ComfyUIQueueManager.register_callback).
+        'on_preview_thumbnail' callbacks receive (prompt_id, thumbnail_dict, preview_frame)
+        with the live preview downscaled to preview_size.
+        """
+        if event not in self.event_names:
+            return
+        if event == 'on_preview_thumbnail' and not self.thumbnailer_registered:
+            # Thumbnails are made on the dispatcher thread, never on the WebSocket thread
+            self.thumbnailer_registered = True
+            self.events.subscribe('on_preview_frame', self._make_thumbnail)
+        self.events.subscribe(event, callback, main_thread)
+
+    def subscribe_prompt(self, prompt_id: str, callbacks: Dict[str, Callable], total_steps: int = 20,
+                         workflow: Dict = None, main_thread: bool = False):
+        """
+        Monitor a prompt and register callbacks that only receive that prompt's events.
 
-    def _trigger_callback(self, event: str, *args, **kwargs):
-        """Trigger callbacks"""
-        if event in self.callbacks:
-            for callback in self.callbacks[event]:
-                try:
-                    callback(*args, **kwargs)
-                except Exception as e:
-                    print(f"Callback error: {e}")
+        Args:
+            prompt_id: ComfyUI prompt id
+            callbacks: Event name -> callback, for events in prompt_event_names
+            total_steps: Sampling steps per node (see monitor_prompt)
+            workflow: Submitted workflow, used to weight node progress
+            main_thread: Deliver the callbacks on Flame's main thread
+
+        The subscriptions are dropped automatically once the prompt completes or fails.
+        Events the socket received for the prompt before this call are replayed with
+        their original timestamps.
+        """
+        for event, callback in callbacks.items():
+            if event not in self.prompt_event_names:
+                continue
+            if event == 'on_preview_thumbnail' and not self.thumbnailer_registered:
+                self.thumbnailer_registered = True
+                self.events.subscribe('on_preview_frame', self._make_thumbnail)
+            self.events.subscribe(f"{event}:{prompt_id}", callback, main_thread)
+        with self.message_lock:
+            self.monitor_prompt(prompt_id, total_steps, workflow)
+            with self.lock:
+                backlog = self.unclaimed_messages.pop(prompt_id, ())
+            for msg_type, msg_data, received_at in backlog:
+                self._handle_message(msg_type, msg_data, prompt_id, received_at, replay=True)
+
+    def unsubscribe_prompt(self, prompt_id: str):
+        """Stop monitoring a prompt and drop its per-prompt callbacks"""
+        self.unmonitor_prompt(prompt_id)
+        self._retire_prompt_events(prompt_id)
+
+    def _retire_prompt_events(self, prompt_id: str):
+        for event in self.prompt_event_names:
+            self.events.retire(f"{event}:{prompt_id}")
+
+    def _make_thumbnail(self, prompt_id: str, preview: PreviewFrame):
+        thumbnail = preview.thumbnail(self.preview_size)
+        if thumbnail:
+            self._trigger_callback('on_preview_thumbnail', prompt_id, thumbnail, preview, coalesce_key=prompt_id)
+
+    def _trigger_callback(self, event: str, *args, coalesce_key: Any = None, **kwargs):
+        """Queue an event for its callbacks without blocking the WebSocket thread"""
+        self.events.publish(event, *args, coalesce_key=coalesce_key, **kwargs)
+        if args and event in self.prompt_event_names:
+            prompt_id = args[0]
+            self.events.publish(f"{event}:{prompt_id}", *args, coalesce_key=coalesce_key, **kwargs)
+            if event in ('on_complete', 'on_prompt_error'):
+                self._retire_prompt_events(prompt_id)
 
     def _on_open(self, ws):
         """WebSocket opened"""
         self.is_connected = True
+        self.reconnect_attempts = 0
         print("WebSocket connected to ComfyUI")
 
+        if self.has_connected:
+            # Events sent while we were away are lost; ask the server what happened
+            threading.Thread(target=self.reconcile_prompts, daemon=True).start()
+        self.has_connected = True
+
     def _on_close(self, ws, close_status_code, close_msg):
         """WebSocket closed"""
         self.is_connected = False
@@ -420,57 +1172,168 @@ class ComfyUIProgressMonitor:
         print(f"WebSocket error: {error}")
         self._trigger_callback('on_error', error)
 
+    def _on_binary_message(self, message: bytes):
+        """Handle a binary WebSocket message (live previews)"""
+        preview = decode_preview_message(message, self.active_prompt)
+        if preview is None or preview.prompt_id is None:
+            return
+
+        with self.lock:
+            if preview.prompt_id not in self.monitored_prompts:
+                return
+            self.latest_previews[preview.prompt_id] = preview
+
+        # Only the latest preview per prompt is delivered
+        self._trigger_callback('on_preview_frame', preview.prompt_id, preview, coalesce_key=preview.prompt_id)
+
     def _on_message(self, ws, message):
         """Handle incoming WebSocket message"""
+        if isinstance(message, (bytes, bytearray)):
+            try:
+                self._on_binary_message(message)
+            except Exception as e:
+                print(f"Error decoding binary WebSocket message: {e}")
+            return
+
         try:
             data = json.loads(message)
             msg_type = data.get('type')
-
-            if msg_type == 'progress':
-                # Progress update
-                node = data.get('data', {}).get('node')
-                value = data.get('data', {}).get('value', 0)
-                max_value = data.get('data', {}).get('max', 100)
-
-                # Update monitored prompts
+            msg_data = data.get('data') or {}
+            # Older servers omit prompt_id from progress and executing; use the executing prompt
+            prompt_id = msg_data.get('prompt_id')
+            if msg_type in ('progress', 'executing'):
+                prompt_id = prompt_id or self.active_prompt
+
+            received_at = time.time()
+            with self.message_lock:
                 with self.lock:
-                    for prompt_id, info in self.monitored_prompts.items():
-                        info['current_node'] = node
-                        info['current_step'] = value
-                        info['progress'] = (value / max_value * 100.0) if max_value > 0 else 0
-
-                self._trigger_callback('on_progress', node, value, max_value)
+                    # Progress is absolute, so the next update makes up for a dropped one
+                    if prompt_id and msg_type != 'progress' and prompt_id not in self.monitored_prompts:
+                        self._keep_unclaimed(prompt_id, (msg_type, msg_data, received_at))
+                self._handle_message(msg_type, msg_data, prompt_id, received_at)
 
-            elif msg_type == 'executing':
-                # Node execution
-                node = data.get('data', {}).get('node')
-                prompt_id = data.get('data', {}).get('prompt_id')
+        except Exception as e:
+            print(f"Error parsing WebSocket message: {e}")
 
+    def _keep_unclaimed(self, prompt_id: str, message: tuple):
+        """Hold a message of an unmonitored prompt for subscribe_prompt() (call with self.lock held)"""
+        backlog = self.unclaimed_messages.get(prompt_id)
+        if backlog is None:
+            while len(self.unclaimed_messages) >= self.max_unclaimed_prompts:
+                self.unclaimed_messages.popitem(last=False)
+            backlog = self.unclaimed_messages[prompt_id] = deque(maxlen=256)
+        backlog.append(message)
+
+    def _handle_message(self, msg_type: str, msg_data: Dict, prompt_id: Optional[str], received_at: float,
+                        replay: bool = False):
+        """
+        Turn a JSON message into events. A replayed message was already handled once while
+        its prompt was unmonitored: it leaves active_prompt alone and only republishes what
+        the prompt's subscribers missed.
+        """
+        if msg_type == 'progress':
+            node = msg_data.get('node')
+            value = msg_data.get('value', 0)
+            max_value = msg_data.get('max', 100)
+
+            with self.lock:
+                info = self.monitored_prompts.get(prompt_id)
+                if info:
+                    info.step(node, value, max_value)
+                    snapshot = info.to_dict()
+
+            self._trigger_callback('on_progress', node, value, max_value, coalesce_key=(prompt_id, node))
+            if info:
+                self._trigger_callback('on_prompt_progress', prompt_id, snapshot, coalesce_key=prompt_id)
+
+        elif msg_type == 'execution_start':
+            if not replay:
+                self.active_prompt = prompt_id
+            with self.lock:
+                monitored = prompt_id in self.monitored_prompts
+            if monitored:
+                self._trigger_callback('on_prompt_start', prompt_id, received_at)
+
+        elif msg_type == 'execution_cached':
+            # Nodes served from cache
+            if not replay:
+                self.active_prompt = prompt_id
+            cached_nodes = [str(n) for n in msg_data.get('nodes', [])]
+            with self.lock:
+                info = self.monitored_prompts.get(prompt_id)
+                if info:
+                    info.cache_nodes(cached_nodes)
+            if info:
+                self._trigger_callback('on_nodes_cached', prompt_id, cached_nodes, received_at)
+
+        elif msg_type == 'executing':
+            # Node execution - node None means the prompt has finished
+            node = msg_data.get('node')
+            if node is None:
+                self._complete_prompt(prompt_id, received_at)
+            else:
+                if not replay:
+                    self.active_prompt = prompt_id
                 with self.lock:
-                    if prompt_id in self.monitored_prompts:
-                        self.monitored_prompts[prompt_id]['current_node'] = node
-
-            elif msg_type == 'executed':
-                # Node completed
-                prompt_id = data.get('data', {}).get('prompt_id')
-                output = data.get('data', {}).get('output', {})
-
-                # Check for preview images
-                if 'images' in output:
-                    images = output['images']
+                    info = self.monitored_prompts.get(prompt_id)
+                    if info:
+                        info.start_node(str(node))
+                        snapshot = info.to_dict()
+                if info:
+                    self._trigger_callback('on_node_executing', prompt_id, str(node), received_at)
+                    self._trigger_callback('on_prompt_progress', prompt_id, snapshot, coalesce_key=prompt_id)
+
+        elif msg_type == 'executed':
+            # Node completed
+            output = msg_data.get('output') or {}
+            with self.lock:
+                monitored = prompt_id in self.monitored_prompts
+            if monitored and msg_data.get('node') is not None:
+                self._trigger_callback('on_node_executed', prompt_id, str(msg_data['node']), received_at)
+
+            # Check for preview images
+            if 'images' in output:
+                images = output['images']
+                if replay:
+                    # Everyone else already had this one
+                    self.events.publish(f"on_preview:{prompt_id}", prompt_id, images)
+                else:
                     self._trigger_callback('on_preview', prompt_id, images)
 
-            elif msg_type == 'execution_complete':
-                # Execution complete
-                prompt_id = data.get('data', {}).get('prompt_id')
-                self._trigger_callback('on_complete', prompt_id)
-                self.unmonitor_prompt(prompt_id)
-
-        except Exception as e:
-            print(f"Error parsing WebSocket message: {e}")
+        elif msg_type in ('execution_success', 'execution_complete'):
+            # Execution complete
+            self._complete_prompt(prompt_id, received_at)
+
+        elif msg_type in ('execution_error', 'execution_interrupted'):
+            with self.lock:
+                info = self.monitored_prompts.pop(prompt_id, None)
+                self.latest_previews.pop(prompt_id, None)
+            if info:
+                self._trigger_callback('on_prompt_error', prompt_id, msg_data)
+            if prompt_id == self.active_prompt and not replay:
+                self.active_prompt = None
+
+    def _complete_prompt(self, prompt_id: Optional[str], finished_at: Optional[float] = None):
+        """Mark a monitored prompt finished and notify subscribers once"""
+        with self.lock:
+            info = self.monitored_prompts.pop(prompt_id, None)
+            self.latest_previews.pop(prompt_id, None)
+            if info:
+                info.complete()
+        if prompt_id == self.active_prompt:
+            self.active_prompt = None
+        if info:
+            # A None node closes the last node's timing
+            self._trigger_callback('on_node_executing', prompt_id, None, finished_at or time.time())
+            self._trigger_callback('on_prompt_progress', prompt_id, info.to_dict(), coalesce_key=prompt_id)
+            self._trigger_callback('on_complete', prompt_id)
 
     def get_preview_image(self, prompt_id: str, filename: str) -> Optional[bytes]:
-        """Fetch preview image from ComfyUI"""
+        """
+        Fetch a saved preview image from ComfyUI.
+        Live sampling previews arrive over the WebSocket; use get_latest_preview() for those.
+        """
+        requests = optional_import("requests")
         try:
             url = f"{self.comfyui_url}/view"
             params = {
@@ -487,6 +1350,222 @@ class ComfyUIProgressMonitor:
             print(f"Error fetching preview: {e}")
             return None
 
+# One multiplexed connection per ComfyUI server for the whole Flame session
+_shared_monitors: Dict[str, ComfyUIProgressMonitor] = {}
+_shared_monitors_lock = threading.Lock()
+
+def get_shared_monitor(comfyui_url: str = "http://127.0.0.1:8188", client_id: Optional[str] = None,
+                       connect: bool = True) -> ComfyUIProgressMonitor:
+    """
+    Get the session-wide progress monitor for a ComfyUI server.
+
+    Every job on the same server shares this monitor's socket and client_id;
+    submit prompts with monitor.client_id and follow them with subscribe_prompt().
+    client_id is only used when the monitor is first created.
+    """
+    key = comfyui_url.rstrip('/')
+    with _shared_monitors_lock:
+        monitor = _shared_monitors.get(key)
+        if monitor is None:
+            monitor = ComfyUIProgressMonitor(key, client_id=client_id)
+            _shared_monitors[key] = monitor
+
+    if connect and not monitor.is_connected:
+        with monitor.lock:
+            running = monitor.ws_thread is not None and monitor.ws_thread.is_alive()
+        if not running:
+            monitor.connect()
+    return monitor
+
+def close_shared_monitors():
+    """Disconnect every session-wide monitor"""
+    with _shared_monitors_lock:
+        monitors = list(_shared_monitors.values())
+        _shared_monitors.clear()
+    for monitor in monitors:
+        monitor.disconnect()
+        monitor.events.stop()
+
+# =============================================================================
+# NODE PROFILER
+# =============================================================================
+
+class NodeRun:
+    """Node timings of one tracked prompt"""
+
+    __slots__ = ('workflow_name', 'class_types', 'current_node', 'node_started', 'durations', 'cached')
+
+    def __init__(self, workflow_name: str, class_types: Dict[str, str]):
+        self.workflow_name = workflow_name
+        self.class_types = class_types
+        self.current_node: Optional[str] = None
+        self.node_started = 0.0
+        self.durations: Dict[str, float] = {}
+        self.cached: set = set()
+
+    def close_node(self, timestamp: float):
+        if self.current_node is not None:
+            elapsed = max(0.0, timestamp - self.node_started)
+            self.durations[self.current_node] = self.durations.get(self.current_node, 0.0) + elapsed
+            self.current_node = None
+
+class NodeProfiler:
+    """
+    Per-node wall time of ComfyUI prompts, aggregated per workflow.
+
+    Fed by a ComfyUIProgressMonitor (see ComfyUIProgressMonitor.enable_profiling):
+    a node runs from its `executing` message until the next node starts, its
+    `executed` message arrives or the prompt finishes. Cache hits are counted
+    separately. Aggregates are saved to stats_path after every prompt, with
+    the ranked report next to it (.txt).
+    """
+
+    def __init__(self, stats_path: str = "/tmp/flame_comfyui/node_profiles.json"):
+        self.stats_path = stats_path
+        self.runs: Dict[str, NodeRun] = {}
+        self.lock = threading.Lock()
+        # workflow -> {'runs': n, 'total': seconds, 'nodes': {node_id: stats}}
+        self.stats: Dict[str, Dict] = self._load()
+
+    def attach(self, monitor: 'ComfyUIProgressMonitor'):
+        """Subscribe to a monitor's node events"""
+        monitor.register_callback('on_node_executing', self._on_node_executing)
+        monitor.register_callback('on_node_executed', self._on_node_executed)
+        monitor.register_callback('on_nodes_cached', self._on_nodes_cached)
+        monitor.register_callback('on_prompt_error', self._on_prompt_error)
+
+    def track(self, prompt_id: str, workflow: Dict, workflow_name: str = None):
+        """Profile a submitted prompt; untracked prompts are ignored"""
+        class_types = {str(node_id): node.get('class_type', '?')
+                       for node_id, node in workflow.items() if isinstance(node, dict)}
+        if not workflow_name:
+            # Workflows without a name are grouped by their node types
+            signature = ",".join(sorted(set(class_types.values())))
+            workflow_name = f"workflow_{hashlib.sha1(signature.encode()).hexdigest()[:8]}"
+        with self.lock:
+            self.runs[prompt_id] = NodeRun(workflow_name, class_types)
+
+    def _on_node_executing(self, prompt_id: str, node_id: Optional[str], timestamp: float):
+        with self.lock:
+            run = self.runs.get(prompt_id)
+            if run is None:
+                return
+            run.close_node(timestamp)
+            if node_id is None:
+                # Prompt finished
+                del self.runs[prompt_id]
+                self._aggregate(run)
+            else:
+                run.current_node = node_id
+                run.node_started = timestamp
+        if node_id is None:
+            self.save()
+
+    def _on_node_executed(self, prompt_id: str, node_id: str, timestamp: float):
+        with self.lock:
+            run = self.runs.get(prompt_id)
+            if run is not None and run.current_node == node_id:
+                run.close_node(timestamp)
+
+    def _on_nodes_cached(self, prompt_id: str, node_ids: List[str], timestamp: float):
+        with self.lock:
+            run = self.runs.get(prompt_id)
+            if run is not None:
+                run.cached.update(node_ids)
+
+    def _on_prompt_error(self, prompt_id: str, data: Dict):
+        # Partial timings of failed prompts would skew the averages
+        with self.lock:
+            self.runs.pop(prompt_id, None)
+
+    def _aggregate(self, run: NodeRun):
+        """Fold a finished run into the workflow stats (lock must be held)"""
+        workflow_stats = self.stats.setdefault(run.workflow_name, {'runs': 0, 'total': 0.0, 'nodes': {}})
+        workflow_stats['runs'] += 1
+        workflow_stats['total'] += sum(run.durations.values())
+        for node_id, class_type in run.class_types.items():
+            node_stats = workflow_stats['nodes'].setdefault(node_id, {
+                'class_type': class_type, 'count': 0, 'total': 0.0, 'min': None, 'max': 0.0, 'cached': 0
+            })
+            if node_id in run.cached:
+                node_stats['cached'] += 1
+                continue
+            if node_id not in run.durations:
+                continue
+            duration = run.durations[node_id]
+            node_stats['count'] += 1
+            node_stats['total'] += duration
+            node_stats['min'] = duration if node_stats['min'] is None else min(node_stats['min'], duration)
+            node_stats['max'] = max(node_stats['max'], duration)
+
+    def ranked_nodes(self, workflow_name: str) -> List[Dict]:
+        """Nodes of a workflow, most total time first"""
+        with self.lock:
+            workflow_stats = self.stats.get(workflow_name)
+            if not workflow_stats:
+                return []
+            total = workflow_stats['total'] or 1.0
+            ranked = [{
+                'node_id': node_id,
+                'class_type': node_stats['class_type'],
+                'runs': node_stats['count'],
+                'cached': node_stats['cached'],
+                'total': node_stats['total'],
+                'average': node_stats['total'] / node_stats['count'] if node_stats['count'] else 0.0,
+                'share': node_stats['total'] / total
+            } for node_id, node_stats in workflow_stats['nodes'].items()]
+        ranked.sort(key=lambda n: n['total'], reverse=True)
+        return ranked
+
+    def class_totals(self, workflow_name: str) -> List[tuple]:
+        """(class_type, total seconds, share) for a workflow, most expensive first"""
+        totals: Dict[str, float] = {}
+        shares: Dict[str, float] = {}
+        for node in self.ranked_nodes(workflow_name):
+            totals[node['class_type']] = totals.get(node['class_type'], 0.0) + node['total']
+            shares[node['class_type']] = shares.get(node['class_type'], 0.0) + node['share']
+        return sorted(((c, totals[c], shares[c]) for c in totals), key=lambda t: t[1], reverse=True)
+
+    def report(self, workflow_name: Optional[str] = None, top: int = 10) -> str:
+        """Ranked text report for one workflow or for all of them"""
+        with self.lock:
+            names = [workflow_name] if workflow_name else sorted(self.stats)
+        lines = []
+        for name in names:
+            workflow_stats = self.stats.get(name)
+            if not workflow_stats:
+                continue
+            runs = workflow_stats['runs']
+            lines.append(f"{name}: {runs} runs, {workflow_stats['total'] / max(runs, 1):.2f}s per run")
+            for class_type, total, share in self.class_totals(name)[:top]:
+                lines.append(f"  {class_type:<32} {share * 100:5.1f}%  {total / max(runs, 1):8.2f}s/run")
+            for node in self.ranked_nodes(name)[:top]:
+                lines.append(f"    node {node['node_id']:<6} {node['class_type']:<28} avg {node['average']:.2f}s"
+                             f"  cached {node['cached']}/{node['runs'] + node['cached']}")
+        return "\n".join(lines)
+
+    def save(self):
+        """Write the aggregates atomically"""
+        try:
+            with self.lock:
+                data = json.dumps(self.stats, indent=2)
+            os.makedirs(os.path.dirname(self.stats_path) or ".", exist_ok=True)
+            temp_path = f"{self.stats_path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(data)
+            os.replace(temp_path, self.stats_path)
+            with open(os.path.splitext(self.stats_path)[0] + ".txt", 'w') as f:
+                f.write(self.report() + "\n")
+        except Exception as e:
+            print(f"Error saving node profiles: {e}")
+
+    def _load(self) -> Dict[str, Dict]:
+        try:
+            with open(self.stats_path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
 # =============================================================================
 # WORKFLOW PRESET SYSTEM
 # =============================================================================
@@ -807,52 +1886,1249 @@ class SmartMediaManager:
 
         return settings.get(format, settings[MediaFormat.PNG])
 
+    # Node class substrings (lowercase) that tell what a workflow does, checked in order
+    WORKFLOW_CLASS_NODES = [
+        ('matte', ('rembg', 'inspyrenet', 'birefnet', 'matting', 'chromakey', 'segmentanything')),
+        ('upscale', ('upscalemodelloader', 'imageupscalewithmodel', 'ultimatesdupscale', 'esrgan', 'supir')),
+        ('grading', ('lut apply', 'colorwheels', 'grading', 'filmgrain')),
+        ('depth', ('depth', 'dsine', 'normalmap', 'midas', 'zoe', 'marigold')),
+        ('generation', ('ksampler', 'checkpointloader', 'animatediff', 'ade_')),
+    ]
+
+    # Formats ComfyUI's image loaders can read that are good enough for each workflow class.
+    # Compression artifacts show up on matte edges, get magnified by upscalers and
+    # shift colors, so those classes only get lossless formats.
+    TRANSPORT_FORMATS = {
+        'matte': (MediaFormat.PNG, MediaFormat.TIFF),
+        'upscale': (MediaFormat.PNG, MediaFormat.TIFF),
+        'grading': (MediaFormat.PNG, MediaFormat.TIFF),
+        'depth': (MediaFormat.JPEG, MediaFormat.PNG, MediaFormat.TIFF),
+        'generation': (MediaFormat.JPEG, MediaFormat.PNG, MediaFormat.TIFF),
+        None: (MediaFormat.JPEG, MediaFormat.PNG, MediaFormat.TIFF),
+    }
+
+    # Cache keys of the format benchmarks running in the background
+    benchmarks_running: set = set()
+    benchmarks_lock = threading.Lock()
+
     @staticmethod
-    def auto_detect_sequences(directory: str) -> Dict[str, List[str]]:
+    def classify_workflow(workflow: Dict) -> Optional[str]:
         """
-        Automatically detect and group image sequences in a directory
-
-        Returns:
-            Dictionary of sequence_name -> [file_paths]
+        Classify an API-format workflow as 'matte', 'upscale', 'grading', 'depth' or
+        'generation' from its node classes; None when nothing matches
         """
-        import re
-
-        sequences = {}
+        class_types = ' '.join(str(node.get('class_type', '')).lower()
+                               for node in workflow.values() if isinstance(node, dict))
+        for workflow_type, markers in SmartMediaManager.WORKFLOW_CLASS_NODES:
+            if any(marker in class_types for marker in markers):
+                return workflow_type
+        return None
 
-        try:
-            files = os.listdir(directory)
-            image_files = [f for f in files if f.endswith(('.jpg', '.jpeg', '.png', '.exr', '.dpx', '.tiff', '.tif'))]
+    # Fixed-size resize nodes: (width input, height input, inputs -> 'fit' inside or
+    # 'cover' the box, or None when the node doesn't always resize)
+    RESIZE_NODES = {
+        'ImageResizeKJ': ('width', 'height',
+                          lambda i: 'fit' if i.get('keep_proportion') and i.get('crop', 'disabled') == 'disabled'
+                          else 'cover'),
+        'ImageResize+': ('width', 'height',
+                         lambda i: None if i.get('condition', 'always') not in ('always', 'downscale if bigger')
+                         else 'fit' if i.get('method') in ('keep proportion', 'pad') else 'cover'),
+        'ImageScale': ('width', 'height', lambda i: 'cover'),
+    }
+
+    # Loader nodes and the outputs that carry pixels (the frame count output doesn't)
+    LOADER_PIXEL_OUTPUTS = {'VHS_LoadImagesPath': (0, 1)}
 
-            for filename in image_files:
-                # Try to extract sequence pattern (name + frame number)
-                match = re.match(r'^(.+?)[-_]?v?(\d+)\.(\d{4,5})\.(jpg|jpeg|png|exr|dpx|tiff|tif)$', filename, re.IGNORECASE)
+    @staticmethod
+    def find_loader_resizes(workflow: Dict) -> Optional[List[Tuple[int, int, str]]]:
+        """
+        The (width, height, mode) of every fixed-size resize that reads the loaded
+        frames directly. None when any other node uses the loaded pixels (or a
+        resize takes its size from another image), since that node needs them
+        at full resolution.
+        """
+        loaders = {node_id: outputs for node_id, node in workflow.items()
+                   if isinstance(node, dict)
+                   for class_type, outputs in SmartMediaManager.LOADER_PIXEL_OUTPUTS.items()
+                   if node.get('class_type') == class_type}
+        if not loaders:
+            return None
 
-                if match:
-                    prefix = match.group(1)
-                    version = match.group(2) if match.group(2) else "1"
-                    frame = match.group(3)
-                    ext = match.group(4)
+        resizes = []
+        for node_id, node in workflow.items():
+            if not isinstance(node, dict):
+                continue
+            inputs = node.get('inputs', {})
+            reads_pixels = any(isinstance(value, list) and len(value) == 2 and str(value[0]) in loaders
+                               and value[1] in loaders[str(value[0])] for value in inputs.values())
+            if not reads_pixels:
+                continue
+            spec = SmartMediaManager.RESIZE_NODES.get(node.get('class_type'))
+            if not spec:
+                return None
+            width, height = inputs.get(spec[0]), inputs.get(spec[1])
+            mode = spec[2](inputs)
+            if (mode is None or inputs.get('get_image_size') is not None
+                    or not isinstance(width, (int, float)) or not isinstance(height, (int, float))
+                    or (width <= 0 and height <= 0)):
+                return None
+            resizes.append((int(width), int(height), mode))
+        return resizes or None
 
-                    seq_name = f"{prefix}_v{version}"
+    @staticmethod
+    def negotiate_export_size(workflow: Dict, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """
+        Smallest frame size, keeping the plate's aspect ratio, from which the
+        workflow's first resize still produces exactly what it does from the full
+        plate. None when the workflow has no such resize or it wouldn't shrink the plate.
+        """
+        resizes = SmartMediaManager.find_loader_resizes(workflow)
+        if not resizes or width <= 0 or height <= 0:
+            return None
 
-                    if seq_name not in sequences:
-                        sequences[seq_name] = []
-                    sequences[seq_name].append(os.path.join(directory, filename))
-                else:
-                    # Single file or non-standard naming
-                    base = os.path.splitext(filename)[0]
-                    if base not in sequences:
-                        sequences[base] = []
-                    sequences[base].append(os.path.join(directory, filename))
+        scale = 0.0
+        for target_width, target_height, mode in resizes:
+            # 0 means "follow the other side" for all the supported nodes
+            ratios = [target / float(size) for target, size in ((target_width, width), (target_height, height))
+                      if target > 0]
+            scale = max(scale, min(ratios) if mode == 'fit' else max(ratios))
+        if scale >= 1.0:
+            return None
 
-            # Sort each sequence
-            for seq_name in sequences:
-                sequences[seq_name].sort()
+        # Round up to even sizes so the resize never has to upscale
+        export_width = min(width, -(-int(math.ceil(width * scale)) // 2) * 2)
+        export_height = min(height, -(-int(math.ceil(height * scale)) // 2) * 2)
+        return export_width, export_height
 
-        except Exception as e:
-            print(f"Error detecting sequences: {e}")
+    @staticmethod
+    def _sample_image(width: int, height: int):
+        """A plate-like test frame: gradients plus film grain"""
+        from PIL import Image
 
-        return sequences
+        channels = []
+        for angle, sigma in ((0, 24), (90, 18), (45, 30)):
+            gradient = Image.linear_gradient('L').rotate(angle).resize((width, height))
+            grain = Image.effect_noise((width, height), sigma)
+            channels.append(Image.blend(gradient, grain, 0.35))
+        return Image.merge('RGB', channels)
+
+    @staticmethod
+    def _encode(image, media_format: MediaFormat) -> bytes:
+        settings = SmartMediaManager.get_format_settings(media_format)
+        buffer = BytesIO()
+        if media_format == MediaFormat.JPEG:
+            image.save(buffer, 'JPEG', quality=settings['quality'])
+        elif media_format == MediaFormat.PNG:
+            image.save(buffer, 'PNG', compress_level=settings['compression'])
+        else:
+            # Flame's Tiff presets write uncompressed frames
+            image.save(buffer, 'TIFF')
+        return buffer.getvalue()
+
+    @staticmethod
+    def _measure_throughput(directory: str, size: int = 16 * 1024 * 1024) -> Dict[str, float]:
+        """
+        Write (with fsync) and read back a probe file; bytes per second. The read is
+        only measured where the written pages can be dropped from the page cache
+        first (posix_fadvise), otherwise it would measure memory bandwidth.
+        """
+        path = os.path.join(directory, f".format_probe_{uuid.uuid4().hex[:8]}")
+        data = os.urandom(size)
+        throughput = {}
+        try:
+            started = time.perf_counter()
+            with open(path, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+                written = time.perf_counter()
+                uncached = hasattr(os, 'posix_fadvise')
+                if uncached:
+                    os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+            throughput['write_bps'] = size / max(written - started, 1e-6)
+            if uncached:
+                started = time.perf_counter()
+                with open(path, 'rb') as f:
+                    while f.read(1024 * 1024):
+                        pass
+                throughput['read_bps'] = size / max(time.perf_counter() - started, 1e-6)
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return throughput
+
+    @staticmethod
+    def benchmark_formats(directory: str, width: int = 1920, height: int = 1080,
+                          formats: List[MediaFormat] = None, samples: int = 2) -> Dict:
+        """
+        Measure encode time, decode time and size per frame for each transport format,
+        plus write/read throughput of the directory frames go through.
+        Frames larger than 1920 px wide are measured at 1920 and scaled by pixel count.
+
+        Encoding is measured with Pillow, as a stand-in for Flame's exporter; decoding
+        with Pillow is what ComfyUI's image loaders do.
+        """
+        from PIL import Image
+
+        formats = formats or [MediaFormat.JPEG, MediaFormat.PNG, MediaFormat.TIFF]
+        sample_width = min(width, 1920)
+        sample_height = max(1, round(height * sample_width / width))
+        scale = (width * height) / float(sample_width * sample_height)
+        image = SmartMediaManager._sample_image(sample_width, sample_height)
+
+        results = {'width': width, 'height': height, 'directory': directory, 'measured_at': time.time(),
+                   'formats': {}}
+        results.update(SmartMediaManager._measure_throughput(directory))
+        for media_format in formats:
+            encode_times, decode_times = [], []
+            for _ in range(samples):
+                started = time.perf_counter()
+                data = SmartMediaManager._encode(image, media_format)
+                encoded = time.perf_counter()
+                Image.open(BytesIO(data)).load()
+                decode_times.append(time.perf_counter() - encoded)
+                encode_times.append(encoded - started)
+            size = len(data) * scale
+            cost = {
+                'encode_s': min(encode_times) * scale,
+                'decode_s': min(decode_times) * scale,
+                'bytes': int(size),
+                'transfer_s': size / results['write_bps'] + (size / results['read_bps'] if 'read_bps' in results else 0.0)
+            }
+            cost['total_s'] = cost['encode_s'] + cost['transfer_s'] + cost['decode_s']
+            results['formats'][media_format.value] = cost
+        return results
+
+    @staticmethod
+    def choose_transport_format(workflow_type: Optional[str], width: int, height: int, directory: str,
+                                cache_path: str = None, max_age: float = 7 * 86400,
+                                background: bool = False) -> Tuple[MediaFormat, Optional[Dict]]:
+        """
+        Pick the fastest format (encode + transfer + decode per frame) among those
+        adequate for the workflow class. Measurements are cached per directory and
+        resolution in cache_path for max_age seconds.
+
+        With background, a missing or stale measurement is taken on a background
+        thread and the class's first format is used until it is cached, so the
+        benchmark never runs inside an export.
+
+        Returns:
+            (MediaFormat, benchmark results or None when not measured yet or Pillow is unavailable)
+        """
+        candidates = SmartMediaManager.TRANSPORT_FORMATS.get(workflow_type, SmartMediaManager.TRANSPORT_FORMATS[None])
+        key = f"{os.path.abspath(directory)}|{width}x{height}"
+
+        results = SmartMediaManager._load_benchmarks(cache_path).get(key)
+        if not results or time.time() - results.get('measured_at', 0) > max_age:
+            if background:
+                with SmartMediaManager.benchmarks_lock:
+                    start = key not in SmartMediaManager.benchmarks_running
+                    SmartMediaManager.benchmarks_running.add(key)
+                if start:
+                    threading.Thread(target=SmartMediaManager._benchmark_in_background,
+                                     args=(key, directory, width, height, cache_path), daemon=True).start()
+                return candidates[0], None
+            try:
+                results = SmartMediaManager.benchmark_formats(directory, width, height)
+            except ImportError:
+                return candidates[0], None
+            SmartMediaManager._save_benchmark(cache_path, key, results)
+
+        measured = [f for f in candidates if f.value in results['formats']]
+        if not measured:
+            return candidates[0], results
+        return min(measured, key=lambda f: results['formats'][f.value]['total_s']), results
+
+    @staticmethod
+    def _load_benchmarks(cache_path: Optional[str]) -> Dict:
+        if cache_path and os.path.exists(cache_path):
+            try:
+                with open(cache_path, 'r') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"Error loading format benchmark cache: {e}")
+        return {}
+
+    @staticmethod
+    def _save_benchmark(cache_path: Optional[str], key: str, results: Dict):
+        if not cache_path:
+            return
+        with SmartMediaManager.benchmarks_lock:
+            cache = SmartMediaManager._load_benchmarks(cache_path)
+            cache[key] = results
+            try:
+                temp_path = f"{cache_path}.tmp"
+                with open(temp_path, 'w') as f:
+                    json.dump(cache, f, indent=2)
+                os.replace(temp_path, cache_path)
+            except Exception as e:
+                print(f"Error saving format benchmark cache: {e}")
+
+    @staticmethod
+    def _benchmark_in_background(key: str, directory: str, width: int, height: int, cache_path: Optional[str]):
+        try:
+            SmartMediaManager._save_benchmark(cache_path, key,
+                                              SmartMediaManager.benchmark_formats(directory, width, height))
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"Error benchmarking transport formats: {e}")
+        finally:
+            with SmartMediaManager.benchmarks_lock:
+                SmartMediaManager.benchmarks_running.discard(key)
+
+    @staticmethod
+    def auto_detect_sequences(directory: str) -> Dict[str, List[str]]:
+        """
+        Automatically detect and group image sequences in a directory
+
+        Returns:
+            Dictionary of sequence_name -> [file_paths]
+        """
+        import re
+
+        sequences = {}
+
+        try:
+            files = os.listdir(directory)
+            image_files = [f for f in files if f.endswith(('.jpg', '.jpeg', '.png', '.exr', '.dpx', '.tiff', '.tif'))]
+
+            for filename in image_files:
+                # Try to extract sequence pattern (name + frame number)
+                match = re.match(r'^(.+?)[-_]?v?(\d+)\.(\d{4,5})\.(jpg|jpeg|png|exr|dpx|tiff|tif)$', filename, re.IGNORECASE)
+
+                if match:
+                    prefix = match.group(1)
+                    version = match.group(2) if match.group(2) else "1"
+                    frame = match.group(3)
+                    ext = match.group(4)
+
+                    seq_name = f"{prefix}_v{version}"
+
+                    if seq_name not in sequences:
+                        sequences[seq_name] = []
+                    sequences[seq_name].append(os.path.join(directory, filename))
+                else:
+                    # Single file or non-standard naming
+                    base = os.path.splitext(filename)[0]
+                    if base not in sequences:
+                        sequences[base] = []
+                    sequences[base].append(os.path.join(directory, filename))
+
+            # Sort each sequence
+            for seq_name in sequences:
+                sequences[seq_name].sort()
+
+        except Exception as e:
+            print(f"Error detecting sequences: {e}")
+
+        return sequences
+
+# =============================================================================
+# EXPORT PRESETS
+# =============================================================================
+
+# Preset folder name (lowercase) -> format name used across this module (MediaFormat values)
+PRESET_FORMAT_NAMES = {
+    'jpeg': 'jpeg', 'jpg': 'jpeg', 'png': 'png', 'tiff': 'tiff', 'tif': 'tiff',
+    'openexr': 'exr', 'exr': 'exr', 'dpx': 'dpx', 'targa': 'targa', 'cineon': 'cineon', 'sgi': 'sgi'
+}
+
+# Bit depth picked when none is asked for
+DEFAULT_PRESET_BIT_DEPTHS = {'jpeg': 8, 'png': 8, 'tiff': 8, 'exr': 16, 'dpx': 10, 'targa': 8}
+
+class ExportPresetCatalog:
+    """
+    Every image-sequence export preset this Flame version can use, by format and bit depth.
+
+    Presets are discovered once (Autodesk, shared, project and user preset folders, then
+    the installed /opt/Autodesk/presets/<version> tree) and cached in cache_path under the
+    Flame version string. Later lookups only stat the preset folders and rescan when one
+    of them changed.
+    """
+
+    VISIBILITIES = ('Autodesk', 'Shared', 'Project', 'User')
+    PRESETS_ROOT = "/opt/Autodesk/presets"
+
+    def __init__(self, cache_path: str = None, flame_version: str = None, extra_dirs: List[str] = None):
+        self.cache_path = cache_path
+        self.flame_version = str(flame_version or self.detect_flame_version())
+        self.extra_dirs = list(extra_dirs or [])
+        self.lock = threading.Lock()
+        # {'roots': [...], 'signature': {folder: mtime_ns}, 'presets': [...], 'discovered_at': ts}
+        self.entry = None
+
+    @staticmethod
+    def detect_flame_version() -> str:
+        try:
+            if flame is not None and hasattr(flame, 'get_version'):
+                return str(flame.get_version())
+            if flame is not None and hasattr(flame, 'version'):
+                return str(flame.version)
+        except Exception:
+            pass
+        return "unknown"
+
+    @staticmethod
+    def parse_preset_name(filename: str) -> Dict:
+        """Bit depth and float flag from names like 'Tiff (16-bit fp).xml'"""
+        match = re.search(r'(\d+)\s*-?\s*bit(\s*fp)?', filename, re.IGNORECASE)
+        if not match:
+            return {'bit_depth': None, 'float': False}
+        return {'bit_depth': int(match.group(1)), 'float': bool(match.group(2))}
+
+    def candidate_roots(self) -> List[str]:
+        """Image-sequence preset folders, most authoritative first"""
+        roots = []
+        exporter = getattr(flame, 'PyExporter', None) if flame is not None else None
+        if exporter is not None:
+            for visibility in self.VISIBILITIES:
+                try:
+                    roots.append(exporter.get_presets_dir(getattr(exporter.PresetVisibility, visibility),
+                                                          exporter.PresetType.Image_Sequence))
+                except Exception:
+                    continue
+
+        suffix = os.path.join("export", "presets", "flame", "file_sequence")
+        roots.append(os.path.join(self.PRESETS_ROOT, self.flame_version, suffix))
+        # Newest installed preset tree, for versions whose folder name differs from get_version()
+        try:
+            installed = sorted(os.listdir(self.PRESETS_ROOT), reverse=True)
+        except OSError:
+            installed = []
+        roots.extend(os.path.join(self.PRESETS_ROOT, name, suffix) for name in installed)
+        roots.extend(self.extra_dirs)
+
+        unique = []
+        for root in roots:
+            if root and os.path.isdir(root) and os.path.abspath(root) not in unique:
+                unique.append(os.path.abspath(root))
+        return unique
+
+    @staticmethod
+    def _signature(folders: List[str]) -> Dict[str, int]:
+        signature = {}
+        for folder in folders:
+            try:
+                signature[folder] = os.stat(folder).st_mtime_ns
+            except OSError:
+                signature[folder] = -1
+        return signature
+
+    def discover(self) -> Dict:
+        """Scan the preset folders"""
+        roots = self.candidate_roots()
+        folders = list(roots)
+        presets = []
+        for priority, root in enumerate(roots):
+            try:
+                format_dirs = sorted(os.listdir(root))
+            except OSError:
+                continue
+            for format_dir in format_dirs:
+                directory = os.path.join(root, format_dir)
+                if not os.path.isdir(directory):
+                    continue
+                folders.append(directory)
+                media_format = PRESET_FORMAT_NAMES.get(format_dir.lower(), format_dir.lower())
+                for filename in sorted(os.listdir(directory)):
+                    if not filename.endswith('.xml'):
+                        continue
+                    preset = {'format': media_format, 'name': filename[:-4], 'path': os.path.join(directory, filename),
+                              'root': root, 'priority': priority}
+                    preset.update(self.parse_preset_name(filename))
+                    presets.append(preset)
+
+        return {'roots': roots, 'signature': self._signature(folders), 'presets': presets,
+                'discovered_at': time.time()}
+
+    def _load_cache(self) -> Dict:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"Error loading preset cache: {e}")
+            return {}
+
+    def _save_cache(self, entry: Dict):
+        if not self.cache_path:
+            return
+        cache = self._load_cache()
+        cache[self.flame_version] = entry
+        try:
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, 'w') as f:
+                json.dump(cache, f, indent=2)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            print(f"Error saving preset cache: {e}")
+
+    def refresh(self, force: bool = False) -> List[Dict]:
+        """Current presets; rescans only when forced or when a preset folder changed"""
+        with self.lock:
+            if self.entry is None and not force:
+                self.entry = self._load_cache().get(self.flame_version)
+            entry = self.entry
+            if force or not entry or self._signature(list(entry['signature'])) != entry['signature']:
+                entry = self.discover()
+                self.entry = entry
+                self._save_cache(entry)
+            return entry['presets']
+
+    @property
+    def roots(self) -> List[str]:
+        self.refresh()
+        return list(self.entry['roots'])
+
+    def formats(self) -> List[str]:
+        return sorted({preset['format'] for preset in self.refresh()})
+
+    def presets(self, media_format: str = None, bit_depth: int = None) -> List[Dict]:
+        """Presets for a format (and bit depth), best first: preferred depth, integer, folder priority"""
+        media_format = PRESET_FORMAT_NAMES.get(str(media_format).lower(), media_format) if media_format else None
+        wanted_depth = bit_depth or DEFAULT_PRESET_BIT_DEPTHS.get(media_format)
+        matches = [p for p in self.refresh()
+                   if (media_format is None or p['format'] == media_format)
+                   and (bit_depth is None or p['bit_depth'] == bit_depth)]
+        return sorted(matches, key=lambda p: (p['bit_depth'] != wanted_depth, p['float'], p['priority'], p['name']))
+
+    def find(self, media_format: str, bit_depth: int = None) -> Optional[str]:
+        """Path of the best preset for a format, or None"""
+        for attempt in range(2):
+            matches = self.presets(media_format, bit_depth)
+            if matches and os.path.exists(matches[0]['path']):
+                return matches[0]['path']
+            if attempt == 0 and matches:
+                # A preset vanished without its folder changing (e.g. a network mount): rescan
+                self.refresh(force=True)
+            else:
+                break
+        return None
+
+# =============================================================================
+# REGION OF INTEREST
+# =============================================================================
+
+class RegionOfInterest:
+    """
+    Crop-and-recomposite for passes that only matter inside part of the plate.
+
+    Regions are (x, y, width, height) in plate pixels, origin top left. Frames are
+    cropped with Pillow; bounding boxes and recompositing use NumPy, which is
+    optional: without it from_matte and recomposite return None.
+    """
+
+    IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff')
+
+    @staticmethod
+    def list_frames(directory: str) -> List[str]:
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory)
+                      if f.lower().endswith(RegionOfInterest.IMAGE_EXTENSIONS))
+
+    @staticmethod
+    def from_matte(paths: List[str], threshold: float = 0.01) -> Optional[Tuple[int, int, int, int]]:
+        """Union of the bounding boxes of a matte's frames (alpha, else luminance) above threshold"""
+        np = optional_import("numpy")
+        if np is None:
+            print("NumPy is required to derive a region from a matte")
+            return None
+        from PIL import Image
+
+        left = top = right = bottom = None
+        for path in paths:
+            with Image.open(path) as image:
+                band = image.getchannel('A') if 'A' in image.getbands() else image.convert('L')
+                values = np.asarray(band)
+            limit = threshold * (np.iinfo(values.dtype).max if values.dtype.kind in 'iu' else 1.0)
+            mask = values > limit
+            rows = np.flatnonzero(mask.any(axis=1))
+            if not rows.size:
+                continue
+            cols = np.flatnonzero(mask.any(axis=0))
+            box = (int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1)
+            if left is None:
+                left, top, right, bottom = box
+            else:
+                left, top = min(left, box[0]), min(top, box[1])
+                right, bottom = max(right, box[2]), max(bottom, box[3])
+        if left is None:
+            return None
+        return left, top, right - left, bottom - top
+
+    @staticmethod
+    def pad(region: Tuple[int, int, int, int], padding: int, width: int, height: int,
+            multiple: int = 8) -> Tuple[int, int, int, int]:
+        """Grow a region by padding on each side and to a multiple of `multiple`, inside the plate"""
+        x, y, w, h = region
+        spans = []
+        for start, size, limit in ((x, w, width), (y, h, height)):
+            start, end = max(0, start - padding), min(limit, start + size + padding)
+            # Most models want sizes divisible by 8: grow right/down, then left/up
+            missing = -(end - start) % multiple
+            grow = min(missing, limit - end)
+            end += grow
+            start = max(0, start - (missing - grow))
+            spans.append((start, end - start))
+        return spans[0][0], spans[1][0], spans[0][1], spans[1][1]
+
+    @staticmethod
+    def crop_frames(source_dir: str, target_dir: str, region: Tuple[int, int, int, int]) -> int:
+        """Write the region of every frame in source_dir to target_dir, same names. Returns the count"""
+        from PIL import Image
+
+        x, y, w, h = region
+        cropped = 0
+        for path in RegionOfInterest.list_frames(source_dir):
+            target = os.path.join(target_dir, os.path.basename(path))
+            with Image.open(path) as image:
+                crop = image.crop((x, y, x + w, y + h))
+            if target.lower().endswith(('.jpg', '.jpeg')):
+                crop.save(target, quality=95)
+            elif target.lower().endswith('.png'):
+                crop.save(target, compress_level=3)
+            else:
+                crop.save(target)
+            cropped += 1
+        return cropped
+
+    @staticmethod
+    def feather_weights(np, shape: Tuple[int, int], feather: int, open_edges: Tuple[bool, bool, bool, bool]):
+        """(h, w, 1) blend weights ramping from 0 to 1 over `feather` pixels on the open edges (l, t, r, b)"""
+        h, w = shape
+
+        def ramp(size, start_open, end_open):
+            weights = np.ones(size, dtype=np.float32)
+            if feather > 0:
+                distance = np.arange(size, dtype=np.float32) + 0.5
+                if start_open:
+                    weights = np.minimum(weights, distance / feather)
+                if end_open:
+                    weights = np.minimum(weights, distance[::-1] / feather)
+            return np.clip(weights, 0.0, 1.0)
+
+        left, top, right, bottom = open_edges
+        return np.minimum.outer(ramp(h, top, bottom), ramp(w, left, right))[:, :, None]
+
+    @staticmethod
+    def recomposite(output_path: str, plate_path: str, region: Tuple[int, int, int, int],
+                    feather: int = 0, target_path: str = None) -> Optional[Tuple[int, int]]:
+        """
+        Put a processed crop back into its full frame: the plate (scaled when the
+        workflow changed the resolution) outside the region, transparent when the
+        output has alpha, and a feathered blend over the padding. Writes target_path
+        (default: over output_path) and returns the frame size, or None without NumPy.
+        """
+        np = optional_import("numpy")
+        if np is None:
+            print("NumPy is required to recomposite region outputs")
+            return None
+        from PIL import Image
+
+        x, y, w, h = region
+        with Image.open(output_path) as output:
+            mode = 'RGBA' if 'A' in output.getbands() else 'RGB'
+            crop = np.asarray(output.convert(mode), dtype=np.float32)
+        crop_h, crop_w = crop.shape[:2]
+        scale_x, scale_y = crop_w / float(w), crop_h / float(h)
+
+        with Image.open(plate_path) as plate:
+            plate_w, plate_h = plate.size
+            full_size = (int(round(plate_w * scale_x)), int(round(plate_h * scale_y)))
+            plate = plate.convert('RGB')
+            if full_size != plate.size:
+                plate = plate.resize(full_size, Image.BICUBIC)
+            background = np.asarray(plate)
+
+        canvas = np.zeros((full_size[1], full_size[0], len(mode)), dtype=np.uint8)
+        canvas[:, :, :3] = background
+        left, top = int(round(x * scale_x)), int(round(y * scale_y))
+        crop = crop[:full_size[1] - top, :full_size[0] - left]
+        window = canvas[top:top + crop.shape[0], left:left + crop.shape[1]]
+
+        # Only feather the edges that are inside the frame
+        open_edges = (x > 0, y > 0, x + w < plate_w, y + h < plate_h)
+        weights = RegionOfInterest.feather_weights(np, crop.shape[:2], int(round(feather * scale_x)), open_edges)
+        window[...] = np.rint(crop * weights + window * (1.0 - weights)).astype(np.uint8)
+
+        # Through a temporary file, so outputs hard-linked to held frames aren't rewritten too
+        temp_path = f"{target_path or output_path}.tmp"
+        Image.fromarray(canvas, mode).save(temp_path, format='PNG', compress_level=3)
+        os.replace(temp_path, target_path or output_path)
+        return full_size
+
+# =============================================================================
+# HELD FRAMES
+# =============================================================================
+
+class FrameDeduplicator:
+    """
+    Find held frames in an exported sequence so each distinct image is rendered once.
+
+    Frames with identical pixels are duplicates wherever they are in the sequence
+    (file bytes aren't compared: DPX/EXR headers carry a per-frame timecode). With a
+    perceptual threshold, a frame whose 32x32 grey thumbnail differs from the
+    previous distinct frame's by less than threshold (mean absolute difference,
+    0-255) is also treated as held, which catches holds with re-applied grain or
+    compression noise. The perceptual check needs NumPy.
+    """
+
+    THUMBNAIL_SIZE = 32
+
+    @staticmethod
+    def _signature(path: str, thumbnails: bool):
+        """(pixel digest, grey thumbnail or None) of one frame"""
+        from PIL import Image
+
+        with Image.open(path) as image:
+            digest = hashlib.sha1(f"{image.mode} {image.size}".encode())
+            digest.update(image.tobytes())
+            thumbnail = None
+            if thumbnails:
+                np = optional_import("numpy")
+                size = (FrameDeduplicator.THUMBNAIL_SIZE, FrameDeduplicator.THUMBNAIL_SIZE)
+                thumbnail = np.asarray(image.convert('L').resize(size, Image.BILINEAR), dtype=np.float32)
+        return digest.hexdigest(), thumbnail
+
+    @staticmethod
+    def find_duplicates(paths: List[str], perceptual_threshold: float = 0.0, workers: int = 4) -> List[int]:
+        """For each frame, the index of the first frame showing the same image (its own index when distinct)"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        thumbnails = perceptual_threshold > 0 and optional_import("numpy") is not None
+        if perceptual_threshold > 0 and not thumbnails:
+            print("NumPy is not installed: only exact duplicate frames are detected")
+        # Pillow decodes without holding the GIL
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            signatures = list(executor.map(lambda path: FrameDeduplicator._signature(path, thumbnails), paths))
+
+        first_by_digest: Dict[str, int] = {}
+        mapping = []
+        previous = None
+        for index, (digest, thumbnail) in enumerate(signatures):
+            source = first_by_digest.setdefault(digest, index)
+            if source == index and thumbnails and previous is not None:
+                difference = float(abs(thumbnail - signatures[previous][1]).mean())
+                if difference < perceptual_threshold:
+                    source = first_by_digest[digest] = previous
+            mapping.append(source)
+            if source == index:
+                previous = index
+        return mapping
+
+# =============================================================================
+# SHOT BOUNDARIES
+# =============================================================================
+
+class SceneCutDetector:
+    """
+    Find the cuts in a conformed sequence from the colour histograms of its frames.
+
+    Each frame is reduced to a 64x36 thumbnail (JPEGs are decoded at reduced size)
+    and a 16-bin histogram per channel. The distance between two consecutive frames
+    is half the L1 difference of their normalized histograms: 0 for the same colours,
+    1 for none in common. A frame starts a new shot when that distance is above the
+    threshold and it is at least `min_shot` frames after the previous cut, so a flash
+    or a whip pan doesn't split a shot into slivers. Needs NumPy.
+    """
+
+    THUMBNAIL_SIZE = (64, 36)
+    BINS = 16
+
+    @staticmethod
+    def _thumbnail(path: str) -> bytes:
+        """RGB bytes of a frame's thumbnail"""
+        from PIL import Image
+
+        with Image.open(path) as image:
+            image.draft('RGB', SceneCutDetector.THUMBNAIL_SIZE)
+            return image.convert('RGB').resize(SceneCutDetector.THUMBNAIL_SIZE, Image.BILINEAR).tobytes()
+
+    @staticmethod
+    def histogram_distances(paths: List[str], workers: int = 4):
+        """Distance between each frame and the previous one (len(paths) - 1 values)"""
+        from concurrent.futures import ThreadPoolExecutor
+
+        np = optional_import("numpy")
+        if np is None:
+            raise ImportError("NumPy is required for scene cut detection")
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            thumbnails = list(executor.map(SceneCutDetector._thumbnail, paths))
+
+        bins = SceneCutDetector.BINS
+        pixels = np.frombuffer(b"".join(thumbnails), dtype=np.uint8).reshape(len(paths), -1, 3)
+        # One bincount for all frames and channels: bin = (frame * 3 + channel) * bins + level
+        offsets = (np.arange(len(paths))[:, None, None] * 3 + np.arange(3)[None, None, :]) * bins
+        index = offsets + pixels.astype(np.int64) // (256 // bins)
+        histograms = np.bincount(index.ravel(), minlength=len(paths) * 3 * bins).reshape(len(paths), 3 * bins)
+        histograms = histograms / float(pixels.shape[1] * 3)
+        return 0.5 * np.abs(np.diff(histograms, axis=0)).sum(axis=1)
+
+    @staticmethod
+    def find_cuts(paths: List[str], threshold: float = 0.35, min_shot: int = 8, workers: int = 4) -> List[int]:
+        """Indices of the frames that start a new shot (never 0)"""
+        if len(paths) < 2:
+            return []
+        np = optional_import("numpy")
+        distances = SceneCutDetector.histogram_distances(paths, workers)
+        cuts = []
+        previous = 0
+        for index in (np.flatnonzero(distances > threshold) + 1).tolist():
+            if index - previous >= min_shot:
+                cuts.append(index)
+                previous = index
+        return cuts
+
+# =============================================================================
+# OUTPUT VERIFICATION
+# =============================================================================
+
+class FrameVerifier:
+    """
+    Validate rendered frames from their headers and layout, without decoding them.
+
+    Files are memory-mapped, so only the pages holding the structure are read: a
+    PNG's chunk headers up to IEND, an EXR's header and scanline offset table, a
+    DPX's file and image headers, a TIFF's first IFD and strip or tile table. That
+    catches empty, truncated and half-written files and gives the resolution. With
+    check_crc, the CRC of every PNG chunk is checked too, which reads the whole file
+    (the IHDR CRC is always checked). Formats not listed here pass unchecked.
+    """
+
+    PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+    EXR_MAGIC = b'\x76\x2f\x31\x01'
+
+    # EXR compression -> scanlines per chunk (NONE, RLE, ZIPS, ZIP, PIZ, PXR24, B44, B44A, DWAA, DWAB)
+    EXR_LINES_PER_CHUNK = (1, 1, 1, 16, 32, 16, 32, 32, 32, 256)
+
+    @staticmethod
+    def _png(data, check_crc: bool) -> Tuple[int, int]:
+        if data[:8] != FrameVerifier.PNG_SIGNATURE:
+            raise ValueError("not a PNG")
+        position = 8
+        size = None
+        has_image_data = False
+        while True:
+            if position + 12 > len(data):
+                raise ValueError("truncated before IEND")
+            length, kind = struct.unpack_from('>I4s', data, position)
+            chunk_end = position + 12 + length
+            if chunk_end > len(data):
+                raise ValueError(f"truncated in {kind.decode('latin-1')} chunk")
+            if position == 8 and kind != b'IHDR':
+                raise ValueError("IHDR is not the first chunk")
+            if kind == b'IHDR' or check_crc:
+                if zlib.crc32(data[position + 4:chunk_end - 4]) != struct.unpack_from('>I', data, chunk_end - 4)[0]:
+                    raise ValueError(f"CRC mismatch in {kind.decode('latin-1')} chunk")
+            if kind == b'IHDR':
+                size = struct.unpack_from('>II', data, position + 8)
+            elif kind == b'IDAT':
+                has_image_data = True
+            elif kind == b'IEND':
+                break
+            position = chunk_end
+        if not has_image_data:
+            raise ValueError("no image data")
+        return size
+
+    @staticmethod
+    def _exr(data) -> Tuple[int, int]:
+        flags = struct.unpack_from('<I', data, 4)[0]
+        attributes = {}
+        position = 8
+        while data[position] != 0:
+            name_end = data.find(b'\x00', position)
+            type_end = data.find(b'\x00', name_end + 1)
+            if name_end < 0 or type_end < 0:
+                raise ValueError("truncated header")
+            value_size = struct.unpack_from('<i', data, type_end + 1)[0]
+            value_start = type_end + 5
+            if value_start + value_size > len(data):
+                raise ValueError("truncated header")
+            attributes[bytes(data[position:name_end])] = value_start
+            position = value_start + value_size
+        if b'dataWindow' not in attributes:
+            raise ValueError("no dataWindow")
+        x_min, y_min, x_max, y_max = struct.unpack_from('<4i', data, attributes[b'dataWindow'])
+        size = (x_max - x_min + 1, y_max - y_min + 1)
+        # Tiled, deep and multi-part files: header only
+        if flags & 0x1a00:
+            return size
+
+        compression = data[attributes[b'compression']] if b'compression' in attributes else 0
+        lines = FrameVerifier.EXR_LINES_PER_CHUNK[compression] if compression < 10 else 1
+        chunk_count = -(-size[1] // lines)
+        table_start = position + 1
+        table_end = table_start + chunk_count * 8
+        if table_end > len(data):
+            raise ValueError("truncated offset table")
+        offsets = struct.unpack_from(f'<{chunk_count}Q', data, table_start)
+        if min(offsets) < table_end or max(offsets) + 8 > len(data):
+            raise ValueError("scanline chunk missing")
+        last = max(offsets)
+        if last + 8 + struct.unpack_from('<i', data, last + 4)[0] > len(data):
+            raise ValueError("truncated in the last scanline chunk")
+        return size
+
+    @staticmethod
+    def _dpx(data) -> Tuple[int, int]:
+        endian = '>' if data[:4] == b'SDPX' else '<'
+        image_offset = struct.unpack_from(endian + 'I', data, 4)[0]
+        file_size = struct.unpack_from(endian + 'I', data, 16)[0]
+        width, height = struct.unpack_from(endian + 'II', data, 772)
+        if len(data) < max(file_size, image_offset + 1):
+            raise ValueError(f"truncated: {len(data)} of {file_size} bytes")
+        return width, height
+
+    @staticmethod
+    def _tiff(data) -> Tuple[int, int]:
+        endian = '<' if data[:2] == b'II' else '>'
+        ifd = struct.unpack_from(endian + 'I', data, 4)[0]
+        entry_count = struct.unpack_from(endian + 'H', data, ifd)[0]
+        if ifd + 2 + entry_count * 12 > len(data):
+            raise ValueError("truncated IFD")
+
+        def values(tag):
+            for index in range(entry_count):
+                entry = ifd + 2 + index * 12
+                entry_tag, kind, count = struct.unpack_from(endian + 'HHI', data, entry)
+                if entry_tag != tag:
+                    continue
+                item = {3: 'H', 4: 'I'}.get(kind)
+                if item is None:
+                    raise ValueError(f"unexpected type for tag {tag}")
+                start = entry + 8
+                if count * struct.calcsize(item) > 4:
+                    start = struct.unpack_from(endian + 'I', data, start)[0]
+                if start + count * struct.calcsize(item) > len(data):
+                    raise ValueError(f"truncated tag {tag}")
+                return struct.unpack_from(f"{endian}{count}{item}", data, start)
+            return ()
+
+        width, height = (values(256) or (0,))[0], (values(257) or (0,))[0]
+        offsets = values(273) or values(324)
+        byte_counts = values(279) or values(325)
+        if not offsets or len(offsets) != len(byte_counts):
+            raise ValueError("no image data")
+        if any(offset + count > len(data) for offset, count in zip(offsets, byte_counts)):
+            raise ValueError("truncated image data")
+        return width, height
+
+    @staticmethod
+    def inspect(path: str, check_crc: bool = False) -> Optional[Tuple[int, int]]:
+        """Resolution of a valid frame (None for formats that aren't checked); raises ValueError otherwise"""
+        if os.path.getsize(path) == 0:
+            raise ValueError("empty file")
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            magic = data[:4]
+            try:
+                if magic == FrameVerifier.PNG_SIGNATURE[:4]:
+                    return FrameVerifier._png(data, check_crc)
+                if magic == FrameVerifier.EXR_MAGIC:
+                    return FrameVerifier._exr(data)
+                if magic in (b'SDPX', b'XPDS'):
+                    return FrameVerifier._dpx(data)
+                if magic in (b'II*\x00', b'MM\x00*'):
+                    return FrameVerifier._tiff(data)
+            except (struct.error, IndexError):
+                raise ValueError("truncated header")
+        return None
+
+    @staticmethod
+    def verify_frames(paths: List[str], expected_size: Optional[Tuple[int, int]] = None,
+                      check_crc: bool = False, workers: int = 8) -> Dict[str, str]:
+        """
+        Invalid frames among paths, with the reason. A frame at another resolution
+        than expected_size (by default the most common one) is invalid too.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        def check(path):
+            try:
+                return FrameVerifier.inspect(path, check_crc), None
+            except Exception as e:
+                return None, str(e)
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            results = list(executor.map(check, paths))
+
+        sizes = [tuple(size) for size, reason in results if size]
+        if expected_size is None and sizes:
+            expected_size = Counter(sizes).most_common(1)[0][0]
+        invalid = {}
+        for path, (size, reason) in zip(paths, results):
+            if reason:
+                invalid[path] = reason
+            elif size and expected_size and tuple(size) != tuple(expected_size):
+                invalid[path] = f"{size[0]}x{size[1]} instead of {expected_size[0]}x{expected_size[1]}"
+        return invalid
+
+# =============================================================================
+# TILED PROCESSING
+# =============================================================================
+
+class TiledProcessor:
+    """
+    Run frames too large for one GPU as overlapping tiles spread over a pool of servers.
+
+    Each tile is uploaded to a server and processed as its own prompt, with the
+    workflow's frame loader swapped for a LoadImage of that tile. Whichever server
+    is free takes the next tile, failed tiles are retried on the pool, and the
+    outputs of every save node are blended back into full frames with feathered
+    NumPy weights. Only per-pixel workflows (upscalers, filters) should be tiled:
+    anything that looks at the whole frame would see a different image per tile.
+    """
+
+    LOADER_TYPES = ('VHS_LoadImagesPath', 'LoadImage')
+    SAVE_TYPES = ('SaveImage', 'SaveImageWithAlpha')
+    UPLOAD_SUBFOLDER = "flame_tiles"
+
+    def __init__(self, servers: List[str], workflow: Dict, tile_size: int = 1024, overlap: int = 128,
+                 max_attempts: int = 3, poll_interval: float = 0.5, timeout: float = 3600.0,
+                 frames_in_flight: int = 2):
+        self.servers = [url.rstrip('/') for url in servers]
+        self.workflow = workflow
+        self.tile_size = tile_size
+        self.overlap = min(overlap, tile_size // 2)
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.frames_in_flight = max(1, frames_in_flight)
+        self.client_id = f"flame_tiles_{uuid.uuid4().hex[:12]}"
+        self.save_nodes = {node_id: node['inputs']['filename_prefix'] for node_id, node in workflow.items()
+                           if isinstance(node, dict) and node.get('class_type') in self.SAVE_TYPES
+                           and isinstance(node.get('inputs', {}).get('filename_prefix'), str)}
+        self.stats = {'tiles': 0, 'retries': 0, 'failed_tiles': 0, 'tiles_per_server': {url: 0 for url in self.servers}}
+
+    @staticmethod
+    def plan_tiles(width: int, height: int, tile_size: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+        """(x, y, w, h) tiles of at most tile_size covering the frame, overlapping by at least `overlap`"""
+        def starts(size):
+            if size <= tile_size:
+                return [0]
+            step = max(1, tile_size - overlap)
+            positions = list(range(0, size - tile_size, step))
+            # The last tile ends on the frame edge, keeping every tile full size
+            positions.append(size - tile_size)
+            return positions
+
+        return [(x, y, min(tile_size, width), min(tile_size, height))
+                for y in starts(height) for x in starts(width)]
+
+    @staticmethod
+    def can_tile(workflow: Dict) -> bool:
+        """One frame loader and at least one save node"""
+        loaders = [n for n in workflow.values()
+                   if isinstance(n, dict) and n.get('class_type') in TiledProcessor.LOADER_TYPES]
+        saves = [n for n in workflow.values()
+                 if isinstance(n, dict) and n.get('class_type') in TiledProcessor.SAVE_TYPES]
+        return len(loaders) == 1 and bool(saves)
+
+    def tile_workflow(self, image_name: str, tag: str) -> Dict:
+        """The workflow loading one uploaded tile and saving under tile-specific prefixes"""
+        workflow = json.loads(json.dumps(self.workflow))
+        for node_id, node in workflow.items():
+            if not isinstance(node, dict):
+                continue
+            if node.get('class_type') in self.LOADER_TYPES:
+                workflow[node_id] = {'class_type': 'LoadImage', 'inputs': {'image': image_name},
+                                     '_meta': {'title': 'Flame tile'}}
+            elif node_id in self.save_nodes:
+                node['inputs']['filename_prefix'] = f"{self.UPLOAD_SUBFOLDER}/{tag}_{node_id}"
+        return workflow
+
+    def _run_tile(self, server: str, tile_png: bytes, tag: str) -> Dict[str, Any]:
+        """Upload, queue and collect one tile on one server: save node id -> image array"""
+        requests = optional_import("requests")
+        np = optional_import("numpy")
+        from PIL import Image
+
+        response = requests.post(f"{server}/upload/image",
+                                 files={'image': (f"{tag}.png", tile_png, 'image/png')},
+                                 data={'subfolder': self.UPLOAD_SUBFOLDER, 'overwrite': 'true'}, timeout=60)
+        response.raise_for_status()
+        uploaded = response.json()
+        image_name = f"{uploaded['subfolder']}/{uploaded['name']}" if uploaded.get('subfolder') else uploaded['name']
+
+        response = requests.post(f"{server}/prompt", timeout=30,
+                                 json={'prompt': self.tile_workflow(image_name, tag), 'client_id': self.client_id})
+        response.raise_for_status()
+        prompt_id = response.json()['prompt_id']
+
+        deadline = time.time() + self.timeout
+        while True:
+            response = requests.get(f"{server}/history/{prompt_id}", timeout=30)
+            response.raise_for_status()
+            entry = response.json().get(prompt_id)
+            if entry:
+                break
+            if time.time() > deadline:
+                raise TimeoutError(f"tile {tag} timed out on {server}")
+            time.sleep(self.poll_interval)
+
+        if entry.get('status', {}).get('status_str') == 'error':
+            raise RuntimeError(f"tile {tag} failed on {server}: {entry['status'].get('messages')}")
+
+        images = {}
+        for node_id in self.save_nodes:
+            outputs = entry.get('outputs', {}).get(node_id, {}).get('images') or []
+            if not outputs:
+                raise RuntimeError(f"tile {tag}: node {node_id} returned no image on {server}")
+            response = requests.get(f"{server}/view", params=outputs[0], timeout=60)
+            response.raise_for_status()
+            with Image.open(BytesIO(response.content)) as image:
+                images[node_id] = np.asarray(image.convert('RGBA' if 'A' in image.getbands() else 'RGB'))
+        return images
+
+    def blend(self, tiles: List[Tuple[Tuple[int, int, int, int], Any]], width: int, height: int):
+        """Full frame from (region, tile output) pairs, cross-fading over the overlaps"""
+        np = optional_import("numpy")
+        (_, _, tile_w, tile_h), first = tiles[0]
+        scale_x, scale_y = first.shape[1] / float(tile_w), first.shape[0] / float(tile_h)
+        full_w, full_h = int(round(width * scale_x)), int(round(height * scale_y))
+        channels = max(tile.shape[2] if tile.ndim == 3 else 1 for _, tile in tiles)
+
+        canvas = np.zeros((full_h, full_w, channels), dtype=np.float32)
+        weights = np.zeros((full_h, full_w, 1), dtype=np.float32)
+        feather = int(round(self.overlap * scale_x))
+        for (x, y, w, h), tile in tiles:
+            if tile.ndim == 2:
+                tile = tile[:, :, None]
+            if tile.shape[2] < channels:
+                # An RGB tile in an RGBA frame is opaque
+                tile = np.concatenate([tile, np.full(tile.shape[:2] + (channels - tile.shape[2],), 255, tile.dtype)], 2)
+            left, top = int(round(x * scale_x)), int(round(y * scale_y))
+            tile = tile[:full_h - top, :full_w - left].astype(np.float32)
+            weight = RegionOfInterest.feather_weights(np, tile.shape[:2], feather,
+                                                     (x > 0, y > 0, x + w < width, y + h < height))
+            canvas[top:top + tile.shape[0], left:left + tile.shape[1]] += tile * weight
+            weights[top:top + tile.shape[0], left:left + tile.shape[1]] += weight
+        return np.rint(canvas / np.maximum(weights, 1e-6)).clip(0, 255).astype(np.uint8)
+
+    def process_frames(self, frame_paths: List[str], output_dir: str) -> int:
+        """
+        Process every frame and write each save node's result into output_dir the way
+        SaveImage names them (<filename_prefix>_<frame:05d>_.png). Returns the number
+        of frames written; frames that can't be read or with a tile that failed on every
+        attempt are skipped.
+        """
+        if optional_import("requests") is None or optional_import("numpy") is None:
+            print("Tiled processing needs requests and numpy")
+            return 0
+        from PIL import Image
+
+        work = queue.Queue()
+        frames: Dict[int, Dict] = {}
+        lock = threading.Lock()
+        in_flight = threading.Semaphore(self.frames_in_flight)
+        written = []
+
+        def finish_frame(index):
+            frame = frames.pop(index)
+            try:
+                if frame['failed']:
+                    print(f"Frame {index + 1}: {frame['failed']} tile(s) failed, frame skipped")
+                    return
+                for node_id, prefix in self.save_nodes.items():
+                    image = self.blend([(frame['regions'][t], frame['outputs'][t][node_id])
+                                        for t in range(len(frame['regions']))], frame['width'], frame['height'])
+                    path = os.path.join(output_dir, f"{prefix}_{index + 1:05d}_.png")
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    Image.fromarray(image).save(path, compress_level=3)
+                written.append(index)
+            except Exception as e:
+                print(f"Frame {index + 1}: could not assemble tiles: {e}")
+            finally:
+                in_flight.release()
+
+        def tile_done(index, tile_index, outputs):
+            with lock:
+                frame = frames[index]
+                if outputs is None:
+                    frame['failed'] += 1
+                else:
+                    frame['outputs'][tile_index] = outputs
+                frame['remaining'] -= 1
+                complete = frame['remaining'] == 0
+            if complete:
+                finish_frame(index)
+
+        def worker(server):
+            failures_in_a_row = 0
+            while True:
+                unit = work.get()
+                if unit is None:
+                    break
+                index, tile_index, tile_png, attempts = unit
+                tag = f"{self.client_id}_{index:05d}_{tile_index:03d}"
+                try:
+                    outputs = self._run_tile(server, tile_png, tag)
+                    failures_in_a_row = 0
+                    with lock:
+                        self.stats['tiles'] += 1
+                        self.stats['tiles_per_server'][server] += 1
+                    tile_done(index, tile_index, outputs)
+                except Exception as e:
+                    failures_in_a_row += 1
+                    print(f"Tile {tag} failed on {server} (attempt {attempts + 1}/{self.max_attempts}): {e}")
+                    if attempts + 1 < self.max_attempts:
+                        with lock:
+                            self.stats['retries'] += 1
+                        work.put((index, tile_index, tile_png, attempts + 1))
+                    else:
+                        with lock:
+                            self.stats['failed_tiles'] += 1
+                        tile_done(index, tile_index, None)
+                    if failures_in_a_row >= self.max_attempts:
+                        # Leave this server's share to the others
+                        print(f"Removing {server} from the tile pool after {failures_in_a_row} failures")
+                        with lock:
+                            alive.discard(server)
+                            last = not alive
+                        if not last:
+                            break
+                        failures_in_a_row = 0
+
+        alive = set(self.servers)
+        threads = [threading.Thread(target=worker, args=(server,), daemon=True) for server in self.servers]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for index, path in enumerate(frame_paths):
+                in_flight.acquire()
+                try:
+                    # Cut every tile before queuing any, so a frame that can't be read queues nothing
+                    with Image.open(path) as image:
+                        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+                        regions = self.plan_tiles(image.width, image.height, self.tile_size, self.overlap)
+                        tiles = []
+                        for x, y, w, h in regions:
+                            buffer = BytesIO()
+                            image.crop((x, y, x + w, y + h)).save(buffer, format='PNG', compress_level=1)
+                            tiles.append(buffer.getvalue())
+                except Exception as e:
+                    print(f"Frame {index + 1}: could not read {path}: {e}, frame skipped")
+                    in_flight.release()
+                    continue
+                with lock:
+                    frames[index] = {'regions': regions, 'outputs': {}, 'remaining': len(regions), 'failed': 0,
+                                     'width': image.width, 'height': image.height}
+                for tile_index, tile_png in enumerate(tiles):
+                    work.put((index, tile_index, tile_png, 0))
+
+            # Wait for the last frames
+            for _ in range(self.frames_in_flight):
+                in_flight.acquire()
+        finally:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join(timeout=5)
+        return len(written)
 
 # =============================================================================
 # ROBUST COMFYUI CLIENT
@@ -872,6 +3148,7 @@ class RobustComfyUIClient:
 
     def check_health(self) -> bool:
         """Ping ComfyUI to ensure it's responsive"""
+        requests = optional_import("requests")
         try:
             response = requests.get(f"{self.url}/system_stats", timeout=5)
             return response.status_code == 200
@@ -890,6 +3167,11 @@ class RobustComfyUIClient:
         Returns:
             Response JSON or None on failure
         """
+        requests = optional_import("requests")
+        if requests is None:
+            print(f"Cannot call {endpoint}: requests is not installed")
+            return None
+
         for attempt in range(self.max_retries):
             try:
                 url = f"{self.url}{endpoint}"
@@ -917,10 +3199,12 @@ class RobustComfyUIClient:
 
             # Exponential backoff
             if attempt < self.max_retries - 1:
+                get_metrics().inc('flame_comfyui_retries_total', operation=endpoint)
                 delay = self.retry_delay * (2 ** attempt)
                 print(f"Retrying in {delay} seconds...")
                 time.sleep(delay)
 
+        get_metrics().inc('flame_comfyui_failures_total', stage=f"api{endpoint}")
         return None
 
     def auto_recover(self) -> bool:
@@ -937,6 +3221,8 @@ class RobustComfyUIClient:
             print("ComfyUI is not responding")
             return False
 
+        requests = optional_import("requests")
+
         # Try to clear queue
         try:
             response = requests.post(f"{self.url}/queue", json={"clear": True}, timeout=10)
@@ -958,17 +3244,558 @@ class RobustComfyUIClient:
         return False
 
 # =============================================================================
-# UTILITY FUNCTIONS
+# LOGGING
+# =============================================================================
+
+LOG_LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+# Per-thread context (job id, stage...) added to every log line
+_log_context = threading.local()
+
+@contextmanager
+def log_context(**fields):
+    """
+    Tag every log line written by this thread with fields, e.g.
+    `with log_context(job=job_id): ...`
+    """
+    previous = getattr(_log_context, 'fields', {})
+    _log_context.fields = {**previous, **fields}
+    try:
+        yield
+    finally:
+        _log_context.fields = previous
+
+class BufferedLogger:
+    """
+    Non-blocking file logger.
+
+    log() only formats the line and queues it; a background thread writes
+    queued lines in batches through one open file handle, rotates the file
+    when it grows past max_bytes, and truncates oversized messages.
+    """
+
+    def __init__(self, path: str, level: str = "INFO", max_bytes: int = 10 * 1024 * 1024,
+                 backup_count: int = 3, max_message_chars: int = 4000, flush_interval: float = 0.5):
+        self.path = path
+        self.level = LOG_LEVELS.get(level.upper(), 20)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.max_message_chars = max_message_chars
+        self.flush_interval = flush_interval
+        self.lines: deque = deque()
+        self.condition = threading.Condition()
+        self.thread = None
+        self.writing = False
+        self.file = None
+        self.size = 0
+
+    def log(self, message: str, level: str = "INFO"):
+        """Queue a message; never blocks on disk I/O"""
+        level = level.upper()
+        if LOG_LEVELS.get(level, 20) < self.level:
+            return
+
+        message = str(message)
+        if len(message) > self.max_message_chars:
+            message = f"{message[:self.max_message_chars]}... [{len(message) - self.max_message_chars} chars truncated]"
+
+        fields = getattr(_log_context, 'fields', None)
+        context = "".join(f" [{key}={value}]" for key, value in fields.items()) if fields else ""
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        line = f"[{timestamp}] [{level}]{context} {message}\n"
+
+        with self.condition:
+            self.lines.append(line)
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._write_loop, name="log-writer", daemon=True)
+                self.thread.start()
+            if level == 'ERROR':
+                self.condition.notify()
+
+    def debug(self, message: str):
+        self.log(message, "DEBUG")
+
+    def info(self, message: str):
+        self.log(message, "INFO")
+
+    def warning(self, message: str):
+        self.log(message, "WARNING")
+
+    def error(self, message: str):
+        self.log(message, "ERROR")
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Wait until every queued line is on disk"""
+        deadline = time.time() + timeout
+        with self.condition:
+            self.condition.notify()
+            while self.lines or self.writing:
+                remaining = deadline - time.time()
+                if remaining <= 0 or self.thread is None:
+                    return False
+                self.condition.wait(min(remaining, 0.05))
+        return True
+
+    def reset(self, header: str = ""):
+        """Empty the log file and start it with header; lines still queued follow it"""
+        with self.condition:
+            while self.writing:
+                self.condition.wait(0.05)
+            try:
+                if self.file is not None and not self.file.closed:
+                    self.file.close()
+                self.file = open(self.path, "w")
+                self.file.write(header)
+                self.file.flush()
+                self.size = len(header)
+            except Exception:
+                self.file = None
+
+    def _write_loop(self):
+        while True:
+            with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+                if not self.lines:
+                    self.condition.wait(self.flush_interval)
+                if not self.lines:
+                    continue
+                batch = "".join(self.lines)
+                self.lines.clear()
+                self.writing = True
+            self._write(batch)
+
+    def _write(self, text: str):
+        try:
+            if self.file is None or self.file.closed:
+                self.file = open(self.path, "a")
+                self.size = self.file.tell()
+            if self.max_bytes and self.size + len(text) > self.max_bytes:
+                self._rotate()
+            self.file.write(text)
+            self.file.flush()
+            self.size += len(text)
+        except Exception:
+            # Logging must never take the host application down
+            self.file = None
+
+    def _rotate(self):
+        """Shift path -> path.1 -> ... -> path.<backup_count>"""
+        self.file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backup_count > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self.file = open(self.path, "a")
+        self.size = 0
+
+_loggers: Dict[str, BufferedLogger] = {}
+_loggers_lock = threading.Lock()
+
+def get_logger(path: str = "/tmp/flame_comfyui_v3.log", **kwargs) -> BufferedLogger:
+    """Get the shared BufferedLogger writing to path (kwargs apply on first use)"""
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            logger = BufferedLogger(path, **kwargs)
+            _loggers[path] = logger
+        return logger
+
+@atexit.register
+def _flush_loggers():
+    for logger in list(_loggers.values()):
+        logger.flush(timeout=2.0)
+
+# =============================================================================
+# JOB TRACING
 # =============================================================================
 
-def log_to_file(message: str, log_file: str = "/tmp/flame_comfyui_v3.log"):
-    """Write a message to log file with timestamp"""
+class JobTracer:
+    """
+    Stage timings (spans) for one job.
+
+    Each span is appended to <trace_dir>/<job_id>.jsonl when it ends.
+    finish() appends a per-stage summary and, with chrome_trace, also writes
+    <job_id>.trace.json for chrome://tracing or Perfetto.
+    """
+
+    def __init__(self, job_id: str, trace_dir: str = "/tmp/flame_comfyui/traces",
+                 chrome_trace: bool = False, attributes: Dict = None):
+        self.job_id = job_id
+        self.trace_dir = trace_dir
+        self.trace_path = os.path.join(trace_dir, f"{job_id}.jsonl")
+        self.chrome_trace = chrome_trace
+        self.attributes = attributes or {}
+        self.started = time.time()
+        self.spans: List[Dict] = []
+        self.summary_record: Optional[Dict] = None
+        self.lock = threading.Lock()
+        try:
+            os.makedirs(trace_dir, exist_ok=True)
+        except OSError as e:
+            print(f"Error creating trace directory: {e}")
+        self._write({'type': 'job', 'job_id': job_id, 'start': self.started, **(attributes or {})})
+
+    @contextmanager
+    def span(self, name: str, **attributes):
+        """Time a block; the yielded dict can be filled with more attributes"""
+        start = time.time()
+        status = 'ok'
+        try:
+            yield attributes
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            self.add_span(name, start, time.time(), status=status, **attributes)
+
+    def add_span(self, name: str, start: float, end: float, **attributes):
+        """Record a span measured elsewhere (e.g. queue wait reported by the server)"""
+        record = {
+            'type': 'span',
+            'name': name,
+            'start': start,
+            'duration': max(0.0, end - start),
+            'thread': threading.current_thread().name,
+            **attributes
+        }
+        with self.lock:
+            self.spans.append(record)
+        self._write(record)
+        get_metrics().observe('flame_comfyui_stage_seconds', record['duration'], stage=name)
+
+    def summary(self) -> Dict:
+        """Total time and count per stage"""
+        stages: Dict[str, Dict] = {}
+        with self.lock:
+            spans = list(self.spans)
+        for span in spans:
+            stage = stages.setdefault(span['name'], {'count': 0, 'total': 0.0})
+            stage['count'] += 1
+            stage['total'] += span['duration']
+        return {
+            'type': 'summary',
+            'job_id': self.job_id,
+            'wall': time.time() - self.started,
+            'stages': stages
+        }
+
+    def format_summary(self, summary: Dict = None) -> str:
+        summary = summary or self.summary()
+        stages = " | ".join(f"{name} {stage['total']:.2f}s" for name, stage in summary['stages'].items())
+        return f"Job {self.job_id[:8]} took {summary['wall']:.2f}s: {stages}"
+
+    def finish(self, status: str = 'completed') -> Dict:
+        """Write the summary (once) and the optional Chrome trace"""
+        with self.lock:
+            if self.summary_record is not None:
+                return self.summary_record
+        summary = self.summary()
+        summary['status'] = status
+        with self.lock:
+            self.summary_record = summary
+        self._write(summary)
+        if self.chrome_trace:
+            self.write_chrome_trace()
+        return summary
+
+    def write_chrome_trace(self, path: Optional[str] = None) -> Optional[str]:
+        """Write the spans as Chrome trace 'complete' events"""
+        path = path or os.path.join(self.trace_dir, f"{self.job_id}.trace.json")
+        with self.lock:
+            spans = list(self.spans)
+
+        # Chrome traces want numeric thread ids; names go in metadata events
+        thread_ids: Dict[str, int] = {}
+        for span in spans:
+            thread_ids.setdefault(span['thread'], len(thread_ids) + 1)
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': tid, 'args': {'name': name}}
+                  for name, tid in thread_ids.items()]
+        events += [{
+            'name': span['name'],
+            'cat': 'job',
+            'ph': 'X',
+            'ts': int(span['start'] * 1e6),
+            'dur': int(span['duration'] * 1e6),
+            'pid': 1,
+            'tid': thread_ids[span['thread']],
+            'args': {k: v for k, v in span.items() if k not in ('type', 'name', 'start', 'duration', 'thread')}
+        } for span in spans]
+        try:
+            with open(path, 'w') as f:
+                json.dump({'traceEvents': events, 'otherData': {'job_id': self.job_id}}, f)
+            return path
+        except Exception as e:
+            print(f"Error writing Chrome trace: {e}")
+            return None
+
+    def _write(self, record: Dict):
+        try:
+            with self.lock:
+                with open(self.trace_path, 'a') as f:
+                    f.write(json.dumps(record, default=str) + "\n")
+        except Exception as e:
+            print(f"Error writing trace: {e}")
+
+# The tracer of the job running on this thread
+_trace_state = threading.local()
+
+def current_tracer() -> Optional[JobTracer]:
+    return getattr(_trace_state, 'tracer', None)
+
+@contextmanager
+def use_tracer(tracer: Optional[JobTracer]):
+    """Make tracer the current tracer of this thread for the block"""
+    previous = current_tracer()
+    _trace_state.tracer = tracer
     try:
-        with open(log_file, "a") as f:
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"[{timestamp}] {message}\n")
-    except:
-        pass
+        yield tracer
+    finally:
+        _trace_state.tracer = previous
+
+@contextmanager
+def trace_span(name: str, **attributes):
+    """Span on the current thread's tracer; a no-op when no job is traced"""
+    tracer = current_tracer()
+    if tracer is None:
+        yield attributes
+        return
+    with tracer.span(name, **attributes) as span_attributes:
+        yield span_attributes
+
+# =============================================================================
+# METRICS
+# =============================================================================
+
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0)
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+def _escape_label(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Metric:
+    """One metric family (counter, gauge or histogram) with optional labels"""
+
+    def __init__(self, name: str, kind: str, help_text: str, label_names: tuple = (),
+                 buckets: tuple = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.kind = kind
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self.values: Dict[tuple, Any] = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self._key(labels)] = float(value)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                # [count per bucket..., sum, count]
+                state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[index] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def _labels(self, key: tuple, extra: str = '') -> str:
+        parts = [f'{name}="{_escape_label(value)}"' for name, value in zip(self.label_names, key)]
+        if extra:
+            parts.append(extra)
+        return '{' + ','.join(parts) + '}' if parts else ''
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            items = sorted(self.values.items())
+            items = [(key, list(value) if isinstance(value, list) else value) for key, value in items]
+        for key, value in items:
+            if self.kind != 'histogram':
+                lines.append(f"{self.name}{self._labels(key)} {_format_value(value)}")
+                continue
+            for bound, count in zip(self.buckets, value):
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{self._labels(key, le)} {count}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{self._labels(key, le)} {value[-1]}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(value[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {value[-1]}")
+        return lines
+
+class MetricsRegistry:
+    """
+    Counters, gauges and histograms rendered in Prometheus text format.
+
+    Served on a local HTTP endpoint (serve) and/or written to a snapshot file
+    at a fixed interval (start_snapshots). Collectors registered with
+    add_collector refresh gauges right before each render.
+    """
+
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors: List[Callable] = []
+        self.lock = threading.Lock()
+        self.server = None
+        self.snapshot_thread = None
+
+    def declare(self, name: str, kind: str, help_text: str, label_names: tuple = (), **kwargs) -> Metric:
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = self.metrics[name] = Metric(name, kind, help_text, label_names, **kwargs)
+            return metric
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        metric = self.metrics.get(name)
+        if metric:
+            metric.inc(amount, **labels)
+
+    def set(self, name: str, value: float, **labels):
+        metric = self.metrics.get(name)
+        if metric:
+            metric.set(value, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        metric = self.metrics.get(name)
+        if metric:
+            metric.observe(value, **labels)
+
+    def add_collector(self, collector: Callable):
+        """
+        Register a callable run before every render, e.g. to refresh gauges.
+        Bound methods are held weakly so collectors don't keep their objects alive.
+        """
+        if hasattr(collector, '__self__'):
+            reference = weakref.WeakMethod(collector)
+        else:
+            reference = lambda: collector
+        with self.lock:
+            self.collectors.append(reference)
+
+    def render(self) -> str:
+        with self.lock:
+            collectors = [reference() for reference in self.collectors]
+            self.collectors = [r for r, c in zip(self.collectors, collectors) if c is not None]
+            metrics = list(self.metrics.values())
+        for collector in collectors:
+            if collector is None:
+                continue
+            try:
+                collector(self)
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path: str):
+        """Write the current metrics atomically"""
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            temp_path = f"{path}.tmp"
+            with open(temp_path, 'w') as f:
+                f.write(self.render())
+            os.replace(temp_path, path)
+        except Exception as e:
+            print(f"Error writing metrics snapshot: {e}")
+
+    def start_snapshots(self, path: str, interval: float = 30.0):
+        """Write a snapshot every interval seconds (once per registry)"""
+        if self.snapshot_thread is not None or interval <= 0:
+            return
+
+        def snapshot_loop():
+            while True:
+                time.sleep(interval)
+                self.write_snapshot(path)
+
+        self.snapshot_thread = threading.Thread(target=snapshot_loop, name="metrics-snapshot", daemon=True)
+        self.snapshot_thread.start()
+
+    def serve(self, host: str = "127.0.0.1", port: int = 9464) -> bool:
+        """Expose /metrics over HTTP on a background thread (once per registry)"""
+        if self.server is not None:
+            return True
+
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        try:
+            self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            # Usually another Flame session on this machine already owns the port
+            print(f"Metrics endpoint not started on {host}:{port}: {e}")
+            return False
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        return True
+
+def _declare_standard_metrics(registry: MetricsRegistry):
+    registry.declare('flame_comfyui_jobs', 'gauge', 'Pending and processing jobs', ('state',))
+    registry.declare('flame_comfyui_jobs_finished_total', 'counter', 'Finished jobs', ('workflow', 'status'))
+    registry.declare('flame_comfyui_frames_total', 'counter', 'Frames rendered', ('workflow',))
+    registry.declare('flame_comfyui_frames_per_second', 'gauge', 'Render throughput of the last job', ('workflow',))
+    registry.declare('flame_comfyui_first_output_latency_seconds', 'histogram',
+                     'Time from submission until a save node first writes its output', ('workflow',))
+    registry.declare('flame_comfyui_stage_seconds', 'histogram', 'Duration of job stages', ('stage',))
+    registry.declare('flame_comfyui_retries_total', 'counter', 'Retried requests', ('operation',))
+    registry.declare('flame_comfyui_failures_total', 'counter', 'Failed jobs and requests', ('stage',))
+
+_metrics: Optional[MetricsRegistry] = None
+_metrics_lock = threading.Lock()
+
+def get_metrics() -> MetricsRegistry:
+    """The session-wide metrics registry"""
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MetricsRegistry()
+            _declare_standard_metrics(_metrics)
+        return _metrics
+
+# =============================================================================
+# UTILITY FUNCTIONS
+# =============================================================================
+
+def log_to_file(message: str, log_file: str = "/tmp/flame_comfyui_v3.log", level: str = "INFO"):
+    """Write a message to log file with timestamp (buffered, see BufferedLogger)"""
+    get_logger(log_file).log(message, level)
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,607 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+PyFlame UI components for the Flame-ComfyUI hook
+
+Qt widgets styled like Flame's own dialogs. Kept out of network_comfyui and
+installed outside Flame's hook directory (PYFLAME_UI_DIR in the hook) so that
+Flame's hook scan does not import PySide or build these classes; the hook
+imports this module the first time it opens a dialog.
+"""
+
+from enum import Enum
+
+def log_to_file(message, level="INFO"):
+    """Replaced with the hook's logger when the hook loads this module"""
+    pass
+
+
+# Try to import PySide6, otherwise import PySide2
+try:
+    from PySide6 import QtCore, QtGui, QtWidgets
+    from PySide6.QtGui import QAction
+    using_pyside6 = True
+except ImportError:
+    from PySide2 import QtCore, QtGui, QtWidgets
+    QAction = QtWidgets.QAction
+    using_pyside6 = False
+
+#---------------------------------------------
+# [Constants]
+#---------------------------------------------
+PYFLAME_FONT = 'Discreet'  # Font used in all PyFlame UI elements
+PYFLAME_FONT_SIZE = 13  # Default font size used in all PyFlame UI elements
+
+#---------------------------------------------
+# [PyFlame Enums]
+#---------------------------------------------
+class Color(Enum):
+    """Color enum for UI elements."""
+    BLUE = 'rgb(0, 110, 175)'
+    BLUE_DARK = 'rgb(0, 70, 120)'
+    BLUE_HIGHLIGHT = 'rgb(41, 140, 200)'
+    RED = 'rgb(200, 29, 29)'
+    GRAY = 'rgb(58, 58, 58)'
+    GRAY_DARK = 'rgb(40, 40, 40)'
+    GRAY_LIGHT = 'rgb(70, 70, 70)' 
+    BLACK = 'rgb(0, 0, 0)'
+    WHITE = 'rgb(255, 255, 255)'
+    TEXT = 'rgb(180, 180, 180)'  # Brightened from 154
+    BUTTON_TEXT = 'rgb(200, 200, 200)'  # Brightened from 165
+    BORDER = 'rgb(100, 100, 100)'  # Brightened from 90
+    
+    # New gradient colors
+    GRADIENT_START = 'rgb(45, 45, 45)'
+    GRADIENT_END = 'rgb(60, 60, 60)'
+    
+    # Accent colors
+    ACCENT_BLUE = 'rgb(0, 130, 200)'
+    ACCENT_RED = 'rgb(220, 50, 50)'
+    ACCENT_GREEN = 'rgb(50, 180, 50)'
+
+class LineColor(Enum):
+    """Color options for window border lines."""
+    GRAY = QtGui.QColor(71, 71, 71)
+    BLUE = QtGui.QColor(0, 110, 175)
+    RED = QtGui.QColor(200, 29, 29)
+    GREEN = QtGui.QColor(0, 180, 13)
+
+#---------------------------------------------
+# [Window Resolution Helper]
+#---------------------------------------------
+class WindowResolution:
+    """Utility class to determine the main window resolution."""
+    @staticmethod
+    def main_window():
+        if QtCore.__version_info__[0] < 6:
+            main_window_res = QtWidgets.QDesktopWidget()
+        else:
+            main_window_res = QtGui.QGuiApplication.primaryScreen()
+        return main_window_res
+
+#---------------------------------------------
+# [GUI Resize Functions]
+#---------------------------------------------
+def gui_resize(value):
+    """Scale UI elements based on screen resolution."""
+    if not isinstance(value, int):
+        return value
+        
+    # Adjust this multiplier to make UI elements larger overall
+    # Increase this value to make everything bigger
+    UI_SCALE_FACTOR = 1.5
+    
+    # Baseline resolution from mac studio display
+    base_screen_height = 1500  # Lowered from 3190 to better handle common resolutions
+    
+    # Get current screen resolution
+    main_window_res = WindowResolution.main_window()
+    screen_resolution = main_window_res.screenGeometry()
+    
+    # Get screen height
+    screen_height = screen_resolution.height()
+    
+    # Calculate screen ratio
+    screen_ratio = max(0.6, min(1.2, screen_height / base_screen_height))
+    
+    # Scale value based on screen ratio with additional scaling factor
+    scaled_value = int(float(value) * screen_ratio * UI_SCALE_FACTOR)
+    
+    # Ensure minimum size for UI elements
+    if value > 20:  # For larger elements like widget heights/widths
+        scaled_value = max(scaled_value, value)
+    
+    return scaled_value
+
+def font_resize(value):
+    """Scale font sizes based on screen resolution."""
+    if not isinstance(value, int):
+        return value
+        
+    # Adjust this multiplier to make fonts larger overall
+    FONT_SCALE_FACTOR = 1.3
+    
+    # Scale font size
+    scaled_size = gui_resize(value)
+    
+    # Apply font scale factor
+    scaled_size = int(scaled_size * FONT_SCALE_FACTOR)
+    
+    # Ensure minimum font size
+    return max(scaled_size, value)
+
+#---------------------------------------------
+# [PyFlame UI Widget Classes]
+#---------------------------------------------
+class PyFlameButton(QtWidgets.QPushButton):
+    """Custom QT Flame Button Widget"""
+    def __init__(self, 
+                 text, 
+                 connect, 
+                 width=50, 
+                 height=28, 
+                 max_width=True, 
+                 color=Color.GRAY, 
+                 font=PYFLAME_FONT, 
+                 font_size=PYFLAME_FONT_SIZE, 
+                 tooltip=None):
+        super(PyFlameButton, self).__init__()
+        
+        # Set text
+        self.setText(text)
+        
+        # Set size
+        if max_width:
+            self.setMaximumWidth(16777215)
+        else:
+            self.setFixedSize(gui_resize(width), gui_resize(height))
+        
+        # Set button color
+        self.set_button_color(color)
+        
+        # Set font
+        self.setFont(QtGui.QFont(font, font_resize(font_size)))
+        
+        # Set tooltip
+        if tooltip:
+            self.setToolTip(tooltip)
+        
+        # Connect button
+        self.clicked.connect(connect)
+    
+    def set_button_color(self, color):
+        """Set the color of the button."""
+        if color == Color.BLUE:
+            gradient_start = Color.BLUE.value
+            gradient_end = Color.BLUE_DARK.value
+            hover_color = Color.BLUE_HIGHLIGHT.value
+        else:
+            gradient_start = Color.GRADIENT_START.value
+            gradient_end = Color.GRADIENT_END.value
+            hover_color = Color.GRAY_LIGHT.value
+            
+        self.setStyleSheet(f'''
+            QPushButton {{
+                color: {Color.BUTTON_TEXT.value};
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {gradient_start}, stop:1 {gradient_end});
+                border: 1px solid {Color.BORDER.value};
+                border-radius: 4px;
+                padding: 4px 12px;
+                min-height: 30px;
+            }}
+            QPushButton:hover {{
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {hover_color}, stop:1 {gradient_end});
+                border: 1px solid {Color.ACCENT_BLUE};
+            }}
+            QPushButton:pressed {{
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.BLUE_DARK.value}, stop:1 {Color.BLUE.value});
+                border: 1px solid {Color.WHITE.value};
+            }}
+            QPushButton:disabled {{
+                color: rgb(120, 120, 120);
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRAY_DARK.value}, stop:1 {Color.GRAY.value});
+                border: 1px solid {Color.GRAY.value};
+            }}
+            QToolTip {{
+                color: rgb(230, 230, 230);
+                background-color: rgb(60, 60, 60);
+                border: 1px solid {Color.ACCENT_BLUE};
+                border-radius: 3px;
+                padding: 5px;
+            }}
+        ''')
+
+class PyFlameLabel(QtWidgets.QLabel):
+    """Custom QT Flame Label Widget"""
+    def __init__(self, 
+                 text="", 
+                 width=150, 
+                 height=28, 
+                 max_width=True,
+                 font=PYFLAME_FONT,
+                 font_size=PYFLAME_FONT_SIZE, 
+                 tooltip=None):
+        super(PyFlameLabel, self).__init__()
+        
+        # Set text
+        self.setText(text)
+        
+        # Set size
+        if max_width:
+            self.setMaximumWidth(16777215)
+        else:
+            self.setFixedSize(gui_resize(width), gui_resize(height))
+        
+        # Set font
+        self.setFont(QtGui.QFont(font, font_resize(font_size)))
+        
+        # Set tooltip
+        if tooltip:
+            self.setToolTip(tooltip)
+        
+        # Set style
+        self.setStyleSheet(f'''
+            QLabel {{
+                color: {Color.TEXT.value};
+                padding: 2px;
+            }}
+            QToolTip {{
+                color: rgb(230, 230, 230);
+                background-color: rgb(60, 60, 60);
+                border: 1px solid {Color.ACCENT_BLUE};
+                border-radius: 3px;
+                padding: 5px;
+            }}
+        ''')
+
+class PyFlameEntry(QtWidgets.QLineEdit):
+    """Custom QT Flame Line Edit Widget"""
+    def __init__(self, 
+                 text="", 
+                 width=150, 
+                 height=28, 
+                 max_width=True, 
+                 read_only=False, 
+                 align="left",
+                 font=PYFLAME_FONT, 
+                 font_size=PYFLAME_FONT_SIZE,
+                 tooltip=None):
+        super(PyFlameEntry, self).__init__()
+        
+        # Set text
+        self.setText(text)
+        
+        # Set size
+        if max_width:
+            self.setMaximumWidth(16777215)
+        else:
+            self.setFixedSize(gui_resize(width), gui_resize(height))
+        
+        # Set font
+        self.setFont(QtGui.QFont(font, font_resize(font_size)))
+        
+        # Set tooltip
+        if tooltip:
+            self.setToolTip(tooltip)
+        
+        # Set alignment
+        if align == "center":
+            self.setAlignment(QtCore.Qt.AlignCenter)
+        elif align == "right":
+            self.setAlignment(QtCore.Qt.AlignRight)
+        else:
+            self.setAlignment(QtCore.Qt.AlignLeft)
+        
+        # Set read-only state
+        self.setReadOnly(read_only)
+        
+        # Set style based on read-only state
+        if read_only:
+            self.setStyleSheet(f'''
+                QLineEdit {{
+                    color: {Color.TEXT.value};
+                    background-color: rgb(30, 30, 30);
+                    selection-color: rgb(38, 38, 38);
+                    selection-background-color: rgb(184, 177, 167);
+                    border: 1px solid rgb(55, 55, 55);
+                    border-radius: 3px;
+                    padding: 3px 8px;
+                    min-height: 28px;
+                }}
+                QToolTip {{
+                    color: rgb(230, 230, 230);
+                    background-color: rgb(60, 60, 60);
+                    border: 1px solid {Color.ACCENT_BLUE};
+                    border-radius: 3px;
+                    padding: 5px;
+                }}
+            ''')
+        else:
+            self.setStyleSheet(f'''
+                QLineEdit {{
+                    color: {Color.TEXT.value};
+                    background-color: rgb(45, 45, 45);
+                    selection-color: rgb(38, 38, 38);
+                    selection-background-color: rgb(184, 177, 167);
+                    border: 1px solid rgb(65, 65, 65);
+                    border-radius: 3px;
+                    padding: 3px 8px;
+                    min-height: 28px;
+                }}
+                QLineEdit:hover {{
+                    border: 1px solid {Color.ACCENT_BLUE};
+                    background-color: rgb(50, 50, 50);
+                }}
+                QLineEdit:focus {{
+                    border: 1px solid {Color.BLUE.value};
+                    background-color: rgb(55, 55, 55);
+                }}
+                QLineEdit:disabled {{
+                    color: rgb(120, 120, 120);
+                    background-color: rgb(35, 35, 35);
+                }}
+                QToolTip {{
+                    color: rgb(230, 230, 230);
+                    background-color: rgb(60, 60, 60);
+                    border: 1px solid {Color.ACCENT_BLUE};
+                    border-radius: 3px;
+                    padding: 5px;
+                }}
+            ''')
+
+class PyFlamePushButtonMenu(QtWidgets.QToolButton):
+    """Custom QT Flame Push Button with Menu"""
+    def __init__(self, 
+                 text="", 
+                 menu_options=None, 
+                 connect=None, 
+                 width=150, 
+                 height=28, 
+                 max_width=True,
+                 icon=None, 
+                 button_width=None, 
+                 show_menu_indicator=True, 
+                 tooltip=None,
+                 enabled=True):
+        super(PyFlamePushButtonMenu, self).__init__()
+        
+        # Set text
+        self.setText(text)
+        
+        # Set size
+        if max_width:
+            self.setMaximumWidth(16777215)
+        else:
+            self.setFixedSize(gui_resize(width), gui_resize(height))
+        
+        # Set icon
+        if icon:
+            self.setIcon(icon)
+        
+        # Store the connect callback
+        self.connect_callback = connect
+        
+        # Set enabled state
+        self.setEnabled(enabled)
+        
+        # Set tooltip
+        if tooltip:
+            self.setToolTip(tooltip)
+        
+        # Set up menu - modified for better clickability in Flame 2023
+        self.menu = QtWidgets.QMenu()
+        self.menu.setFocusPolicy(QtCore.Qt.StrongFocus)  # Changed to StrongFocus
+        self.setMenu(self.menu)
+        
+        # Use MenuButtonPopup instead of InstantPopup for better compatibility
+        self.setPopupMode(QtWidgets.QToolButton.MenuButtonPopup)
+        
+        # Add menu options
+        if menu_options:
+            self.add_menu_options(menu_options, connect)
+        
+        # Set font
+        self.setFont(QtGui.QFont(PYFLAME_FONT, font_resize(PYFLAME_FONT_SIZE)))
+        
+        # Set style - modified for better clickability
+        self.setStyleSheet(f'''
+            QToolButton {{
+                color: {Color.TEXT.value};
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRADIENT_START.value}, stop:1 {Color.GRADIENT_END.value});
+                border: 1px solid {Color.BORDER.value};
+                border-radius: 4px;
+                padding-left: 10px;
+                padding-right: {30 if show_menu_indicator else 10}px;
+                text-align: left;
+                min-height: 30px;
+            }}
+            QToolButton:hover {{
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRAY_LIGHT.value}, stop:1 {Color.GRADIENT_END.value});
+                border: 1px solid {Color.ACCENT_BLUE};
+            }}
+            QToolButton:pressed {{
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.BLUE_DARK.value}, stop:1 {Color.BLUE.value});
+                border: 1px solid {Color.WHITE.value};
+            }}
+            QToolButton:disabled {{
+                color: rgb(120, 120, 120);
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRAY_DARK.value}, stop:1 {Color.GRAY.value});
+                border: 1px solid {Color.GRAY.value};
+            }}
+            QToolButton::menu-indicator {{
+                subcontrol-origin: padding;
+                subcontrol-position: center right;
+                right: 8px;
+                width: {16 if show_menu_indicator else 0}px;
+                image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTAiIGhlaWdodD0iNiIgdmlld0JveD0iMCAwIDEwIDYiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxwYXRoIGQ9Ik0xIDFMNSA1TDkgMSIgc3Ryb2tlPSIjQUFBQUFBIiBzdHJva2Utd2lkdGg9IjIiIHN0cm9rZS1saW5lY2FwPSJyb3VuZCIvPgo8L3N2Zz4K);
+            }}
+            QToolTip {{
+                color: rgb(230, 230, 230);
+                background-color: rgb(60, 60, 60);
+                border: 1px solid {Color.ACCENT_BLUE};
+                border-radius: 3px;
+                padding: 5px;
+            }}
+            QMenu {{
+                color: {Color.TEXT.value};
+                background-color: rgb(50, 50, 50);
+                border: 1px solid {Color.BORDER.value};
+                border-radius: 3px;
+                margin: 2px;
+            }}
+            QMenu::item {{
+                height: 28px;  /* Increased from 24px */
+                padding: 4px 25px 4px 20px;  /* Increased padding */
+                border: 1px solid transparent;
+                margin: 2px; /* Increased from 1px */
+            }}
+            QMenu::item:selected {{
+                color: {Color.WHITE.value};
+                background-color: {Color.BLUE.value};
+                border-radius: 2px;
+            }}
+            /* Make item area more visible when hovering */
+            QMenu::item:hover {{
+                border: 1px solid {Color.ACCENT_BLUE};
+                background-color: {Color.BLUE.value};
+                color: {Color.WHITE.value};
+            }}
+            QMenu::separator {{
+                height: 1px;
+                background-color: {Color.BORDER.value};
+                margin: 4px 10px;
+            }}
+        ''')
+        
+        # Connect clicked signal to handle click events
+        self.clicked.connect(self.button_clicked)
+    
+    def button_clicked(self):
+        """Handle main button click to show menu"""
+        # Show menu when button is clicked
+        self.showMenu()
+    
+    def add_menu_options(self, menu_options, connect=None):
+        """Add options to the menu - improved for clickability."""
+        self.menu.clear()
+        self.connect_callback = connect
+        
+        for option in menu_options:
+            if option == '':
+                self.menu.addSeparator()
+            else:
+                # Create an Action with an explicit object name
+                action = QAction(option, self)
+                action.setObjectName(f"action_{option}")
+                
+                # Connect with a more direct approach for older Qt versions
+                action.triggered.connect(lambda checked=False, text=option: self.select_menu_item(text))
+                
+                # Make action more visible in styling
+                self.menu.addAction(action)
+    
+    def select_menu_item(self, text):
+        """Improved method to handle menu item selection."""
+        self.setText(text)
+        log_to_file(f"Menu item selected: {text}")
+        
+        # Call the callback if it exists
+        if self.connect_callback:
+            self.connect_callback()
+    
+    def menu_triggered(self, text, connect_function):
+        """Legacy handler for menu triggering - kept for compatibility."""
+        self.setText(text)
+        if connect_function:
+            connect_function()
+
+class PyFlameDialogWindow(QtWidgets.QDialog):
+    """Custom QT Flame Dialog Window"""
+    def __init__(self, 
+                 title="Dialog", 
+                 width=400, 
+                 height=200, 
+                 grid_layout=True, 
+                 grid_layout_columns=4, 
+                 grid_layout_rows=3, 
+                 line_color=LineColor.BLUE):
+        super(PyFlameDialogWindow, self).__init__()
+        
+        # Set window properties
+        self.setWindowTitle(title)
+        
+        # Increase base size by 50% before scaling
+        self.setFixedSize(gui_resize(width * 1.5), gui_resize(height * 1.5))
+        
+        # Create main layout
+        self.main_layout = QtWidgets.QVBoxLayout()
+        self.main_layout.setContentsMargins(20, 25, 20, 20)  # Increased top margin for colored line
+        self.setLayout(self.main_layout)
+        
+        # Create grid layout if requested
+        if grid_layout:
+            self.grid_layout = QtWidgets.QGridLayout()
+            self.grid_layout.setRowStretch(grid_layout_rows - 1, 1)
+            self.grid_layout.setColumnStretch(grid_layout_columns - 1, 1)
+            self.grid_layout.setSpacing(gui_resize(15))  # Increased spacing
+            self.main_layout.addLayout(self.grid_layout)
+        
+        # Set window style with a nice gradient background
+        self.setStyleSheet(f'''
+            QDialog {{
+                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
+                                           stop:0 rgb(42, 42, 42), 
+                                           stop:1 rgb(32, 32, 32));
+                border-radius: 5px;
+            }}
+            
+            QLabel {{
+                color: {Color.TEXT.value};
+            }}
+            
+            /* Make sure the scrollbar looks nice too */
+            QScrollBar:vertical {{
+                background: rgb(45, 45, 45);
+                width: 10px;
+                margin: 0px;
+                border-radius: 5px;
+            }}
+            
+            QScrollBar::handle:vertical {{
+                background: rgb(80, 80, 80);
+                min-height: 20px;
+                border-radius: 5px;
+            }}
+            
+            QScrollBar::handle:vertical:hover {{
+                background: rgb(100, 100, 100);
+            }}
+            
+            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {{
+                height: 0px;
+            }}
+            
+            QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
+                background: none;
+            }}
+        ''')
+        
+        # Create colored line
+        self.line_color = line_color
+        
+    def paintEvent(self, event):
+        """Paint the colored line on the dialog window."""
+        painter = QtGui.QPainter(self)
+        painter.setRenderHint(QtGui.QPainter.Antialiasing)
+        
+        # Draw the top colored line
+        line_pen = QtGui.QPen(self.line_color.value, 3)
+        painter.setPen(line_pen)
+        painter.drawLine(0, 0, self.width(), 0)
+        
+        # Draw a subtle gradient header area
+        header_gradient = QtGui.QLinearGradient(0, 0, 0, 15)
+        header_gradient.setColorAt(0, QtGui.QColor(60, 60, 60, 150))
+        header_gradient.setColorAt(1, QtGui.QColor(50, 50, 50, 0))
+        painter.fillRect(QtCore.QRect(0, 0, self.width(), 15), header_gradient)
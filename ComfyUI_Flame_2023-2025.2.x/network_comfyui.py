@@ -17,18 +17,16 @@ import json
 import base64
 import subprocess
 import shutil
-from urllib.request import Request, urlopen
-from urllib.error import URLError
 import socket
-from PIL import Image
 import traceback
 import re
 from datetime import datetime
 import threading
 import platform
 import sys
-from enum import Enum
 import copy  # Add this import at the top of the file
+import contextlib
+import hashlib
 
 # Try to import flame module when run in Flame
 try:
@@ -36,595 +34,6 @@ try:
 except ImportError:
     pass
 
-# Try to import PySide6, otherwise import PySide2
-try:
-    from PySide6 import QtCore, QtGui, QtWidgets
-    from PySide6.QtGui import QAction
-    using_pyside6 = True
-except ImportError:
-    from PySide2 import QtCore, QtGui, QtWidgets
-    QAction = QtWidgets.QAction
-    using_pyside6 = False
-
-#---------------------------------------------
-# [Constants]
-#---------------------------------------------
-PYFLAME_FONT = 'Discreet'  # Font used in all PyFlame UI elements
-PYFLAME_FONT_SIZE = 13  # Default font size used in all PyFlame UI elements
-
-#---------------------------------------------
-# [PyFlame Enums]
-#---------------------------------------------
-class Color(Enum):
-    """Color enum for UI elements."""
-    BLUE = 'rgb(0, 110, 175)'
-    BLUE_DARK = 'rgb(0, 70, 120)'
-    BLUE_HIGHLIGHT = 'rgb(41, 140, 200)'
-    RED = 'rgb(200, 29, 29)'
-    GRAY = 'rgb(58, 58, 58)'
-    GRAY_DARK = 'rgb(40, 40, 40)'
-    GRAY_LIGHT = 'rgb(70, 70, 70)' 
-    BLACK = 'rgb(0, 0, 0)'
-    WHITE = 'rgb(255, 255, 255)'
-    TEXT = 'rgb(180, 180, 180)'  # Brightened from 154
-    BUTTON_TEXT = 'rgb(200, 200, 200)'  # Brightened from 165
-    BORDER = 'rgb(100, 100, 100)'  # Brightened from 90
-    
-    # New gradient colors
-    GRADIENT_START = 'rgb(45, 45, 45)'
-    GRADIENT_END = 'rgb(60, 60, 60)'
-    
-    # Accent colors
-    ACCENT_BLUE = 'rgb(0, 130, 200)'
-    ACCENT_RED = 'rgb(220, 50, 50)'
-    ACCENT_GREEN = 'rgb(50, 180, 50)'
-
-class LineColor(Enum):
-    """Color options for window border lines."""
-    GRAY = QtGui.QColor(71, 71, 71)
-    BLUE = QtGui.QColor(0, 110, 175)
-    RED = QtGui.QColor(200, 29, 29)
-    GREEN = QtGui.QColor(0, 180, 13)
-
-#---------------------------------------------
-# [Window Resolution Helper]
-#---------------------------------------------
-class WindowResolution:
-    """Utility class to determine the main window resolution."""
-    @staticmethod
-    def main_window():
-        if QtCore.__version_info__[0] < 6:
-            main_window_res = QtWidgets.QDesktopWidget()
-        else:
-            main_window_res = QtGui.QGuiApplication.primaryScreen()
-        return main_window_res
-
-#---------------------------------------------
-# [GUI Resize Functions]
-#---------------------------------------------
-def gui_resize(value):
-    """Scale UI elements based on screen resolution."""
-    if not isinstance(value, int):
-        return value
-        
-    # Adjust this multiplier to make UI elements larger overall
-    # Increase this value to make everything bigger
-    UI_SCALE_FACTOR = 1.5
-    
-    # Baseline resolution from mac studio display
-    base_screen_height = 1500  # Lowered from 3190 to better handle common resolutions
-    
-    # Get current screen resolution
-    main_window_res = WindowResolution.main_window()
-    screen_resolution = main_window_res.screenGeometry()
-    
-    # Get screen height
-    screen_height = screen_resolution.height()
-    
-    # Calculate screen ratio
-    screen_ratio = max(0.6, min(1.2, screen_height / base_screen_height))
-    
-    # Scale value based on screen ratio with additional scaling factor
-    scaled_value = int(float(value) * screen_ratio * UI_SCALE_FACTOR)
-    
-    # Ensure minimum size for UI elements
-    if value > 20:  # For larger elements like widget heights/widths
-        scaled_value = max(scaled_value, value)
-    
-    return scaled_value
-
-def font_resize(value):
-    """Scale font sizes based on screen resolution."""
-    if not isinstance(value, int):
-        return value
-        
-    # Adjust this multiplier to make fonts larger overall
-    FONT_SCALE_FACTOR = 1.3
-    
-    # Scale font size
-    scaled_size = gui_resize(value)
-    
-    # Apply font scale factor
-    scaled_size = int(scaled_size * FONT_SCALE_FACTOR)
-    
-    # Ensure minimum font size
-    return max(scaled_size, value)
-
-#---------------------------------------------
-# [PyFlame UI Widget Classes]
-#---------------------------------------------
-class PyFlameButton(QtWidgets.QPushButton):
-    """Custom QT Flame Button Widget"""
-    def __init__(self, 
-                 text, 
-                 connect, 
-                 width=50, 
-                 height=28, 
-                 max_width=True, 
-                 color=Color.GRAY, 
-                 font=PYFLAME_FONT, 
-                 font_size=PYFLAME_FONT_SIZE, 
-                 tooltip=None):
-        super(PyFlameButton, self).__init__()
-        
-        # Set text
-        self.setText(text)
-        
-        # Set size
-        if max_width:
-            self.setMaximumWidth(16777215)
-        else:
-            self.setFixedSize(gui_resize(width), gui_resize(height))
-        
-        # Set button color
-        self.set_button_color(color)
-        
-        # Set font
-        self.setFont(QtGui.QFont(font, font_resize(font_size)))
-        
-        # Set tooltip
-        if tooltip:
-            self.setToolTip(tooltip)
-        
-        # Connect button
-        self.clicked.connect(connect)
-    
-    def set_button_color(self, color):
-        """Set the color of the button."""
-        if color == Color.BLUE:
-            gradient_start = Color.BLUE.value
-            gradient_end = Color.BLUE_DARK.value
-            hover_color = Color.BLUE_HIGHLIGHT.value
-        else:
-            gradient_start = Color.GRADIENT_START.value
-            gradient_end = Color.GRADIENT_END.value
-            hover_color = Color.GRAY_LIGHT.value
-            
-        self.setStyleSheet(f'''
-            QPushButton {{
-                color: {Color.BUTTON_TEXT.value};
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {gradient_start}, stop:1 {gradient_end});
-                border: 1px solid {Color.BORDER.value};
-                border-radius: 4px;
-                padding: 4px 12px;
-                min-height: 30px;
-            }}
-            QPushButton:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {hover_color}, stop:1 {gradient_end});
-                border: 1px solid {Color.ACCENT_BLUE};
-            }}
-            QPushButton:pressed {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.BLUE_DARK.value}, stop:1 {Color.BLUE.value});
-                border: 1px solid {Color.WHITE.value};
-            }}
-            QPushButton:disabled {{
-                color: rgb(120, 120, 120);
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRAY_DARK.value}, stop:1 {Color.GRAY.value});
-                border: 1px solid {Color.GRAY.value};
-            }}
-            QToolTip {{
-                color: rgb(230, 230, 230);
-                background-color: rgb(60, 60, 60);
-                border: 1px solid {Color.ACCENT_BLUE};
-                border-radius: 3px;
-                padding: 5px;
-            }}
-        ''')
-
-class PyFlameLabel(QtWidgets.QLabel):
-    """Custom QT Flame Label Widget"""
-    def __init__(self, 
-                 text="", 
-                 width=150, 
-                 height=28, 
-                 max_width=True,
-                 font=PYFLAME_FONT,
-                 font_size=PYFLAME_FONT_SIZE, 
-                 tooltip=None):
-        super(PyFlameLabel, self).__init__()
-        
-        # Set text
-        self.setText(text)
-        
-        # Set size
-        if max_width:
-            self.setMaximumWidth(16777215)
-        else:
-            self.setFixedSize(gui_resize(width), gui_resize(height))
-        
-        # Set font
-        self.setFont(QtGui.QFont(font, font_resize(font_size)))
-        
-        # Set tooltip
-        if tooltip:
-            self.setToolTip(tooltip)
-        
-        # Set style
-        self.setStyleSheet(f'''
-            QLabel {{
-                color: {Color.TEXT.value};
-                padding: 2px;
-            }}
-            QToolTip {{
-                color: rgb(230, 230, 230);
-                background-color: rgb(60, 60, 60);
-                border: 1px solid {Color.ACCENT_BLUE};
-                border-radius: 3px;
-                padding: 5px;
-            }}
-        ''')
-
-class PyFlameEntry(QtWidgets.QLineEdit):
-    """Custom QT Flame Line Edit Widget"""
-    def __init__(self, 
-                 text="", 
-                 width=150, 
-                 height=28, 
-                 max_width=True, 
-                 read_only=False, 
-                 align="left",
-                 font=PYFLAME_FONT, 
-                 font_size=PYFLAME_FONT_SIZE,
-                 tooltip=None):
-        super(PyFlameEntry, self).__init__()
-        
-        # Set text
-        self.setText(text)
-        
-        # Set size
-        if max_width:
-            self.setMaximumWidth(16777215)
-        else:
-            self.setFixedSize(gui_resize(width), gui_resize(height))
-        
-        # Set font
-        self.setFont(QtGui.QFont(font, font_resize(font_size)))
-        
-        # Set tooltip
-        if tooltip:
-            self.setToolTip(tooltip)
-        
-        # Set alignment
-        if align == "center":
-            self.setAlignment(QtCore.Qt.AlignCenter)
-        elif align == "right":
-            self.setAlignment(QtCore.Qt.AlignRight)
-        else:
-            self.setAlignment(QtCore.Qt.AlignLeft)
-        
-        # Set read-only state
-        self.setReadOnly(read_only)
-        
-        # Set style based on read-only state
-        if read_only:
-            self.setStyleSheet(f'''
-                QLineEdit {{
-                    color: {Color.TEXT.value};
-                    background-color: rgb(30, 30, 30);
-                    selection-color: rgb(38, 38, 38);
-                    selection-background-color: rgb(184, 177, 167);
-                    border: 1px solid rgb(55, 55, 55);
-                    border-radius: 3px;
-                    padding: 3px 8px;
-                    min-height: 28px;
-                }}
-                QToolTip {{
-                    color: rgb(230, 230, 230);
-                    background-color: rgb(60, 60, 60);
-                    border: 1px solid {Color.ACCENT_BLUE};
-                    border-radius: 3px;
-                    padding: 5px;
-                }}
-            ''')
-        else:
-            self.setStyleSheet(f'''
-                QLineEdit {{
-                    color: {Color.TEXT.value};
-                    background-color: rgb(45, 45, 45);
-                    selection-color: rgb(38, 38, 38);
-                    selection-background-color: rgb(184, 177, 167);
-                    border: 1px solid rgb(65, 65, 65);
-                    border-radius: 3px;
-                    padding: 3px 8px;
-                    min-height: 28px;
-                }}
-                QLineEdit:hover {{
-                    border: 1px solid {Color.ACCENT_BLUE};
-                    background-color: rgb(50, 50, 50);
-                }}
-                QLineEdit:focus {{
-                    border: 1px solid {Color.BLUE.value};
-                    background-color: rgb(55, 55, 55);
-                }}
-                QLineEdit:disabled {{
-                    color: rgb(120, 120, 120);
-                    background-color: rgb(35, 35, 35);
-                }}
-                QToolTip {{
-                    color: rgb(230, 230, 230);
-                    background-color: rgb(60, 60, 60);
-                    border: 1px solid {Color.ACCENT_BLUE};
-                    border-radius: 3px;
-                    padding: 5px;
-                }}
-            ''')
-
-class PyFlamePushButtonMenu(QtWidgets.QToolButton):
-    """Custom QT Flame Push Button with Menu"""
-    def __init__(self, 
-                 text="", 
-                 menu_options=None, 
-                 connect=None, 
-                 width=150, 
-                 height=28, 
-                 max_width=True,
-                 icon=None, 
-                 button_width=None, 
-                 show_menu_indicator=True, 
-                 tooltip=None,
-                 enabled=True):
-        super(PyFlamePushButtonMenu, self).__init__()
-        
-        # Set text
-        self.setText(text)
-        
-        # Set size
-        if max_width:
-            self.setMaximumWidth(16777215)
-        else:
-            self.setFixedSize(gui_resize(width), gui_resize(height))
-        
-        # Set icon
-        if icon:
-            self.setIcon(icon)
-        
-        # Store the connect callback
-        self.connect_callback = connect
-        
-        # Set enabled state
-        self.setEnabled(enabled)
-        
-        # Set tooltip
-        if tooltip:
-            self.setToolTip(tooltip)
-        
-        # Set up menu - modified for better clickability in Flame 2023
-        self.menu = QtWidgets.QMenu()
-        self.menu.setFocusPolicy(QtCore.Qt.StrongFocus)  # Changed to StrongFocus
-        self.setMenu(self.menu)
-        
-        # Use MenuButtonPopup instead of InstantPopup for better compatibility
-        self.setPopupMode(QtWidgets.QToolButton.MenuButtonPopup)
-        
-        # Add menu options
-        if menu_options:
-            self.add_menu_options(menu_options, connect)
-        
-        # Set font
-        self.setFont(QtGui.QFont(PYFLAME_FONT, font_resize(PYFLAME_FONT_SIZE)))
-        
-        # Set style - modified for better clickability
-        self.setStyleSheet(f'''
-            QToolButton {{
-                color: {Color.TEXT.value};
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRADIENT_START.value}, stop:1 {Color.GRADIENT_END.value});
-                border: 1px solid {Color.BORDER.value};
-                border-radius: 4px;
-                padding-left: 10px;
-                padding-right: {30 if show_menu_indicator else 10}px;
-                text-align: left;
-                min-height: 30px;
-            }}
-            QToolButton:hover {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRAY_LIGHT.value}, stop:1 {Color.GRADIENT_END.value});
-                border: 1px solid {Color.ACCENT_BLUE};
-            }}
-            QToolButton:pressed {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.BLUE_DARK.value}, stop:1 {Color.BLUE.value});
-                border: 1px solid {Color.WHITE.value};
-            }}
-            QToolButton:disabled {{
-                color: rgb(120, 120, 120);
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, stop:0 {Color.GRAY_DARK.value}, stop:1 {Color.GRAY.value});
-                border: 1px solid {Color.GRAY.value};
-            }}
-            QToolButton::menu-indicator {{
-                subcontrol-origin: padding;
-                subcontrol-position: center right;
-                right: 8px;
-                width: {16 if show_menu_indicator else 0}px;
-                image: url(data:image/svg+xml;base64,PHN2ZyB3aWR0aD0iMTAiIGhlaWdodD0iNiIgdmlld0JveD0iMCAwIDEwIDYiIGZpbGw9Im5vbmUiIHhtbG5zPSJodHRwOi8vd3d3LnczLm9yZy8yMDAwL3N2ZyI+CjxwYXRoIGQ9Ik0xIDFMNSA1TDkgMSIgc3Ryb2tlPSIjQUFBQUFBIiBzdHJva2Utd2lkdGg9IjIiIHN0cm9rZS1saW5lY2FwPSJyb3VuZCIvPgo8L3N2Zz4K);
-            }}
-            QToolTip {{
-                color: rgb(230, 230, 230);
-                background-color: rgb(60, 60, 60);
-                border: 1px solid {Color.ACCENT_BLUE};
-                border-radius: 3px;
-                padding: 5px;
-            }}
-            QMenu {{
-                color: {Color.TEXT.value};
-                background-color: rgb(50, 50, 50);
-                border: 1px solid {Color.BORDER.value};
-                border-radius: 3px;
-                margin: 2px;
-            }}
-            QMenu::item {{
-                height: 28px;  /* Increased from 24px */
-                padding: 4px 25px 4px 20px;  /* Increased padding */
-                border: 1px solid transparent;
-                margin: 2px; /* Increased from 1px */
-            }}
-            QMenu::item:selected {{
-                color: {Color.WHITE.value};
-                background-color: {Color.BLUE.value};
-                border-radius: 2px;
-            }}
-            /* Make item area more visible when hovering */
-            QMenu::item:hover {{
-                border: 1px solid {Color.ACCENT_BLUE};
-                background-color: {Color.BLUE.value};
-                color: {Color.WHITE.value};
-            }}
-            QMenu::separator {{
-                height: 1px;
-                background-color: {Color.BORDER.value};
-                margin: 4px 10px;
-            }}
-        ''')
-        
-        # Connect clicked signal to handle click events
-        self.clicked.connect(self.button_clicked)
-    
-    def button_clicked(self):
-        """Handle main button click to show menu"""
-        # Show menu when button is clicked
-        self.showMenu()
-    
-    def add_menu_options(self, menu_options, connect=None):
-        """Add options to the menu - improved for clickability."""
-        self.menu.clear()
-        self.connect_callback = connect
-        
-        for option in menu_options:
-            if option == '':
-                self.menu.addSeparator()
-            else:
-                # Create an Action with an explicit object name
-                action = QAction(option, self)
-                action.setObjectName(f"action_{option}")
-                
-                # Connect with a more direct approach for older Qt versions
-                action.triggered.connect(lambda checked=False, text=option: self.select_menu_item(text))
-                
-                # Make action more visible in styling
-                self.menu.addAction(action)
-    
-    def select_menu_item(self, text):
-        """Improved method to handle menu item selection."""
-        self.setText(text)
-        log_to_file(f"Menu item selected: {text}")
-        
-        # Call the callback if it exists
-        if self.connect_callback:
-            self.connect_callback()
-    
-    def menu_triggered(self, text, connect_function):
-        """Legacy handler for menu triggering - kept for compatibility."""
-        self.setText(text)
-        if connect_function:
-            connect_function()
-
-class PyFlameDialogWindow(QtWidgets.QDialog):
-    """Custom QT Flame Dialog Window"""
-    def __init__(self, 
-                 title="Dialog", 
-                 width=400, 
-                 height=200, 
-                 grid_layout=True, 
-                 grid_layout_columns=4, 
-                 grid_layout_rows=3, 
-                 line_color=LineColor.BLUE):
-        super(PyFlameDialogWindow, self).__init__()
-        
-        # Set window properties
-        self.setWindowTitle(title)
-        
-        # Increase base size by 50% before scaling
-        self.setFixedSize(gui_resize(width * 1.5), gui_resize(height * 1.5))
-        
-        # Create main layout
-        self.main_layout = QtWidgets.QVBoxLayout()
-        self.main_layout.setContentsMargins(20, 25, 20, 20)  # Increased top margin for colored line
-        self.setLayout(self.main_layout)
-        
-        # Create grid layout if requested
-        if grid_layout:
-            self.grid_layout = QtWidgets.QGridLayout()
-            self.grid_layout.setRowStretch(grid_layout_rows - 1, 1)
-            self.grid_layout.setColumnStretch(grid_layout_columns - 1, 1)
-            self.grid_layout.setSpacing(gui_resize(15))  # Increased spacing
-            self.main_layout.addLayout(self.grid_layout)
-        
-        # Set window style with a nice gradient background
-        self.setStyleSheet(f'''
-            QDialog {{
-                background: qlineargradient(x1:0, y1:0, x2:0, y2:1, 
-                                           stop:0 rgb(42, 42, 42), 
-                                           stop:1 rgb(32, 32, 32));
-                border-radius: 5px;
-            }}
-            
-            QLabel {{
-                color: {Color.TEXT.value};
-            }}
-            
-            /* Make sure the scrollbar looks nice too */
-            QScrollBar:vertical {{
-                background: rgb(45, 45, 45);
-                width: 10px;
-                margin: 0px;
-                border-radius: 5px;
-            }}
-            
-            QScrollBar::handle:vertical {{
-                background: rgb(80, 80, 80);
-                min-height: 20px;
-                border-radius: 5px;
-            }}
-            
-            QScrollBar::handle:vertical:hover {{
-                background: rgb(100, 100, 100);
-            }}
-            
-            QScrollBar::add-line:vertical, QScrollBar::sub-line:vertical {{
-                height: 0px;
-            }}
-            
-            QScrollBar::add-page:vertical, QScrollBar::sub-page:vertical {{
-                background: none;
-            }}
-        ''')
-        
-        # Create colored line
-        self.line_color = line_color
-        
-    def paintEvent(self, event):
-        """Paint the colored line on the dialog window."""
-        painter = QtGui.QPainter(self)
-        painter.setRenderHint(QtGui.QPainter.Antialiasing)
-        
-        # Draw the top colored line
-        line_pen = QtGui.QPen(self.line_color.value, 3)
-        painter.setPen(line_pen)
-        painter.drawLine(0, 0, self.width(), 0)
-        
-        # Draw a subtle gradient header area
-        header_gradient = QtGui.QLinearGradient(0, 0, 0, 15)
-        header_gradient.setColorAt(0, QtGui.QColor(60, 60, 60, 150))
-        header_gradient.setColorAt(1, QtGui.QColor(50, 50, 50, 0))
-        painter.fillRect(QtCore.QRect(0, 0, self.width(), 15), header_gradient)
-
 # Configuration discovery
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 PRODUCTION_CONFIG_PATH = "/opt/Autodesk/shared/python/flame_comfyui_config.json"
@@ -656,6 +65,41 @@ DEFAULT_CONFIG = {
     # config file is created on disk.
     "workflows_dir": _default_workflows_dir(),
     "temp_dir": "/tmp/flame_comfyui",
+    # Local Prometheus endpoint (0 disables it) and snapshot interval in seconds
+    "metrics_port": 9464,
+    "metrics_snapshot_interval": 30,
+    # Export format for frames sent to ComfyUI: "auto" picks the fastest format that
+    # suits the workflow (measured on this machine), or force "jpeg", "png" or "tiff"
+    "export_format": "auto",
+    # Extra frames exported either side of the marked or requested range
+    "export_handles": 0,
+    # Preview mode: fraction of the resolution, and load every Nth frame
+    "preview_scale": 0.5,
+    "preview_every_nth": 1,
+    # Region of interest: pixels kept around the region, and the matte level counted as inside
+    "roi_padding": 32,
+    "roi_matte_threshold": 0.01,
+    # Upscale frames of tile_above_pixels or more (0 disables) are split into tile_size tiles
+    # overlapping by tile_overlap, shared between comfyui_url and the comfyui_servers URLs
+    "tile_above_pixels": 3840 * 2160,
+    "tile_size": 1024,
+    "tile_overlap": 128,
+    "comfyui_servers": [],
+    # Render held frames once for per-frame workflows; above 0, frames this close
+    # (mean thumbnail difference, 0-255) to the previous one also count as held
+    "dedup_frames": True,
+    "dedup_perceptual_threshold": 0.0,
+    # Temporal workflows are rendered in chunks of at most this many frames (0 = no
+    # limit), overlapping by temporal_chunk_overlap frames inside a shot
+    "temporal_chunk_frames": 96,
+    "temporal_chunk_overlap": 8,
+    # Chunks are also split at cuts: colour histogram distance (0-1) between two
+    # frames above which the second starts a new shot (0 = no detection)
+    "scene_cut_threshold": 0.35,
+    "scene_cut_min_shot": 8,
+    # Rendered frames are checked from their headers before import; this also checks
+    # the CRC of every PNG chunk, which reads whole files
+    "verify_output_crc": False,
 }
 
 
@@ -683,10 +127,6 @@ def _pick_config_file():
     return PRODUCTION_CONFIG_PATH
 
 
-# Configuration file location
-CONFIG_FILE = _pick_config_file()
-
-
 # Load configuration from file or use defaults
 def load_config():
     """Load configuration from JSON file or return defaults if file doesn't exist"""
@@ -709,51 +149,54 @@ def load_config():
         return _normalize_config_paths(DEFAULT_CONFIG)
 
 
-# Load configuration at startup
-CONFIG = load_config()
-
-# Constants - now using values from config
-COMFYUI_URL = CONFIG["comfyui_url"]
-TEMP_DIR = CONFIG["temp_dir"]
-COMFYUI_OUTPUT_DIR = CONFIG["output_dir"]
-COMFYUI_FLACOM_DIR = CONFIG["input_dir"]
-WORKFLOWS_DIR = CONFIG["workflows_dir"]
-WORKFLOW_PATH = os.path.join(WORKFLOWS_DIR, "flacom_rembg_comfla_api_workflow.json")
-COMFYUI_INPUT_DIR = COMFYUI_FLACOM_DIR
-
-# Define PYFLAME_AVAILABLE as True since we're including the components directly
+# Everything below is set up by initialize() on first use instead of at import,
+# so Flame's hook scan (and every Shift-Ctrl-H-P reload) only defines functions
+# and registers the menu. Until then these hold placeholders.
+CONFIG = None
+CONFIG_FILE = None
+COMFYUI_URL = None
+TEMP_DIR = None
+COMFYUI_OUTPUT_DIR = None
+COMFYUI_FLACOM_DIR = None
+WORKFLOWS_DIR = None
+WORKFLOW_PATH = None
+COMFYUI_INPUT_DIR = None
+
+# The PyFlame components (comfyui_pyflame_ui.py) are installed outside Flame's
+# hook directory so its scan never imports PySide; a source checkout keeps them
+# next to the hook
+PYFLAME_UI_DIR = "/opt/Autodesk/shared/comfyui_flame"
 PYFLAME_AVAILABLE = True
 
-# Create required directories if they don't exist
-for directory in [TEMP_DIR, COMFYUI_FLACOM_DIR]:
-    if not os.path.exists(directory):
-        try:
-            os.makedirs(directory)
-        except Exception as e:
-            pass
-
-# Ensure workflow directory exists
-if not os.path.exists(WORKFLOWS_DIR):
-    try:
-        os.makedirs(WORKFLOWS_DIR)
-    except Exception as e:
-        pass
-
-# Main log function to record all operations
-def log_to_file(message):
-    """Write a message to log file"""
-    log_path = "/tmp/flame_comfyui_final.log"
-    try:
-        with open(log_path, "a") as f:
-            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
-            f.write(f"[{timestamp}] {message}\n")
-    except:
-        pass
-
-# Initialize log
-try:
-    with open("/tmp/flame_comfyui_final.log", "w") as f:
-        f.write("""
+LOG_PATH = "/tmp/flame_comfyui_final.log"
+hook_logger = None
+metrics = None
+preset_catalog = None
+
+# Shared helpers from comfyui_extensions, installed next to this hook.
+# These fallbacks stay in place when it can't be imported.
+get_logger = None
+get_shared_monitor = None
+JobTracer = None
+get_metrics = None
+SmartMediaManager = None
+MediaFormat = None
+ExportPresetCatalog = None
+RegionOfInterest = None
+TiledProcessor = None
+FrameDeduplicator = None
+SceneCutDetector = None
+FrameVerifier = None
+log_context = lambda **fields: contextlib.nullcontext()
+current_tracer = lambda: None
+use_tracer = lambda tracer: contextlib.nullcontext(tracer)
+trace_span = lambda name, **attributes: contextlib.nullcontext(attributes)
+EXTENSIONS_IMPORT_ERROR = None
+
+# One client_id and one progress WebSocket per ComfyUI server for the whole Flame session
+SESSION_CLIENT_ID = f"flame_comfyui_{uuid.uuid4().hex[:12]}"
+
+LOG_BANNER = """
 __  ___             ___     _              
 \ \/ / |_ _____   _|_ _|___(_) ___  _ __   
  \  /| __/ _ \ \ / /| |/ __| |/ _ \| '_ \  
@@ -773,14 +216,161 @@ __     _________  __  ____  _            _ _
   \ V / |  _|  /  \  |  __/| | |_) |  __/ | | | | |  __/
    \_/  |_|   /_/\_\ |_|   |_| .__/ \___|_|_|_| |_|\___|
                              |_|                        
-""")
-        f.write("\n=== ComfyUI Hook Log ===\n")
-        f.write(f"Started: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-except:
-    pass
+"""
+
+_initialized = False
+_initialize_lock = threading.RLock()
+
+def _load_extensions():
+    """Import comfyui_extensions and use its helpers instead of the fallbacks"""
+    global get_logger, log_context, get_shared_monitor, JobTracer, current_tracer
+    global use_tracer, trace_span, get_metrics, SmartMediaManager, MediaFormat, ExportPresetCatalog
+    global RegionOfInterest, TiledProcessor, FrameDeduplicator, SceneCutDetector, FrameVerifier
+    global EXTENSIONS_IMPORT_ERROR
+
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    try:
+        import comfyui_extensions
+    except Exception as e:
+        EXTENSIONS_IMPORT_ERROR = str(e)
+        return
+
+    get_logger = comfyui_extensions.get_logger
+    log_context = comfyui_extensions.log_context
+    get_shared_monitor = comfyui_extensions.get_shared_monitor
+    JobTracer = comfyui_extensions.JobTracer
+    current_tracer = comfyui_extensions.current_tracer
+    use_tracer = comfyui_extensions.use_tracer
+    trace_span = comfyui_extensions.trace_span
+    get_metrics = comfyui_extensions.get_metrics
+    SmartMediaManager = comfyui_extensions.SmartMediaManager
+    MediaFormat = comfyui_extensions.MediaFormat
+    ExportPresetCatalog = comfyui_extensions.ExportPresetCatalog
+    RegionOfInterest = comfyui_extensions.RegionOfInterest
+    TiledProcessor = comfyui_extensions.TiledProcessor
+    FrameDeduplicator = comfyui_extensions.FrameDeduplicator
+    SceneCutDetector = comfyui_extensions.SceneCutDetector
+    FrameVerifier = comfyui_extensions.FrameVerifier
+
+def initialize():
+    """
+    Load the config, create the working directories and start logging.
+    Runs once per hook load, the first time anything needs it.
+    """
+    global _initialized, CONFIG, CONFIG_FILE, COMFYUI_URL, TEMP_DIR, COMFYUI_OUTPUT_DIR
+    global COMFYUI_FLACOM_DIR, WORKFLOWS_DIR, WORKFLOW_PATH, COMFYUI_INPUT_DIR, hook_logger
+
+    if _initialized:
+        return
+    with _initialize_lock:
+        if _initialized:
+            return
+
+        CONFIG_FILE = _pick_config_file()
+        CONFIG = load_config()
+
+        COMFYUI_URL = CONFIG["comfyui_url"]
+        TEMP_DIR = CONFIG["temp_dir"]
+        COMFYUI_OUTPUT_DIR = CONFIG["output_dir"]
+        COMFYUI_FLACOM_DIR = CONFIG["input_dir"]
+        WORKFLOWS_DIR = CONFIG["workflows_dir"]
+        WORKFLOW_PATH = os.path.join(WORKFLOWS_DIR, "flacom_rembg_comfla_api_workflow.json")
+        COMFYUI_INPUT_DIR = COMFYUI_FLACOM_DIR
+
+        # Create required directories if they don't exist
+        for directory in [TEMP_DIR, COMFYUI_FLACOM_DIR, WORKFLOWS_DIR]:
+            if not os.path.exists(directory):
+                try:
+                    os.makedirs(directory)
+                except Exception as e:
+                    pass
+
+        _load_extensions()
+        hook_logger = get_logger(LOG_PATH, level=CONFIG.get("log_level", "INFO")) if get_logger else None
+
+        # Initialize log; the shared logger survives hook reloads, so it truncates its own file
+        header = f"{LOG_BANNER}\n=== ComfyUI Hook Log ===\nStarted: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+        if hook_logger:
+            hook_logger.reset(header)
+        else:
+            try:
+                with open(LOG_PATH, "w") as f:
+                    f.write(header)
+            except:
+                pass
+
+        _initialized = True
+
+    log_to_file("Hook initialized with PyFlame UI components")
+    if EXTENSIONS_IMPORT_ERROR:
+        log_to_file(f"comfyui_extensions unavailable, using unbuffered logging: {EXTENSIONS_IMPORT_ERROR}", "WARNING")
+
+# Main log function to record all operations
+def log_to_file(message, level="INFO"):
+    """Write a message to log file (queued and written by a background thread)"""
+    if not _initialized:
+        initialize()
+    if hook_logger:
+        hook_logger.log(message, level)
+        return
+    try:
+        with open(LOG_PATH, "a") as f:
+            timestamp = time.strftime("%Y-%m-%d %H:%M:%S")
+            f.write(f"[{timestamp}] {message}\n")
+    except:
+        pass
+
+def get_session_monitor():
+    """Get the shared progress monitor for COMFYUI_URL, or None if it can't be used"""
+    initialize()
+    if get_shared_monitor is None:
+        return None
+    try:
+        monitor = get_shared_monitor(COMFYUI_URL, client_id=SESSION_CLIENT_ID)
+        # Per-node timings of every job, aggregated per workflow
+        monitor.enable_profiling(os.path.join(TEMP_DIR, "node_profiles.json"))
+        return monitor
+    except Exception as e:
+        log_to_file(f"Could not start progress monitor: {e}")
+        return None
 
-# Log that the module was loaded
-log_to_file("Hook module loaded with embedded PyFlame UI components")
+def start_metrics():
+    """
+    Queue depth, throughput and latency for this Flame seat, in Prometheus text format.
+    Started with the first job; returns None when comfyui_extensions is unavailable.
+    """
+    global metrics
+    initialize()
+    with _initialize_lock:
+        if metrics is not None or get_metrics is None:
+            return metrics
+        metrics = get_metrics()
+    try:
+        metrics_port = int(CONFIG["metrics_port"])
+        if metrics_port and metrics.serve("127.0.0.1", metrics_port):
+            log_to_file(f"Metrics endpoint: http://127.0.0.1:{metrics_port}/metrics")
+        metrics.start_snapshots(os.path.join(TEMP_DIR, "metrics.prom"), float(CONFIG["metrics_snapshot_interval"]))
+    except Exception as e:
+        log_to_file(f"Could not start metrics: {e}", "WARNING")
+    return metrics
+
+def record_metric(kind, name, value=1.0, **labels):
+    """Update a metric when comfyui_extensions is available (kind: inc, set, observe)"""
+    registry = metrics or start_metrics()
+    if registry:
+        getattr(registry, kind)(name, value, **labels)
+
+def load_pyflame_ui():
+    """Import the PyFlame widgets (and PySide) the first time a dialog is shown"""
+    for ui_dir in (SCRIPT_DIR, PYFLAME_UI_DIR):
+        if os.path.isfile(os.path.join(ui_dir, "comfyui_pyflame_ui.py")):
+            if ui_dir not in sys.path:
+                sys.path.insert(0, ui_dir)
+            break
+    import comfyui_pyflame_ui
+    comfyui_pyflame_ui.log_to_file = log_to_file
+    return comfyui_pyflame_ui
 
 # Show message in Flame using different available methods
 def show_flame_message(message):
@@ -856,8 +446,143 @@ def show_flame_message(message):
     return False
 
 # Export frames from Flame clip to ComfyUI's expected directory
-def export_frame(source, output_path):
-    """Export frames from the selected clip directly to ComfyUI's input directory."""
+def get_clip_frame_count(clip):
+    """Number of frames in a clip (None if Flame doesn't say)"""
+    duration = getattr(clip, 'duration', None)
+    if hasattr(duration, 'frame'):
+        return int(duration.frame)
+    try:
+        return int(duration)
+    except (TypeError, ValueError):
+        return None
+
+def get_mark_frame(mark):
+    """Frame number of a Flame mark (PyTime, attribute or int), or None when it isn't set"""
+    if hasattr(mark, 'get_value'):
+        mark = mark.get_value()
+    if hasattr(mark, 'frame'):
+        mark = mark.frame
+    try:
+        frame = int(mark)
+    except (TypeError, ValueError):
+        return None
+    return frame if frame > 0 else None
+
+def set_clip_marks(clip, start, end):
+    """Set in/out marks (inclusive frames), in whichever order Flame accepts"""
+    try:
+        clip.in_mark = start
+        clip.out_mark = end
+    except Exception:
+        clip.out_mark = end
+        clip.in_mark = start
+
+def frames_to_ranges(frames):
+    """Sorted inclusive (start, end) runs of consecutive frame numbers"""
+    ranges = []
+    for frame in sorted(set(int(f) for f in frames)):
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1] = (ranges[-1][0], frame)
+        else:
+            ranges.append((frame, frame))
+    return ranges
+
+def plan_export_ranges(clip, frames=None, frame_range=None, handles=0):
+    """
+    Inclusive (start, end) frame ranges to export: an explicit frame list, else
+    frame_range, else the clip's in/out marks. None means the whole clip.
+    Each range is padded by `handles` frames, clamped to the clip, and
+    overlapping ranges are merged.
+    """
+    if frames:
+        ranges = frames_to_ranges(frames)
+    elif frame_range:
+        ranges = [(int(frame_range[0]), int(frame_range[1]))]
+    else:
+        start, end = get_mark_frame(getattr(clip, 'in_mark', None)), get_mark_frame(getattr(clip, 'out_mark', None))
+        if start is None or end is None or end < start:
+            return None
+        ranges = [(start, end)]
+
+    last_frame = get_clip_frame_count(clip)
+    padded = []
+    for start, end in ranges:
+        start, end = max(1, start - handles), end + handles
+        if last_frame:
+            end = min(end, last_frame)
+        if start > end:
+            continue
+        if padded and start <= padded[-1][1] + 1:
+            padded[-1] = (padded[-1][0], max(end, padded[-1][1]))
+        else:
+            padded.append((start, end))
+
+    if last_frame and padded == [(1, last_frame)]:
+        return None
+    return padded or None
+
+def export_clip_ranges(clip, preset, output_dir, ranges):
+    """
+    Export ranges of a clip with one PyExporter call per range.
+
+    The whole clip (ranges=None) and a range equal to the clip's own marks are
+    exported from the clip as is. Other ranges are marked on the clip and its
+    marks are restored afterwards; only a clip without marks to restore is
+    duplicated first. Returns the number of export calls made.
+    """
+    exporter = flame.PyExporter()
+    exporter.foreground = True
+    if not ranges:
+        exporter.export_between_marks = False
+        result = exporter.export(clip, preset, output_dir)
+        log_to_file(f"Export result (whole clip): {result}")
+        return 1
+
+    exporter.export_between_marks = True
+    original_marks = (get_mark_frame(getattr(clip, 'in_mark', None)), get_mark_frame(getattr(clip, 'out_mark', None)))
+    if ranges == [original_marks]:
+        result = exporter.export(clip, preset, output_dir)
+        log_to_file(f"Export result (marks {original_marks[0]}-{original_marks[1]}): {result}")
+        return 1
+
+    duplicate_clip = flame.duplicate(clip) if None in original_marks else None
+    target = duplicate_clip or clip
+    calls = 0
+    try:
+        for start, end in ranges:
+            try:
+                set_clip_marks(target, start, end)
+                result = exporter.export(target, preset, output_dir)
+                calls += 1
+                log_to_file(f"Export result (frames {start}-{end}): {result}", "DEBUG" if len(ranges) > 20 else "INFO")
+            except Exception as e:
+                log_to_file(f"Error exporting frames {start}-{end}: {str(e)}")
+    finally:
+        if duplicate_clip is not None:
+            try:
+                flame.delete(duplicate_clip)
+            except Exception as e:
+                log_to_file(f"Error deleting duplicate clip: {str(e)}")
+        else:
+            try:
+                set_clip_marks(clip, *original_marks)
+            except Exception as e:
+                log_to_file(f"Could not restore marks {original_marks} on {clip.name}: {str(e)}", "WARNING")
+    return calls
+
+def export_frame(source, output_path, workflow=None, frames=None, frame_range=None, handles=None, region=None,
+                 scale=None):
+    """
+    Export frames from the selected clip directly to ComfyUI's input directory.
+    With a workflow, frames use the fastest format adequate for it (see choose_export_preset).
+    Workflows that first resize their input to a fixed size get frames at that size
+    (see negotiate_export_resolution); otherwise `scale` (previews) exports at that
+    fraction of the clip's resolution.
+    Only the requested frames, frame_range or the clip's in/out marks are exported,
+    plus CONFIG["export_handles"] frames either side (see plan_export_ranges).
+    With a region (x, y, width, height) the full frames go to output_path/plate and
+    only the region is written to the input directory (see process_region_with_comfyui).
+    """
     try:
         log_to_file(f"Exporting frames from: {source.name}")
 
@@ -871,7 +596,7 @@ def export_frame(source, output_path):
                 old_path = os.path.join(clip_dir, old_file)
                 if os.path.isfile(old_path):
                     os.remove(old_path)
-                    log_to_file(f"Removed old file: {old_path}")
+                    log_to_file(f"Removed old file: {old_path}", "DEBUG")
             log_to_file("Cleared directory for new export")
         except Exception as e:
             log_to_file(f"Error clearing directory: {str(e)}")
@@ -879,53 +604,56 @@ def export_frame(source, output_path):
         if not os.path.exists(clip_dir):
             os.makedirs(clip_dir)
             log_to_file(f"Created ComfyUI input directory: {clip_dir}")
-        
-        # Create a duplicate clip to work with
-        duplicate_clip = flame.duplicate(source)
-        output_file = None
+
+        if handles is None:
+            handles = int(CONFIG.get("export_handles", 0))
+        ranges = plan_export_ranges(source, frames, frame_range, handles)
+        if ranges:
+            log_to_file(f"Exporting {sum(end - start + 1 for start, end in ranges)} frames in {len(ranges)} range(s): "
+                        f"{ranges[:5]}{'...' if len(ranges) > 5 else ''}")
+        else:
+            log_to_file("Exporting the whole clip")
         
         try:
-            # Get preset path for JPEG export
-            try:
-                preset_dir = flame.PyExporter.get_presets_dir(
-                    flame.PyExporter.PresetVisibility.Autodesk,
-                    flame.PyExporter.PresetType.Image_Sequence)
-                jpeg_preset = os.path.join(preset_dir, "Jpeg", "Jpeg (8-bit).xml")
-                
-                if not os.path.exists(jpeg_preset):
-                    preset_dir = "/opt/Autodesk/presets/2025.2.1/export/presets/flame/file_sequence"
-                    jpeg_preset = os.path.join(preset_dir, "Jpeg", "Jpeg (8-bit).xml")
-                    
-                if not os.path.exists(jpeg_preset):
-                    # Try to find any image preset
-                    log_to_file("JPEG preset not found, searching for alternatives...")
-                    for format_dir in ["Tiff", "OpenEXR", "DPX", "Targa"]:
-                        test_path = os.path.join(preset_dir, format_dir)
-                        if os.path.exists(test_path):
-                            presets = [f for f in os.listdir(test_path) if f.endswith('.xml')]
-                            if presets:
-                                jpeg_preset = os.path.join(test_path, presets[0])
-                                log_to_file(f"Using alternative preset: {jpeg_preset}")
-                                break
-                
-                log_to_file(f"Using preset: {jpeg_preset}")
-            except Exception as e:
-                log_to_file(f"Error finding preset: {str(e)}")
-                # Try hardcoded path as last resort
-                jpeg_preset = "/opt/Autodesk/presets/2025.2.1/export/presets/flame/file_sequence/Jpeg/Jpeg (8-bit).xml"
-                log_to_file(f"Falling back to hardcoded preset path: {jpeg_preset}")
-            
-            # Export the frame
-            exporter = flame.PyExporter()
-            exporter.foreground = True
-            
-            # Export all frames - don't restrict to marks
-            exporter.export_between_marks = False 
+            # Preset for the format chosen for this workflow, else JPEG (or the first
+            # image-sequence format this Flame has)
+            jpeg_preset = (choose_export_preset(source, workflow) if workflow else None) or resolve_export_preset()
+            if not jpeg_preset:
+                show_flame_message("No image sequence export preset found\nCheck log")
+                return False, None
+            log_to_file(f"Using preset: {jpeg_preset}")
+
+            # Region jobs keep the full frames next to the job for recompositing
+            export_dir = clip_dir
+            if region:
+                export_dir = os.path.join(output_path, "plate")
+                os.makedirs(export_dir, exist_ok=True)
+
+            # Export at the size the workflow shrinks its input to (or the preview size),
+            # through the preset when it can resize, else by resizing the exported frames
+            negotiated_size = negotiate_export_resolution(source, workflow) if workflow else None
+            scaled = not negotiated_size and scale is not None and scale < 1.0
+            export_size = None
+            if not region:
+                export_size = negotiated_size or (scaled_export_size(source, scale) if scaled else None)
+            resize_after_export = None
+            if export_size:
+                sized_preset = patch_preset_resolution(jpeg_preset, *export_size)
+                if sized_preset:
+                    jpeg_preset = sized_preset
+                else:
+                    resize_after_export = export_size
             
             # Use a simplified basename for consistent sequence naming
             # VHS_LoadImagesPath expects a consistent pattern
-            result = exporter.export(duplicate_clip, jpeg_preset, clip_dir)
-            log_to_file(f"Export result: {result}")
+            export_clip_ranges(source, jpeg_preset, export_dir, ranges)
+            if resize_after_export:
+                resize_exported_frames(export_dir, size=resize_after_export)
+            if region:
+                # The plate stays full size for recompositing; only the region is scaled
+                crop_region_frames(export_dir, clip_dir, region)
+                if scaled:
+                    resize_exported_frames(clip_dir, scale=scale)
             
             # Check if any images were exported
             files = [f for f in os.listdir(clip_dir) if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))]
@@ -947,20 +675,20 @@ def export_frame(source, output_path):
             # using alternative methods
             log_to_file("Trying alternative frame export...")
             
-            # Try alternative extraction - use appropriate range
-            if hasattr(source.duration, 'frame'):
-                end_frame = source.duration.frame
-            elif isinstance(source.duration, str):
-                log_to_file(f"Duration is a string: {source.duration}, using 10 frames")
-                end_frame = 10
+            # Try alternative extraction over the same frames
+            if ranges:
+                start_frame, end_frame = ranges[0][0], ranges[-1][1]
             else:
-                try:
-                    end_frame = int(source.duration)
-                except:
-                    end_frame = 10
+                start_frame, end_frame = 1, get_clip_frame_count(source) or 10
             
             # Try alternative export method specifically for sequences
-            extract_sequence_for_vhs(clip_dir, duplicate_clip, 1, end_frame)
+            extract_sequence_for_vhs(export_dir, source, start_frame, end_frame, preset=jpeg_preset)
+            if resize_after_export:
+                resize_exported_frames(export_dir, size=resize_after_export)
+            if region:
+                crop_region_frames(export_dir, clip_dir, region)
+                if scaled:
+                    resize_exported_frames(clip_dir, scale=scale)
             
             # Check again for exported files
             files = [f for f in os.listdir(clip_dir) if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))]
@@ -970,6 +698,10 @@ def export_frame(source, output_path):
                 files.sort()
                 first_image = os.path.join(clip_dir, files[0])
                 return True, first_image
+
+            if region:
+                log_to_file("No frames to crop for the region")
+                return False, None
                 
             # Last resort - create at least one image
             log_to_file("Creating a blank image as last resort")
@@ -977,6 +709,7 @@ def export_frame(source, output_path):
             
             try:
                 # Create a simple blank image with PIL
+                from PIL import Image
                 image = Image.new('RGB', (1920, 1080), color=(0, 0, 0))
                 image.save(blank_path)
                 log_to_file(f"Created blank image: {blank_path}")
@@ -991,13 +724,6 @@ def export_frame(source, output_path):
             log_to_file(traceback.format_exc())
             show_flame_message("Export failed\nCheck log")
             return False, None
-            
-        finally:
-            # Clean up the duplicate clip
-            try:
-                flame.delete(duplicate_clip)
-            except Exception as e:
-                log_to_file(f"Error deleting duplicate clip: {str(e)}")
                 
     except Exception as e:
         log_to_file(f"Error in export_frame: {str(e)}")
@@ -1005,32 +731,199 @@ def export_frame(source, output_path):
         show_flame_message("Export failed\nCheck log")
         return False, None
 
-# New function optimized for VHS_LoadImagesPath
-def extract_sequence_for_vhs(output_dir, clip, start_frame, end_frame):
-    """Extract a sequence of frames optimized for VHS_LoadImagesPath"""
+def get_preset_catalog():
+    """The export presets of this Flame version (cached on disk), or None without comfyui_extensions"""
+    global preset_catalog
+    initialize()
+    with _initialize_lock:
+        if preset_catalog is None and ExportPresetCatalog is not None:
+            preset_catalog = ExportPresetCatalog(cache_path=os.path.join(TEMP_DIR, "export_presets.json"),
+                                                 flame_version=get_flame_version())
+    return preset_catalog
+
+def resolve_export_preset(formats=("jpeg", "tiff", "exr", "dpx", "targa")):
+    """Path of the first image-sequence preset available among formats, or None"""
+    catalog = get_preset_catalog()
+    if catalog:
+        for media_format in formats:
+            preset = catalog.find(media_format)
+            if preset:
+                return preset
+        log_to_file(f"No {'/'.join(formats)} export preset for Flame {catalog.flame_version} "
+                    f"(searched {catalog.roots}, found {catalog.formats()})", "ERROR")
+        return None
+
+    # Without comfyui_extensions: this Flame's Autodesk presets only
+    try:
+        preset_dir = flame.PyExporter.get_presets_dir(
+            flame.PyExporter.PresetVisibility.Autodesk,
+            flame.PyExporter.PresetType.Image_Sequence)
+        for format_dir, preset_name in (("Jpeg", "Jpeg (8-bit).xml"), ("Tiff", "Tiff (8-bit).xml")):
+            preset = os.path.join(preset_dir, format_dir, preset_name)
+            if os.path.exists(preset):
+                return preset
+        log_to_file(f"No export preset found in {preset_dir}", "ERROR")
+    except Exception as e:
+        log_to_file(f"Error finding preset: {str(e)}", "ERROR")
+    return None
+
+def choose_export_preset(source, workflow):
+    """
+    Export preset for the frames sent to ComfyUI, following CONFIG["export_format"].
+    "auto" classifies the workflow (matte, upscale, grading, depth, generation) and
+    picks the format with the lowest measured encode + transfer + decode cost among
+    those adequate for it. Returns None to keep the JPEG preset.
+    """
+    initialize()
+    export_format = str(CONFIG.get("export_format", "auto")).lower()
+    if SmartMediaManager is None or export_format == "jpeg":
+        return None
+
+    try:
+        if export_format == "auto":
+            try:
+                width, height = int(source.width), int(source.height)
+            except Exception:
+                width, height = 1920, 1080
+            workflow_type = SmartMediaManager.classify_workflow(workflow)
+            with trace_span("choose_format", workflow_type=workflow_type):
+                media_format, results = SmartMediaManager.choose_transport_format(
+                    workflow_type, width, height, COMFYUI_FLACOM_DIR,
+                    cache_path=os.path.join(TEMP_DIR, "format_benchmark.json"), background=True)
+            if results:
+                costs = ", ".join(f"{name} {cost['total_s'] * 1000:.0f} ms"
+                                  for name, cost in results["formats"].items())
+                log_to_file(f"Workflow class {workflow_type}: {media_format.value} is fastest per frame ({costs})")
+            else:
+                log_to_file(f"Workflow class {workflow_type}: formats not measured yet, using {media_format.value}")
+        else:
+            media_format = MediaFormat(export_format)
+
+        preset = resolve_export_preset((media_format.value,))
+        if preset:
+            log_to_file(f"Export format: {media_format.value} ({preset})")
+            return preset
+        log_to_file(f"No {media_format.value} export preset, using JPEG", "WARNING")
+    except Exception as e:
+        log_to_file(f"Error choosing export format: {str(e)}", "WARNING")
+    return None
+
+def negotiate_export_resolution(source, workflow):
+    """
+    Size to export the source at when the workflow resizes the loaded frames to
+    a fixed size first (see SmartMediaManager.negotiate_export_size), else None
+    """
+    initialize()
+    if SmartMediaManager is None or not workflow:
+        return None
+    try:
+        width, height = int(source.width), int(source.height)
+    except Exception:
+        return None
+    size = SmartMediaManager.negotiate_export_size(workflow, width, height)
+    if size:
+        log_to_file(f"Workflow resizes its input first: exporting at {size[0]}x{size[1]} instead of {width}x{height}")
+    return size
+
+def scaled_export_size(source, scale):
+    """The source's resolution times `scale`, or None when the clip doesn't report it"""
+    try:
+        width, height = int(source.width), int(source.height)
+    except Exception:
+        return None
+    size = (max(1, int(round(width * scale))), max(1, int(round(height * scale))))
+    log_to_file(f"Exporting at {scale:.0%}: {size[0]}x{size[1]} instead of {width}x{height}")
+    return size
+
+def patch_preset_resolution(preset, width, height):
+    """
+    Copy of an export preset that resizes to width x height, written next to the
+    other temporary files. None when the preset has no resize settings to patch.
+    """
+    import xml.etree.ElementTree as ElementTree
+
+    try:
+        tree = ElementTree.parse(preset)
+        resize = tree.getroot().find('.//resize')
+        if resize is None or resize.find('width') is None or resize.find('height') is None:
+            log_to_file(f"Preset has no resize settings: {preset}", "DEBUG")
+            return None
+        resize.find('width').text = str(width)
+        resize.find('height').text = str(height)
+
+        preset_dir = os.path.join(TEMP_DIR, "presets")
+        os.makedirs(preset_dir, exist_ok=True)
+        name = os.path.splitext(os.path.basename(preset))[0]
+        patched = os.path.join(preset_dir, f"{name} {width}x{height}.xml")
+        tree.write(patched, encoding="UTF-8", xml_declaration=True)
+        return patched
+    except Exception as e:
+        log_to_file(f"Could not patch preset {preset} to {width}x{height}: {str(e)}", "WARNING")
+        return None
+
+def resize_exported_frames(directory, scale=None, size=None):
+    """
+    Resize the exported frames in place, by `scale` or to `size` (width, height),
+    for presets that can't export at that size. JPEG frames are rewritten as PNG
+    rather than compressed a second time. Returns the number of frames resized; 0
+    when Pillow is missing or the format can't be read, in which case the frames
+    stay as exported.
+    """
+    if not size and (scale is None or scale >= 1.0):
+        return 0
+    try:
+        from PIL import Image
+    except ImportError:
+        log_to_file("Pillow not available, frames stay at their exported resolution", "WARNING")
+        return 0
+
+    resized = 0
+    for filename in sorted(os.listdir(directory)):
+        extension = os.path.splitext(filename)[1].lower()
+        if extension not in ('.jpg', '.jpeg', '.png', '.tif', '.tiff'):
+            continue
+        path = os.path.join(directory, filename)
+        try:
+            with Image.open(path) as image:
+                target = size or (max(1, int(image.width * scale)), max(1, int(image.height * scale)))
+                if tuple(target) == image.size:
+                    continue
+                if extension in ('.jpg', '.jpeg'):
+                    # Let the JPEG decoder skip most of the work
+                    image.draft(image.mode, target)
+                image = image.resize(target, Image.BILINEAR)
+            if extension in ('.jpg', '.jpeg'):
+                image.save(os.path.splitext(path)[0] + '.png', compress_level=3)
+                os.remove(path)
+            elif extension == '.png':
+                image.save(path, compress_level=3)
+            else:
+                image.save(path)
+            resized += 1
+        except Exception as e:
+            log_to_file(f"Could not resize {filename}: {str(e)}", "WARNING")
+    log_to_file(f"Resized {resized} frames to {f'{size[0]}x{size[1]}' if size else f'{scale:.0%}'}")
+    return resized
+
+# New function optimized for VHS_LoadImagesPath
+def extract_sequence_for_vhs(output_dir, clip, start_frame, end_frame, preset=None):
+    """Extract a sequence of frames optimized for VHS_LoadImagesPath"""
     log_to_file(f"Extracting sequence for VHS: frames {start_frame} to {end_frame}")
     
     # Make sure we use a consistent naming pattern that VHS can read
     # VHS likes simple, sequential numbering
-    frame_pattern = "frame_%04d.jpg"
+    frame_pattern = "frame_%04d"
     
     try:
-        # Set up the exporter 
-        exporter = flame.PyExporter()
-        exporter.foreground = True
-        
-        # Get JPEG preset
-        preset_dir = flame.PyExporter.get_presets_dir(
-            flame.PyExporter.PresetVisibility.Autodesk,
-            flame.PyExporter.PresetType.Image_Sequence)
-        jpeg_preset = os.path.join(preset_dir, "Jpeg", "Jpeg (8-bit).xml")
+        # Get JPEG preset unless the caller picked one
+        jpeg_preset = preset or resolve_export_preset()
+        if not jpeg_preset:
+            return
         
-        # Export the whole clip - don't constrain to marks
         log_to_file(f"Exporting frames to: {output_dir}")
         
-        # Simple direct export
-        result = exporter.export(clip, jpeg_preset, output_dir)
-        log_to_file(f"Export result: {result}")
+        # Export the requested frames as one range
+        export_clip_ranges(clip, jpeg_preset, output_dir, [(start_frame, end_frame)])
         
         # Check the results
         files = [f for f in os.listdir(output_dir) if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))]
@@ -1039,27 +932,8 @@ def extract_sequence_for_vhs(output_dir, clip, start_frame, end_frame):
         if not files:
             # Try an alternative method - export frame by frame
             log_to_file("No files exported. Trying frame-by-frame export...")
-            
-            # Export each frame separately
-            max_frames = min(end_frame, 10)  # Limit to 10 frames max
-            
-            for frame in range(start_frame, max_frames + 1):
-                try:
-                    # Try to export a single frame
-                    frame_exporter = flame.PyExporter()
-                    frame_exporter.foreground = True
-                    
-                    # Set marks to export only this frame
-                    clip.in_mark = frame
-                    clip.out_mark = frame
-                    frame_exporter.export_between_marks = True
-                    
-                    # Export with specific filename
-                    frame_path = os.path.join(output_dir, frame_pattern % frame)
-                    result = frame_exporter.export(clip, jpeg_preset, output_dir)
-                    log_to_file(f"Frame {frame} export result: {result}")
-                except Exception as e:
-                    log_to_file(f"Error exporting frame {frame}: {str(e)}")
+            export_clip_ranges(clip, jpeg_preset, output_dir,
+                               [(frame, frame) for frame in range(start_frame, end_frame + 1)])
         
         # Check if we have files now
         new_files = [f for f in os.listdir(output_dir) if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))]
@@ -1069,12 +943,12 @@ def extract_sequence_for_vhs(output_dir, clip, start_frame, end_frame):
             for i, file in enumerate(sorted(new_files)):
                 try:
                     old_path = os.path.join(output_dir, file)
-                    new_name = frame_pattern % (i + 1)
+                    new_name = frame_pattern % (i + 1) + os.path.splitext(file)[1]
                     new_path = os.path.join(output_dir, new_name)
                     
                     if file != new_name:  # Only rename if needed
                         os.rename(old_path, new_path)
-                        log_to_file(f"Renamed {file} to {new_name}")
+                        log_to_file(f"Renamed {file} to {new_name}", "DEBUG")
                 except Exception as e:
                     log_to_file(f"Error renaming {file}: {str(e)}")
     
@@ -1184,7 +1058,7 @@ def process_with_comfyui_api(image_path, output_dir, workflow_path=None):
         # Create API request
         api_request = {
             "prompt": workflow,
-            "client_id": f"flame_comfyui_{job_id}"
+            "client_id": SESSION_CLIENT_ID
         }
 
         # Send request
@@ -1342,8 +1216,68 @@ def check_or_create_reel():
         log_to_file(f"Error in check_or_create_reel: {str(e)}")
         return None
 
+# Image sequence file names: prefix, frame number, extension (after SaveImage's trailing "_")
+SEQUENCE_FILE_PATTERN = re.compile(r'^(.*?)(\d+)(_?\.[A-Za-z0-9]+)$')
+
+def index_sequences(directory, extensions=('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff')):
+    """
+    Group the image files of a directory into sequences. Keys are (prefix, padding,
+    suffix), the suffix being the extension with any separator before it, and
+    values map each frame number to its file name.
+    """
+    sequences = {}
+    for filename in os.listdir(directory):
+        match = SEQUENCE_FILE_PATTERN.match(filename)
+        if match and os.path.splitext(filename)[1].lower() in extensions:
+            prefix, digits, suffix = match.groups()
+            sequences.setdefault((prefix, len(digits), suffix), {})[int(digits)] = filename
+    return sequences
+
+def import_indexed_sequence(directory, key, files, reel):
+    """
+    Import one sequence from index_sequences as one clip, with a single
+    import_clips call when possible: a frame range pattern like
+    'img_v1.[00001-00100].png' for contiguous frames, else the list of files.
+    Importing file by file, one clip per frame, is the last resort.
+    """
+    prefix, padding, suffix = key
+    name = prefix.rstrip('_.-') or prefix
+    frames = sorted(files)
+    paths = [os.path.join(directory, files[frame]) for frame in frames]
+
+    attempts = []
+    if len(frames_to_ranges(frames)) == 1:
+        pattern = f"{prefix}[{frames[0]:0{padding}d}-{frames[-1]:0{padding}d}]{suffix}"
+        attempts.append(("pattern", os.path.join(directory, pattern)))
+    attempts.append(("file list", paths))
+    for method, source in attempts:
+        try:
+            if flame.import_clips(source, reel):
+                log_to_file(f"Imported {name} ({len(paths)} frames) in one call by {method}")
+                return True
+        except Exception as e:
+            log_to_file(f"Import of {name} by {method} failed: {str(e)}")
+
+    log_to_file(f"Importing {name} file by file ({len(paths)} files)", "WARNING")
+    progress = flame.create_progress_dialog("Importing Sequence", len(paths)) if hasattr(flame, 'create_progress_dialog') else None
+    imported = 0
+    try:
+        for i, path in enumerate(paths):
+            if progress:
+                progress.set_progress(i)
+                progress.set_message(f"Importing {os.path.basename(path)}")
+            try:
+                if flame.import_clips(path, reel):
+                    imported += 1
+            except Exception as e:
+                log_to_file(f"Error importing {path}: {str(e)}")
+    finally:
+        if progress:
+            progress.close()
+    return imported > 0
+
 def import_sequence_to_flame(directory_path):
-    """Import a sequence of images into Flame"""
+    """Import the image sequences of a directory into Flame, one clip per sequence"""
     log_to_file(f"Importing image sequence from: {directory_path}")
     
     try:
@@ -1371,34 +1305,16 @@ def import_sequence_to_flame(directory_path):
             
         # Create full paths for each file
         file_paths = [os.path.join(directory_path, f) for f in files]
-        
-        # Progress dialog
-        if hasattr(flame, 'create_progress_dialog'):
-            progress = flame.create_progress_dialog("Importing Sequence", len(file_paths))
-        else:
-            progress = None
             
         # Import files - try different methods based on what's available
         try:
             if hasattr(flame, 'import_clips'):
-                # Method 1: Using import_clips function if available
-                log_to_file("Using flame.import_clips method")
-                
-                # Import the first file to see if it works
-                result = flame.import_clips(file_paths[0], reel)
-                log_to_file(f"Import result: {result}")
-                
-                if result:
-                    # Import the rest of the files
-                    for i, path in enumerate(file_paths[1:], 1):
-                        if progress:
-                            progress.set_progress(i)
-                            progress.set_message(f"Importing {os.path.basename(path)}")
-                            
-                        flame.import_clips(path, reel)
-                        
-                    if progress:
-                        progress.close()
+                # Method 1: one import_clips call per sequence
+                sequences = index_sequences(directory_path)
+                log_to_file(f"Using flame.import_clips for {len(sequences)} sequence(s)")
+                results = [import_indexed_sequence(directory_path, key, sequences[key], reel)
+                           for key in sorted(sequences)]
+                if any(results):
                     return True
                     
             # Method 2: Using media import
@@ -1426,155 +1342,12 @@ def import_sequence_to_flame(directory_path):
             log_to_file(f"Error during import: {str(e)}")
             log_to_file(traceback.format_exc())
             return False
-        finally:
-            if progress:
-                progress.close()
             
     except Exception as e:
         log_to_file(f"Error in import_sequence_to_flame: {str(e)}")
         log_to_file(traceback.format_exc())
         return False
 
-# REMOVED DUPLICATE FUNCTION - See line 3117 for the actual implementation
-# This duplicate was causing conflicts in Flame 2026
-# Updated process_with_comfyui function to import results
-def process_with_comfyui_DUPLICATE_REMOVED(selection):
-    """Process selected clips with ComfyUI and import results"""
-    log_to_file(f"process_with_comfyui called with {len(selection)} items")
-    
-    # First check for existing files
-    if not check_existing_outputs():
-        log_to_file("User cancelled due to existing files")
-        return
-    
-    # Show workflow selection dialog
-    selected_workflow_path = show_workflow_selection_dialog()
-    if selected_workflow_path is None:
-        log_to_file("Workflow selection cancelled or no workflow selected")
-        show_flame_message("Processing cancelled - no workflow selected")
-        return
-    
-    # Load the selected workflow
-    workflow = load_workflow(selected_workflow_path)
-    if not workflow:
-        log_to_file(f"Failed to load workflow: {selected_workflow_path}")
-        show_flame_message(f"Failed to load workflow: {os.path.basename(selected_workflow_path)}")
-        return
-    
-    # Check for text input nodes and show dialog if needed
-    text_nodes = detect_text_input_nodes(workflow)
-    if text_nodes:
-        workflow_name = get_workflow_name(selected_workflow_path)
-        text_values = show_text_input_dialog(text_nodes, workflow_name)
-        
-        if text_values is None:
-            log_to_file("Text input dialog cancelled")
-            show_flame_message("Processing cancelled - text input dialog closed")
-            return
-        
-        # Update workflow with text inputs
-        workflow = update_workflow_with_text_inputs(workflow, text_values)
-    
-    try:
-        if not selection:
-            show_flame_message("No items selected")
-            return
-            
-        # Get the first selected clip or segment
-        item = selection[0]
-        log_to_file(f"Selected item: {item.name}")
-        
-        # Create unique job directory
-        job_id = str(uuid.uuid4())
-        job_dir = os.path.join(TEMP_DIR, job_id)
-        
-        try:
-            os.makedirs(job_dir)
-            log_to_file(f"Created job directory: {job_dir}")
-        except Exception as e:
-            log_to_file(f"Error creating job directory: {str(e)}")
-            show_flame_message(f"Error creating temp directory: {str(e)}")
-            return
-        
-        # Check if ComfyUI is running
-        if not is_comfyui_running():
-            log_to_file("ComfyUI server is not running")
-            show_flame_message("Error: ComfyUI server is not running at " + COMFYUI_URL)
-            return
-            
-        # Export frames from clip - now returns the path to the first image
-        export_successful, image_path = export_frame(item, job_dir)
-        
-        if not export_successful or not image_path:
-            log_to_file("Failed to export frames from clip")
-            show_flame_message("Failed to export frames from clip")
-            return
-        
-        log_to_file(f"Image exported to: {image_path}")
-        show_flame_message("Starting ComfyUI processing in background...")
-        
-        # Create a callback function for the background process
-        def background_process():
-            try:
-                # Process with ComfyUI using the workflow
-                # Pass the loaded workflow directly instead of the path
-                output_path = process_with_comfyui_api_with_workflow(image_path, job_dir, workflow)
-
-                # After processing with ComfyUI:
-                comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
-                
-                # Check if directory exists and has any files - improved error handling
-                if os.path.exists(comfla_dir):
-                    png_files = [f for f in os.listdir(comfla_dir) if f.endswith('.png')]
-                    if png_files:
-                        log_to_file(f"Found {len(png_files)} PNG files in {comfla_dir}")
-                        try:
-                            # Create a callback for importing the results
-                            def import_results():
-                                try:
-                                    import_result = import_png_sequence(selection)
-                                    if import_result:
-                                        show_flame_message("Successfully imported PNG sequence!")
-                                    else:
-                                        show_flame_message("Failed to import PNG sequence.")
-                                except Exception as e:
-                                    log_to_file(f"Error in import callback: {str(e)}")
-                                    show_flame_message(f"Error during import: {str(e)}")
-                            
-                            # Use PyCallback to run import on main thread
-                            if hasattr(flame, 'PyCallback'):
-                                flame.PyCallback(import_results)
-                            else:
-                                # Fallback to direct call if PyCallback not available
-                                import_results()
-                            
-                        except Exception as e:
-                            log_to_file(f"Error scheduling import: {str(e)}")
-                            show_flame_message(f"Error scheduling import: {str(e)}")
-                    else:
-                        show_flame_message("No PNG files found in output directory")
-                        log_to_file(f"Directory exists but no PNG files found in {comfla_dir}")
-                else:
-                    show_flame_message("Output directory not found. Processing may have failed.")
-                    log_to_file(f"Output directory not found: {comfla_dir}")
-                    
-            except Exception as e:
-                log_to_file(f"Error in background process: {str(e)}")
-                log_to_file(traceback.format_exc())
-                show_flame_message(f"Error during processing: {str(e)}")
-        
-        # Create and start background thread
-        background_thread = threading.Thread(target=background_process)
-        background_thread.daemon = True  # Make thread daemon so it doesn't block program exit
-        background_thread.start()
-        
-        show_flame_message("Processing started in background.\nYou can continue working while ComfyUI processes your frames.")
-        
-    except Exception as e:
-        log_to_file(f"Error in process_with_comfyui: {str(e)}")
-        log_to_file(traceback.format_exc())
-        show_flame_message(f"Error: {str(e)}")
-
 # Function to determine when the action should be visible
 def scope_clip(selection):
     """Check if the selected items can be processed."""
@@ -1606,9 +1379,8 @@ def debug_log(message):
 # The main hook function
 def get_media_panel_custom_ui_actions():
     """Hook to add custom actions to Flame's Media Panel context menu."""
-    debug_log("get_media_panel_custom_ui_actions called")
-    
-    # Return the custom actions definition
+    # Registration only: config, logging, Qt and the network stack are loaded
+    # when the menu is first used (see initialize)
     return [
         {
             "name": "ComfyUI",
@@ -1619,6 +1391,27 @@ def get_media_panel_custom_ui_actions():
                     "execute": process_with_comfyui,
                     "isEnabled": True,
                     "minimize": False
+                },
+                {
+                    "name": "Preview with ComfyUI",
+                    "isVisible": scope_clip,
+                    "execute": preview_with_comfyui,
+                    "isEnabled": True,
+                    "minimize": False
+                },
+                {
+                    "name": "Process Region with ComfyUI",
+                    "isVisible": scope_clip,
+                    "execute": process_region_with_comfyui,
+                    "isEnabled": True,
+                    "minimize": False
+                },
+                {
+                    "name": "Promote ComfyUI Preview to Full Resolution",
+                    "isVisible": scope_clip,
+                    "execute": promote_comfyui_preview,
+                    "isEnabled": True,
+                    "minimize": False
                 }
             ]
         }
@@ -1630,6 +1423,7 @@ def is_comfyui_running():
     return True
 # For testing outside of Flame
 if __name__ == "__main__":
+    initialize()
     print("Flame ComfyUI Hook - Test Mode")
     print(f"ComfyUI URL: {COMFYUI_URL}")
     print(f"ComfyUI is running: {is_comfyui_running()}")
@@ -1870,7 +1664,7 @@ def prepare_sequence_for_flame(directory=None):
             if not assigned and sequences:
                 default_prefix = next(iter(sequences.keys()))
                 sequences[default_prefix].append(filename)
-                log_to_file(f"Unmatched file {filename} added to {default_prefix} sequence")
+                log_to_file(f"Unmatched file {filename} added to {default_prefix} sequence", "DEBUG")
 
         # Process each sequence type
         for prefix, files in sequences.items():
@@ -1895,7 +1689,7 @@ def prepare_sequence_for_flame(directory=None):
                 new_path = os.path.join(directory, new_name)
                 try:
                     os.rename(old_path, new_path)
-                    log_to_file(f"Renamed: {filename} -> {new_name}")
+                    log_to_file(f"Renamed: {filename} -> {new_name}", "DEBUG")
                 except Exception as e:
                     log_to_file(f"Error renaming {filename}: {str(e)}")
                     continue  # Continue with other files even if one fails
@@ -1919,7 +1713,9 @@ def import_png_sequence(selection):
         log_to_file(f"Using output directory from config: {comfy_output_dir}")
         
         # First, prepare (rename) the files to ensure the proper sequence formatting
-        if not prepare_sequence_for_flame(comfy_output_dir):
+        with trace_span("prepare"):
+            prepared = prepare_sequence_for_flame(comfy_output_dir)
+        if not prepared:
             log_to_file("Failed to prepare sequence for import.")
             return False
 
@@ -1965,73 +1761,24 @@ def import_png_sequence(selection):
                 
             log_to_file(f"Using reel: {reel.name}")
 
-            # Dynamically detect sequence types by finding all unique prefixes in the directory
-            sequence_prefixes = set()
-            all_files = [f for f in os.listdir(comfy_output_dir) if f.endswith('.png')]
-            
-            for filename in all_files:
-                # Look for pattern like "prefix_v1.00001.png"
-                match = re.match(r'^(.+?_v1)\.', filename)
-                if match:
-                    prefix = match.group(1)
-                    sequence_prefixes.add(prefix)
-            
+            # One clip per sequence, each imported in as few calls as possible
+            sequences = index_sequences(comfy_output_dir, ('.png',))
+            sequence_prefixes = [key[0].rstrip('.') for key in sorted(sequences)]
             log_to_file(f"Detected sequences to import: {sequence_prefixes}")
             
-            if not sequence_prefixes:
+            if not sequences:
                 log_to_file("No properly formatted sequences found to import")
                 return False
             
             import_success = False
-            
-            # Try to import each detected sequence
-            for prefix in sequence_prefixes:
-                sequence_name = prefix.replace('_v1', '')  # Clean up name for display
-                log_to_file(f"Attempting to import sequence: {sequence_name}")
-                
-                # Get all PNG files for this sequence type
-                png_files = sorted([f for f in os.listdir(comfy_output_dir) 
-                                 if f.startswith(f'{prefix}.') and f.endswith('.png')])
-                
-                if not png_files:
-                    log_to_file(f"No files found for {sequence_name} sequence")
-                    continue
-
-                # Create a list of full paths for all files
-                file_paths = [os.path.join(comfy_output_dir, f) for f in png_files]
-                log_to_file(f"Found {len(file_paths)} files for {sequence_name}")
-
-                try:
-                    # Try to import all files at once
-                    result = flame.import_clips(file_paths, reel)
-                    if result:
-                        log_to_file(f"Successfully imported {sequence_name} sequence")
-                        import_success = True
-                        continue
-                except Exception as e:
-                    log_to_file(f"Bulk import failed for {sequence_name}: {str(e)}")
-
-                # If bulk import fails, try sequence patterns
-                patterns = [
-                    f"{prefix}.*.png",
-                    f"{prefix}.[#####].png",
-                    f"{prefix}.[0-9][0-9][0-9][0-9][0-9].png"
-                ]
-
-                for pattern in patterns:
-                    sequence_path = os.path.join(comfy_output_dir, pattern)
-                    log_to_file(f"Trying sequence pattern for {sequence_name}: {sequence_path}")
-                    try:
-                        result = flame.import_clips(sequence_path, reel)
-                        if result:
-                            log_to_file(f"Successfully imported {sequence_name} sequence with pattern")
-                            import_success = True
-                            break
-                    except Exception as e:
-                        log_to_file(f"Pattern import failed for {sequence_name}: {str(e)}")
+            for key in sorted(sequences):
+                if import_indexed_sequence(comfy_output_dir, key, sequences[key], reel):
+                    import_success = True
 
             if import_success:
                 log_to_file(f"Successfully imported sequences: {', '.join(sequence_prefixes)}")
+                # The outputs were renamed by prepare_sequence_for_flame: nothing left to resume
+                delete_resume_manifest()
                 return True
             else:
                 log_to_file("No sequences were imported successfully")
@@ -2046,10 +1793,28 @@ def import_png_sequence(selection):
         log_to_file(traceback.format_exc())
         return False
 
-def check_existing_outputs():
+def archive_existing_outputs(comfy_output_dir, existing_files):
+    """Move existing output files into a timestamped archive folder"""
+    timestamp = time.strftime("%Y%m%d_%H%M%S")
+    archive_dir = os.path.join(comfy_output_dir, f"archive_{timestamp}")
+    try:
+        os.makedirs(archive_dir)
+        for file in existing_files:
+            src = os.path.join(comfy_output_dir, file)
+            dst = os.path.join(archive_dir, file)
+            shutil.move(src, dst)
+        log_to_file(f"Archived {len(existing_files)} files to {archive_dir}")
+        return True
+    except Exception as e:
+        log_to_file(f"Error archiving files: {str(e)}")
+        return False
+
+def check_existing_outputs(allow_resume=True):
     """
     Check for existing PNG files in the output directory and warn user
-    Returns True if it's safe to proceed, False if user wants to cancel
+    Returns True if it's safe to proceed, False if user wants to cancel,
+    or "resume" if the user wants to render only the missing frames
+    (only offered with allow_resume)
     """
     # Use the output directory from config + comfla subfolder
     comfy_output_dir = os.path.join(CONFIG["output_dir"], "comfla")
@@ -2062,24 +1827,24 @@ def check_existing_outputs():
     if existing_files:
         message = f"Found {len(existing_files)} existing PNG files in output folder.\nDo you want to:"
         options = ["Archive & Continue", "Delete & Continue", "Cancel"]
+
+        # Offer to resume when the outputs belong to a known job
+        manifest = load_resume_manifest() if allow_resume else None
+        if manifest:
+            message = (f"Found {len(existing_files)} existing PNG files in output folder "
+                       f"from '{manifest.get('clip_name')}' ({manifest.get('workflow_name')}).\nDo you want to:")
+            options.insert(0, "Resume Missing Frames")
         
         choice = flame.ask("Existing Files Warning", message, options)
         
         if choice == "Cancel":
             return False
+        elif choice == "Resume Missing Frames":
+            log_to_file(f"User chose to resume job {manifest.get('namespace')}")
+            return "resume"
         elif choice == "Archive & Continue":
             # Create archive folder with timestamp
-            timestamp = time.strftime("%Y%m%d_%H%M%S")
-            archive_dir = os.path.join(comfy_output_dir, f"archive_{timestamp}")
-            try:
-                os.makedirs(archive_dir)
-                for file in existing_files:
-                    src = os.path.join(comfy_output_dir, file)
-                    dst = os.path.join(archive_dir, file)
-                    shutil.move(src, dst)
-                log_to_file(f"Archived {len(existing_files)} files to {archive_dir}")
-            except Exception as e:
-                log_to_file(f"Error archiving files: {str(e)}")
+            if not archive_existing_outputs(comfy_output_dir, existing_files):
                 return False
         elif choice == "Delete & Continue":
             try:
@@ -2127,6 +1892,11 @@ def show_workflow_selection_dialog():
             show_flame_message("No workflows found in workflows directory")
             return None
         
+        load_pyflame_ui()
+        from comfyui_pyflame_ui import (QtGui, QtWidgets, QAction, using_pyside6, Color, LineColor,
+                                        PYFLAME_FONT, PYFLAME_FONT_SIZE, gui_resize, font_resize,
+                                        PyFlameButton, PyFlameDialogWindow, PyFlameLabel)
+
         # Create a window using our embedded PyFlame components
         window = PyFlameDialogWindow(
             title="Select ComfyUI Workflow",
@@ -2255,48 +2025,174 @@ def show_workflow_selection_dialog():
         log_to_file(traceback.format_exc())
         return None
 
-# REMOVED DUPLICATE FUNCTION - See line 2734 for the actual implementation
-# Function to show text input dialog
-def show_text_input_dialog_DUPLICATE_REMOVED(text_nodes, workflow_name):
+# Function to get workflow name from path
+def get_workflow_name(workflow_path):
+    """Extract the workflow name from its path"""
+    try:
+        return os.path.splitext(os.path.basename(workflow_path))[0]
+    except:
+        return "Workflow"
+
+# Function to detect text input nodes in the workflow - IMPROVED VERSION
+def detect_text_input_nodes(workflow):
     """
-    Display a dialog for the user to input text for each text node.
+    Scan a workflow for text input nodes and return node information.
+    Now supports multiple node types used for text inputs.
     
     Args:
-        text_nodes (list): List of text input nodes
-        workflow_name (str): Name of the workflow
+        workflow (dict): Workflow JSON data
     
     Returns:
-        dict: Dictionary of node_id -> new text value, or None if cancelled
+        list: List of dictionaries containing node ID and current text value
     """
-    if not text_nodes:
-        return {}
+    text_nodes = []
     
     try:
-        # Create a dialog window using our embedded components with larger sizes
-        window = PyFlameDialogWindow(
-            title=f"Text Inputs for {workflow_name}",
-            width=600,  # Increased width
-            height=100 + (len(text_nodes) * 70),  # Increased height per row
-            line_color=LineColor.BLUE
-        )
-        
-        # Add a title/info label
-        info_label = PyFlameLabel(
-            text="Enter text for the prompts in this workflow:"
-        )
-        window.grid_layout.addWidget(info_label, 0, 0, 1, 2)
-        
-        # Set column stretch to give the entry field more space (20% for label, 80% for text field)
-        window.grid_layout.setColumnStretch(0, 2)  # Label column gets 20% weight
-        window.grid_layout.setColumnStretch(1, 8)  # Text field column gets 80% weight
-        
-        # Create text entry fields for each text node
-        text_entries = {}
-        row = 1  # Start at row 1 after the info label
+        # List of known node types that accept text inputs
+        text_node_types = [
+            "CLIPTextEncode",           # Standard text encoder
+            "KSampler",                 # Sometimes has prompt input directly
+            "KSamplerAdvanced",         # Advanced sampler with prompt
+            "PromptText",               # Custom text node
+            "Text",                     # Generic text input
+            "Note",                     # Note node (may contain prompts)
+            "ConditioningTextPrompt",   # Another form of text conditioning 
+            "PromptStylizerNode"        # Style adapters
+        ]
         
-        for i, node in enumerate(text_nodes):
-            # Create label for the text node
-            label_text = node["title"]
+        for node_id, node in workflow.items():
+            class_type = node.get("class_type", "")
+            
+            # Check if this is a known text input node type
+            if class_type in text_node_types:
+                # For standard CLIP text encoder
+                if "inputs" in node and "text" in node.get("inputs", {}):
+                    text = node["inputs"]["text"]
+                    title = node.get("_meta", {}).get("title", class_type)
+                    
+                    text_nodes.append({
+                        "node_id": node_id,
+                        "text": text,
+                        "title": title,
+                        "class_type": class_type
+                    })
+                    log_to_file(f"Found text input node: {node_id} ({class_type}) with title '{title}' and text '{text[:30]}...'")
+            
+            # Also check for custom nodes that might have text inputs
+            elif "inputs" in node:
+                inputs = node["inputs"]
+                # Look for any input field that might contain prompt text
+                for input_name, input_value in inputs.items():
+                    if isinstance(input_value, str) and len(input_value) > 5 and input_name in ["prompt", "text", "positive", "negative"]:
+                        title = node.get("_meta", {}).get("title", class_type)
+                        if not title:
+                            title = f"{class_type} - {input_name}"
+                            
+                        text_nodes.append({
+                            "node_id": node_id,
+                            "input_name": input_name,  # Store the specific input field name
+                            "text": input_value,
+                            "title": title,
+                            "class_type": class_type
+                        })
+                        log_to_file(f"Found custom text input: {node_id}.{input_name} with value '{input_value[:30]}...'")
+        
+        log_to_file(f"Total text input nodes found: {len(text_nodes)}")
+        return text_nodes
+    except Exception as e:
+        log_to_file(f"Error detecting text input nodes: {str(e)}")
+        log_to_file(traceback.format_exc())
+        return []
+
+# Function to update workflow with new text inputs - IMPROVED VERSION
+def update_workflow_with_text_inputs(workflow, text_values):
+    """
+    Update the workflow with new text input values.
+    Now uses deep copy and handles custom input fields.
+    
+    Args:
+        workflow (dict): Workflow JSON data
+        text_values (dict): Dictionary of node_id -> new text value
+    
+    Returns:
+        dict: Updated workflow
+    """
+    if not text_values:
+        return workflow
+    
+    try:
+        # Create a DEEP copy of the workflow to modify (important for nested dictionaries)
+        updated_workflow = copy.deepcopy(workflow)
+        
+        # Update each text node with the new value
+        for node_id, new_text in text_values.items():
+            if node_id in updated_workflow and "inputs" in updated_workflow[node_id]:
+                # If this is a specific input field (for custom nodes)
+                if "." in node_id:
+                    main_id, input_field = node_id.split(".", 1)
+                    if main_id in updated_workflow and "inputs" in updated_workflow[main_id]:
+                        if input_field in updated_workflow[main_id]["inputs"]:
+                            updated_workflow[main_id]["inputs"][input_field] = new_text
+                            log_to_file(f"Updated custom input: {main_id}.{input_field} with text: {new_text[:30]}...")
+                # Standard text node
+                else:
+                    updated_workflow[node_id]["inputs"]["text"] = new_text
+                    log_to_file(f"Updated node {node_id} with text: {new_text[:30]}...")
+        
+        # Dump the entire workflow to log for debugging
+        log_to_file(f"Final workflow has {len(updated_workflow)} nodes")
+        
+        return updated_workflow
+    except Exception as e:
+        log_to_file(f"Error updating workflow with text inputs: {str(e)}")
+        log_to_file(traceback.format_exc())
+        return workflow
+
+# Function to show text input dialog - FIX FOR CUSTOM INPUT FIELDS
+def show_text_input_dialog(text_nodes, workflow_name):
+    """
+    Display a dialog for the user to input text for each text node.
+    
+    Args:
+        text_nodes (list): List of text input nodes
+        workflow_name (str): Name of the workflow
+    
+    Returns:
+        dict: Dictionary of node_id -> new text value, or None if cancelled
+    """
+    if not text_nodes:
+        return {}
+    
+    try:
+        load_pyflame_ui()
+        from comfyui_pyflame_ui import (QtWidgets, Color, LineColor, PyFlameButton, PyFlameDialogWindow,
+                                        PyFlameEntry, PyFlameLabel)
+
+        # Create a dialog window using our embedded components with larger sizes
+        window = PyFlameDialogWindow(
+            title=f"Text Inputs for {workflow_name}",
+            width=600,  # Increased width
+            height=100 + (len(text_nodes) * 70),  # Increased height per row
+            line_color=LineColor.BLUE
+        )
+        
+        # Add a title/info label
+        info_label = PyFlameLabel(
+            text="Enter text for the prompts in this workflow:"
+        )
+        window.grid_layout.addWidget(info_label, 0, 0, 1, 2)
+        
+        # Set column stretch to give the entry field more space (20% for label, 80% for text field)
+        window.grid_layout.setColumnStretch(0, 2)  # Label column gets 20% weight
+        window.grid_layout.setColumnStretch(1, 8)  # Text field column gets 80% weight
+        
+        # Create text entry fields for each text node
+        text_entries = {}
+        row = 1  # Start at row 1 after the info label
+        
+        for i, node in enumerate(text_nodes):
+            # Create label for the text node
+            label_text = node["title"]
             
             # Handle different node types with more friendly labels
             if "prompt" in label_text.lower():
@@ -2375,63 +2271,8 @@ def show_text_input_dialog_DUPLICATE_REMOVED(text_nodes, workflow_name):
         log_to_file(traceback.format_exc())
         return None
 
-# REMOVED DUPLICATE FUNCTION - See line 2690 for the actual implementation
-# Function to update workflow with new text inputs
-def update_workflow_with_text_inputs_DUPLICATE_REMOVED(workflow, text_values):
-    """
-    Update the workflow with new text input values.
-    Now uses deep copy and handles custom input fields.
-    
-    Args:
-        workflow (dict): Workflow JSON data
-        text_values (dict): Dictionary of node_id -> new text value
-    
-    Returns:
-        dict: Updated workflow
-    """
-    if not text_values:
-        return workflow
-    
-    try:
-        # Create a DEEP copy of the workflow to modify (important for nested dictionaries)
-        updated_workflow = copy.deepcopy(workflow)
-        
-        # Update each text node with the new value
-        for node_id, new_text in text_values.items():
-            if node_id in updated_workflow and "inputs" in updated_workflow[node_id]:
-                # If this is a specific input field (for custom nodes)
-                if "." in node_id:
-                    main_id, input_field = node_id.split(".", 1)
-                    if main_id in updated_workflow and "inputs" in updated_workflow[main_id]:
-                        if input_field in updated_workflow[main_id]["inputs"]:
-                            updated_workflow[main_id]["inputs"][input_field] = new_text
-                            log_to_file(f"Updated custom input: {main_id}.{input_field} with text: {new_text[:30]}...")
-                # Standard text node
-                else:
-                    updated_workflow[node_id]["inputs"]["text"] = new_text
-                    log_to_file(f"Updated node {node_id} with text: {new_text[:30]}...")
-        
-        # Dump the entire workflow to log for debugging
-        log_to_file(f"Final workflow has {len(updated_workflow)} nodes")
-        
-        return updated_workflow
-    except Exception as e:
-        log_to_file(f"Error updating workflow with text inputs: {str(e)}")
-        log_to_file(traceback.format_exc())
-        return workflow
-
-# Function to get workflow name from path
-def get_workflow_name(workflow_path):
-    """Extract the workflow name from its path"""
-    try:
-        return os.path.splitext(os.path.basename(workflow_path))[0]
-    except:
-        return "Workflow"
-
-# REMOVED DUPLICATE FUNCTION - See line 2851 for the actual implementation
-# This duplicate was causing conflicts in Flame 2026
-# Create a new version of process_with_comfyui_api that accepts a workflow object
-def process_with_comfyui_api_with_workflow_DUPLICATE_REMOVED(image_path, output_dir, workflow):
+# Modified function to process with ComfyUI API - FIX JOB ID ERROR
+def process_with_comfyui_api_with_workflow(image_path, output_dir, workflow):
     """Process an image sequence with ComfyUI API using a provided workflow"""
     try:
         log_to_file(f"Processing sequence with ComfyUI. First image: {image_path}")
@@ -2519,10 +2360,13 @@ def process_with_comfyui_api_with_workflow_DUPLICATE_REMOVED(image_path, output_
             show_flame_message("Workflow does not have the required VHS_LoadImagesPath node")
             return None
             
+        # Submit under the session client_id so the shared WebSocket receives this prompt's events
+        monitor = get_session_monitor()
+
         # Create API request
         api_request = {
             "prompt": workflow,
-            "client_id": f"flame_comfyui_{job_id}"
+            "client_id": monitor.client_id if monitor else SESSION_CLIENT_ID
         }
 
         # Continue with the existing code to send the request to ComfyUI
@@ -2555,10 +2399,15 @@ def process_with_comfyui_api_with_workflow_DUPLICATE_REMOVED(image_path, output_
         
         # ...existing code...
         
+        tracer = current_tracer()
+
         # Execute the curl command
         try:
             log_to_file(f"Running command: curl -X POST {COMFYUI_URL}/prompt ...")
-            result = subprocess.run(curl_cmd, capture_output=True, text=True)
+            # Before the POST: the prompt can start (and report it) before the response arrives
+            submitted_at = time.time()
+            with trace_span("submit"):
+                result = subprocess.run(curl_cmd, capture_output=True, text=True)
             
             log_to_file(f"Command stdout: {result.stdout}")
             if result.stderr:
@@ -2567,6 +2416,7 @@ def process_with_comfyui_api_with_workflow_DUPLICATE_REMOVED(image_path, output_
             # ...rest of the existing function...
             if result.returncode != 0:
                 log_to_file(f"Error submitting workflow: Return code {result.returncode}")
+                record_metric('inc', 'flame_comfyui_failures_total', stage="submit")
                 if result.stderr:
                     log_to_file(f"Error details: {result.stderr}")
                 return None
@@ -2585,81 +2435,147 @@ def process_with_comfyui_api_with_workflow_DUPLICATE_REMOVED(image_path, output_
                     return None
                     
                 log_to_file(f"Prompt ID: {prompt_id}")
+
+                # Wake the history poll as soon as the WebSocket reports the prompt finished
+                prompt_finished = threading.Event()
+                prompt_errors = []
+                execution_started = []
+                first_output = []
+                save_nodes = {str(node_id) for node_id, node in workflow.items()
+                              if node.get("class_type") in SAVE_IMAGE_NODE_TYPES}
+                workflow_label = (tracer.attributes.get('workflow') if tracer else None) or "unknown"
+                if monitor:
+                    def on_prompt_error(pid, data):
+                        prompt_errors.append(data)
+                        prompt_finished.set()
+
+                    def on_node_executed(pid, node_id, executed_at):
+                        if node_id in save_nodes:
+                            first_output.append(executed_at)
+
+                    if monitor.profiler:
+                        monitor.profiler.track(prompt_id, workflow, tracer.attributes.get('workflow') if tracer else None)
+                    monitor.subscribe_prompt(prompt_id, {
+                        'on_node_executed': on_node_executed,
+                        'on_prompt_start': lambda pid, started_at: execution_started.append(started_at),
+                        'on_complete': lambda pid: prompt_finished.set(),
+                        'on_prompt_error': on_prompt_error
+                    }, workflow=workflow)
+
+                # The shared monitor outlives the job: always drop its subscription
+                try:
+                    waits_recorded = []
+
+                    def record_wait_spans():
+                        """Split the time since submission into queue wait and execution"""
+                        if waits_recorded:
+                            return
+                        waits_recorded.append(True)
+                        finished_at = time.time()
+                        # Without the socket, outputs only show up in /history once the prompt is done
+                        first_output_at = min(first_output) if first_output else finished_at
+                        record_metric('observe', 'flame_comfyui_first_output_latency_seconds',
+                                      first_output_at - submitted_at, workflow=workflow_label)
+                        if not tracer:
+                            return
+                        if execution_started:
+                            tracer.add_span("queue_wait", submitted_at, execution_started[0], prompt_id=prompt_id)
+                            tracer.add_span("execute", execution_started[0], finished_at, prompt_id=prompt_id)
+                        else:
+                            # No WebSocket: the server's queue and execution can't be told apart
+                            tracer.add_span("queue_wait_and_execute", submitted_at, finished_at, prompt_id=prompt_id)
                 
-                # Wait for job completion - INCREASED TIMEOUT
-                max_retries = 9000  # 10 minutes (up from 180 seconds)
-                retry_count = 0
+                    # Wait for job completion - INCREASED TIMEOUT
+                    max_retries = 9000  # 10 minutes (up from 180 seconds)
+                    retry_count = 0
                 
-                while retry_count < max_retries:
-                    time.sleep(1)
+                    while retry_count < max_retries:
+                        if prompt_finished.is_set():
+                            time.sleep(1)
+                        else:
+                            prompt_finished.wait(1)
+
+                        if prompt_errors:
+                            log_to_file(f"ComfyUI reported an error for prompt {prompt_id}: {prompt_errors[0]}")
+                            record_metric('inc', 'flame_comfyui_failures_total', stage="execute")
+                            record_wait_spans()
+                            return None
                     
-                    # Only log every 10th check to reduce log verbosity
-                    if retry_count % 10 == 0:
-                        log_to_file(f"Checking status: retry {retry_count+1}/{max_retries}")
+                        # Only log every 10th check to reduce log verbosity
+                        if retry_count % 10 == 0:
+                            log_to_file(f"Checking status: retry {retry_count+1}/{max_retries}")
                     
-                    check_cmd = ['curl', '-s', f'{COMFYUI_URL}/history/{prompt_id}']
-                    result = subprocess.run(check_cmd, capture_output=True, text=True)
+                        check_cmd = ['curl', '-s', f'{COMFYUI_URL}/history/{prompt_id}']
+                        result = subprocess.run(check_cmd, capture_output=True, text=True)
                     
-                    # ...remaining code from original function...
-                    if result.returncode != 0:
-                        log_to_file(f"Error checking status: {result.stderr}")
-                        retry_count += 1
-                        continue
+                        # ...remaining code from original function...
+                        if result.returncode != 0:
+                            log_to_file(f"Error checking status: {result.stderr}")
+                            record_metric('inc', 'flame_comfyui_retries_total', operation="history_poll")
+                            retry_count += 1
+                            continue
 
-                    try:
-                        history = json.loads(result.stdout)
+                        try:
+                            history = json.loads(result.stdout)
                         
-                        if prompt_id in history:
-                            # Check if outputs contain images
-                            outputs = history[prompt_id].get('outputs', {})
+                            if prompt_id in history:
+                                record_wait_spans()
+
+                                # Check if outputs contain images
+                                outputs = history[prompt_id].get('outputs', {})
                             
-                            for node_id, output in outputs.items():
-                                if 'images' in output:
-                                    images = output['images']
+                                with trace_span("collect", prompt_id=prompt_id):
+                                    for node_id, output in outputs.items():
+                                        if 'images' in output:
+                                            images = output['images']
                                     
-                                    if images:
-                                        # Return the first image as our result
-                                        image_data = images[0]
-                                        image_filename = image_data.get('filename')
+                                            if images:
+                                                # Return the first image as our result
+                                                image_data = images[0]
+                                                image_filename = image_data.get('filename')
                                         
-                                        if image_filename:
-                                            output_path = os.path.join(COMFYUI_OUTPUT_DIR, image_filename)
+                                                if image_filename:
+                                                    output_path = os.path.join(COMFYUI_OUTPUT_DIR, image_filename)
                                             
-                                            if os.path.exists(output_path):
-                                                log_to_file(f"Found processed image at: {output_path}")
-                                                return output_path
+                                                    if os.path.exists(output_path):
+                                                        log_to_file(f"Found processed image at: {output_path}")
+                                                        return output_path
                                             
-                                            # Try to download if not found directly
-                                            local_output_path = os.path.join(output_dir, image_filename)
-                                            image_url = f"{COMFYUI_URL}/view?filename={image_filename}&type=output"
-                                            download_cmd = ['curl', '-s', '-o', local_output_path, image_url]
+                                                    # Try to download if not found directly
+                                                    local_output_path = os.path.join(output_dir, image_filename)
+                                                    image_url = f"{COMFYUI_URL}/view?filename={image_filename}&type=output"
+                                                    download_cmd = ['curl', '-s', '-o', local_output_path, image_url]
                                             
-                                            dl_result = subprocess.run(download_cmd, capture_output=True)
+                                                    dl_result = subprocess.run(download_cmd, capture_output=True)
                                             
-                                            if dl_result.returncode == 0 and os.path.exists(local_output_path):
-                                                log_to_file(f"Image saved to: {local_output_path}")
-                                                return local_output_path
+                                                    if dl_result.returncode == 0 and os.path.exists(local_output_path):
+                                                        log_to_file(f"Image saved to: {local_output_path}")
+                                                        return local_output_path
                     
-                    except json.JSONDecodeError:
-                        log_to_file("Invalid JSON in history response")
+                        except json.JSONDecodeError:
+                            log_to_file("Invalid JSON in history response")
                     
-                    retry_count += 1
+                        retry_count += 1
                 
-                # We've timed out, but let's check for output files directly
-                log_to_file("Timed out waiting for ComfyUI, checking for output files directly")
+                    # We've timed out, but let's check for output files directly
+                    log_to_file("Timed out waiting for ComfyUI, checking for output files directly")
+                    record_wait_spans()
                 
-                # Look specifically for PNG files with the pattern from the SaveImage node
-                comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
-                if os.path.exists(comfla_dir):
-                    png_files = [f for f in os.listdir(comfla_dir) if f.endswith('.png') and f.startswith('img_')]
-                    if png_files:
-                        log_to_file(f"Found {len(png_files)} PNG files with alpha in {comfla_dir}")
-                        # Return the directory path
-                        return comfla_dir
+                    # Look specifically for PNG files with the pattern from the SaveImage node
+                    comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
+                    if os.path.exists(comfla_dir):
+                        png_files = [f for f in os.listdir(comfla_dir) if f.endswith('.png') and f.startswith('img_')]
+                        if png_files:
+                            log_to_file(f"Found {len(png_files)} PNG files with alpha in {comfla_dir}")
+                            # Return the directory path
+                            return comfla_dir
                 
-                # No files found
-                log_to_file(f"No output files found in {comfla_dir}")
-                return None
+                    # No files found
+                    log_to_file(f"No output files found in {comfla_dir}")
+                    return None
+                finally:
+                    if monitor:
+                        monitor.unsubscribe_prompt(prompt_id)
                 
             except json.JSONDecodeError as e:
                 log_to_file(f"Error parsing JSON response: {str(e)}")
@@ -2674,484 +2590,784 @@ def process_with_comfyui_api_with_workflow_DUPLICATE_REMOVED(image_path, output_
         log_to_file(f"Error in process_with_comfyui_api_with_workflow: {str(e)}")
         return None
 
-# Function to detect text input nodes in the workflow - IMPROVED VERSION
-def detect_text_input_nodes(workflow):
-    """
-    Scan a workflow for text input nodes and return node information.
-    Now supports multiple node types used for text inputs.
-    
-    Args:
-        workflow (dict): Workflow JSON data
-    
-    Returns:
-        list: List of dictionaries containing node ID and current text value
+#---------------------------------------------
+# [Resume Partially Completed Renders]
+#---------------------------------------------
+# Name of the manifest written next to the ComfyUI outputs of a job
+RESUME_MANIFEST_NAME = ".flame_comfyui_resume.json"
+
+# Nodes that change the number of output frames (frame N of the output is no
+# longer frame N of the input), which makes per-frame resume impossible
+FRAME_COUNT_CHANGING_NODES = ["RIFE VFI", "FILM VFI", "VFI Interpolate"]
+
+# Node types that write image files into the ComfyUI output directory
+SAVE_IMAGE_NODE_TYPES = ["SaveImage", "SaveImageWithAlpha"]
+
+def get_resume_manifest_path():
+    """Return the path of the resume manifest in the comfla output folder"""
+    return os.path.join(COMFYUI_OUTPUT_DIR, "comfla", RESUME_MANIFEST_NAME)
+
+def get_resume_namespace(clip_name, workflow, total_frames):
     """
-    text_nodes = []
-    
+    Build a stable identifier for a clip/workflow/frame-count combination.
+    Outputs on disk are only reused when they were rendered for the same namespace.
+    """
+    digest = hashlib.sha1()
+    digest.update(str(clip_name).encode("utf-8"))
+    digest.update(json.dumps(workflow, sort_keys=True).encode("utf-8"))
+    digest.update(str(total_frames).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+def write_resume_manifest(namespace, clip_name, workflow_name, total_frames, prefixes):
+    """Record which job the files in the comfla output folder belong to"""
+    manifest_path = get_resume_manifest_path()
     try:
-        # List of known node types that accept text inputs
-        text_node_types = [
-            "CLIPTextEncode",           # Standard text encoder
-            "KSampler",                 # Sometimes has prompt input directly
-            "KSamplerAdvanced",         # Advanced sampler with prompt
-            "PromptText",               # Custom text node
-            "Text",                     # Generic text input
-            "Note",                     # Note node (may contain prompts)
-            "ConditioningTextPrompt",   # Another form of text conditioning 
-            "PromptStylizerNode"        # Style adapters
-        ]
-        
-        for node_id, node in workflow.items():
-            class_type = node.get("class_type", "")
-            
-            # Check if this is a known text input node type
-            if class_type in text_node_types:
-                # For standard CLIP text encoder
-                if "inputs" in node and "text" in node.get("inputs", {}):
-                    text = node["inputs"]["text"]
-                    title = node.get("_meta", {}).get("title", class_type)
-                    
-                    text_nodes.append({
-                        "node_id": node_id,
-                        "text": text,
-                        "title": title,
-                        "class_type": class_type
-                    })
-                    log_to_file(f"Found text input node: {node_id} ({class_type}) with title '{title}' and text '{text[:30]}...'")
-            
-            # Also check for custom nodes that might have text inputs
-            elif "inputs" in node:
-                inputs = node["inputs"]
-                # Look for any input field that might contain prompt text
-                for input_name, input_value in inputs.items():
-                    if isinstance(input_value, str) and len(input_value) > 5 and input_name in ["prompt", "text", "positive", "negative"]:
-                        title = node.get("_meta", {}).get("title", class_type)
-                        if not title:
-                            title = f"{class_type} - {input_name}"
-                            
-                        text_nodes.append({
-                            "node_id": node_id,
-                            "input_name": input_name,  # Store the specific input field name
-                            "text": input_value,
-                            "title": title,
-                            "class_type": class_type
-                        })
-                        log_to_file(f"Found custom text input: {node_id}.{input_name} with value '{input_value[:30]}...'")
-        
-        log_to_file(f"Total text input nodes found: {len(text_nodes)}")
-        return text_nodes
+        os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+        manifest = {
+            "namespace": namespace,
+            "clip_name": clip_name,
+            "workflow_name": workflow_name,
+            "total_frames": total_frames,
+            "prefixes": prefixes,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        with open(manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        log_to_file(f"Wrote resume manifest for namespace {namespace}: {manifest_path}")
+        return True
     except Exception as e:
-        log_to_file(f"Error detecting text input nodes: {str(e)}")
-        log_to_file(traceback.format_exc())
-        return []
+        log_to_file(f"Error writing resume manifest: {str(e)}")
+        return False
 
-# Function to update workflow with new text inputs - IMPROVED VERSION
-def update_workflow_with_text_inputs(workflow, text_values):
+def load_resume_manifest():
+    """Load the resume manifest, or None if there is none"""
+    manifest_path = get_resume_manifest_path()
+    if not os.path.exists(manifest_path):
+        return None
+    try:
+        with open(manifest_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        log_to_file(f"Error reading resume manifest: {str(e)}")
+        return None
+
+def delete_resume_manifest():
+    """Forget the job once its outputs are imported (and renamed), so it isn't offered for resume"""
+    manifest_path = get_resume_manifest_path()
+    try:
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+            log_to_file("Removed resume manifest of the imported job")
+    except Exception as e:
+        log_to_file(f"Error removing resume manifest: {str(e)}")
+
+def get_save_prefixes(workflow):
+    """Return the filename_prefix of every image-saving node in the workflow"""
+    prefixes = []
+    for node_id, node in workflow.items():
+        if node.get("class_type") in SAVE_IMAGE_NODE_TYPES:
+            prefix = node.get("inputs", {}).get("filename_prefix")
+            if isinstance(prefix, str) and prefix not in prefixes:
+                prefixes.append(prefix)
+    return prefixes
+
+def workflow_supports_resume(workflow):
     """
-    Update the workflow with new text input values.
-    Now uses deep copy and handles custom input fields.
-    
-    Args:
-        workflow (dict): Workflow JSON data
-        text_values (dict): Dictionary of node_id -> new text value
-    
-    Returns:
-        dict: Updated workflow
+    Check whether output frame N of this workflow maps to input frame N,
+    which is required to resubmit only the missing frame ranges.
     """
-    if not text_values:
-        return workflow
-    
+    loader_count = 0
+    for node_id, node in workflow.items():
+        class_type = node.get("class_type")
+        if class_type in FRAME_COUNT_CHANGING_NODES:
+            log_to_file(f"Resume not supported: node {node_id} ({class_type}) changes the frame count")
+            return False
+        if class_type == "VHS_LoadImagesPath":
+            loader_count += 1
+            inputs = node.get("inputs", {})
+            if inputs.get("skip_first_images", 0) not in (0, None) or inputs.get("select_every_nth", 1) not in (1, None):
+                log_to_file(f"Resume not supported: loader {node_id} already skips or subsamples frames")
+                return False
+    if loader_count != 1:
+        log_to_file(f"Resume not supported: expected one VHS_LoadImagesPath node, found {loader_count}")
+        return False
+    if not get_save_prefixes(workflow):
+        log_to_file("Resume not supported: no SaveImage node found")
+        return False
+    return True
+
+def _is_valid_output_frame(path):
+    """Cheap validity check for a rendered frame when FrameVerifier isn't available: PNG signature and IEND trailer"""
     try:
-        # Create a DEEP copy of the workflow to modify (important for nested dictionaries)
-        updated_workflow = copy.deepcopy(workflow)
-        
-        # Update each text node with the new value
-        for node_id, new_text in text_values.items():
-            if node_id in updated_workflow and "inputs" in updated_workflow[node_id]:
-                # If this is a specific input field (for custom nodes)
-                if "." in node_id:
-                    main_id, input_field = node_id.split(".", 1)
-                    if main_id in updated_workflow and "inputs" in updated_workflow[main_id]:
-                        if input_field in updated_workflow[main_id]["inputs"]:
-                            updated_workflow[main_id]["inputs"][input_field] = new_text
-                            log_to_file(f"Updated custom input: {main_id}.{input_field} with text: {new_text[:30]}...")
-                # Standard text node
-                else:
-                    updated_workflow[node_id]["inputs"]["text"] = new_text
-                    log_to_file(f"Updated node {node_id} with text: {new_text[:30]}...")
-        
-        # Dump the entire workflow to log for debugging
-        log_to_file(f"Final workflow has {len(updated_workflow)} nodes")
-        
-        return updated_workflow
-    except Exception as e:
-        log_to_file(f"Error updating workflow with text inputs: {str(e)}")
-        log_to_file(traceback.format_exc())
-        return workflow
+        size = os.path.getsize(path)
+        if size < 57:  # signature + IHDR + IEND
+            return False
+        with open(path, 'rb') as f:
+            if f.read(8) != b'\x89PNG\r\n\x1a\n':
+                return False
+            f.seek(-12, os.SEEK_END)
+            return f.read(12)[4:8] == b'IEND'
+    except Exception:
+        return False
 
-# Function to show text input dialog - FIX FOR CUSTOM INPUT FIELDS
-def show_text_input_dialog(text_nodes, workflow_name):
+def verify_output_frames(paths):
     """
-    Display a dialog for the user to input text for each text node.
-    
-    Args:
-        text_nodes (list): List of text input nodes
-        workflow_name (str): Name of the workflow
-    
-    Returns:
-        dict: Dictionary of node_id -> new text value, or None if cancelled
+    Invalid frames among paths and why: truncated or corrupt files, or frames at
+    another resolution than the rest of the sequence (see FrameVerifier)
     """
-    if not text_nodes:
-        return {}
-    
+    if FrameVerifier is None:
+        return {path: "not a complete PNG" for path in paths if not _is_valid_output_frame(path)}
+    return FrameVerifier.verify_frames(paths, check_crc=bool(CONFIG.get("verify_output_crc", False)))
+
+def find_invalid_outputs(workflow, total_frames=None):
+    """
+    Invalid SaveImage outputs of the workflow, checked per prefix. With
+    total_frames, frames missing from a sequence are reported too.
+    """
+    invalid = {}
+    for prefix in get_save_prefixes(workflow):
+        directory, base = _split_save_prefix(prefix)
+        if not os.path.exists(directory):
+            continue
+        pattern = re.compile(rf'^{re.escape(base)}_(\d{{5}})_\.png$')
+        numbers = {int(match.group(1)): os.path.join(directory, match.group(0))
+                   for match in map(pattern.match, os.listdir(directory)) if match}
+        invalid.update(verify_output_frames([numbers[number] for number in sorted(numbers)]))
+        for number in range(1, (total_frames or 0) + 1):
+            if number not in numbers:
+                invalid[os.path.join(directory, f"{base}_{number:05d}_.png")] = "missing"
+    return invalid
+
+def _split_save_prefix(prefix):
+    """Split a SaveImage prefix like 'comfla/img' into (directory, basename)"""
+    subfolder, base = os.path.split(prefix)
+    return os.path.join(COMFYUI_OUTPUT_DIR, subfolder), base
+
+def stitch_resumed_outputs(prefix):
+    """
+    Rename the outputs of resumed range submissions ('img_r00950_00001_.png')
+    to the frame numbers they replace ('img_00951_.png').
+    Returns the number of stitched frames.
+    """
+    directory, base = _split_save_prefix(prefix)
+    if not os.path.exists(directory):
+        return 0
+
+    pattern = re.compile(rf'^{re.escape(base)}_r(\d{{5}})_(\d{{5}})_\.png$')
+    stitched = 0
+    for filename in os.listdir(directory):
+        match = pattern.match(filename)
+        if not match:
+            continue
+        frame_number = int(match.group(1)) + int(match.group(2))
+        source = os.path.join(directory, filename)
+        target = os.path.join(directory, f"{base}_{frame_number:05d}_.png")
+        try:
+            os.replace(source, target)
+            stitched += 1
+        except Exception as e:
+            log_to_file(f"Error stitching {filename}: {str(e)}")
+
+    if stitched:
+        log_to_file(f"Stitched {stitched} resumed frames into {base} sequence")
+    return stitched
+
+def scan_completed_frames(prefix, total_frames):
+    """
+    Return the set of 0-based frame indices that already have a valid output
+    for the given SaveImage prefix. Invalid frames (truncated, corrupt or at the
+    wrong resolution) are removed so that they are rendered again.
+    """
+    directory, base = _split_save_prefix(prefix)
+    completed = set()
+    if not os.path.exists(directory):
+        return completed
+
+    pattern = re.compile(rf'^{re.escape(base)}_(\d{{5}})_\.png$')
+    frames = {}
+    for filename in os.listdir(directory):
+        match = pattern.match(filename)
+        if match and 0 <= int(match.group(1)) - 1 < total_frames:
+            frames[int(match.group(1)) - 1] = os.path.join(directory, filename)
+
+    invalid = verify_output_frames([frames[frame_index] for frame_index in sorted(frames)])
+    for frame_index, path in frames.items():
+        if path not in invalid:
+            completed.add(frame_index)
+            continue
+        log_to_file(f"Discarding invalid output frame: {path} ({invalid[path]})")
+        try:
+            os.remove(path)
+        except Exception as e:
+            log_to_file(f"Error removing invalid frame {path}: {str(e)}")
+    return completed
+
+def find_missing_ranges(completed_frames, total_frames):
+    """Collapse the frames missing from completed_frames into (start, count) ranges"""
+    ranges = []
+    start = None
+    for frame_index in range(total_frames):
+        if frame_index not in completed_frames:
+            if start is None:
+                start = frame_index
+        elif start is not None:
+            ranges.append((start, frame_index - start))
+            start = None
+    if start is not None:
+        ranges.append((start, total_frames - start))
+    return ranges
+
+def apply_frame_range(workflow, start, count):
+    """
+    Return a copy of the workflow that only loads frames [start, start + count)
+    and writes them under a range-specific prefix for later stitching.
+    """
+    range_workflow = copy.deepcopy(workflow)
+    for node_id, node in range_workflow.items():
+        class_type = node.get("class_type")
+        inputs = node.setdefault("inputs", {})
+        if class_type == "VHS_LoadImagesPath":
+            inputs["skip_first_images"] = start
+            inputs["image_load_cap"] = count
+            inputs["select_every_nth"] = 1
+        elif class_type in SAVE_IMAGE_NODE_TYPES and isinstance(inputs.get("filename_prefix"), str):
+            inputs["filename_prefix"] = f"{inputs['filename_prefix']}_r{start:05d}"
+    return range_workflow
+
+def get_completed_frames(workflow, total_frames):
+    """Frames that have a valid output for every SaveImage node of the workflow"""
+    completed = None
+    for prefix in get_save_prefixes(workflow):
+        stitch_resumed_outputs(prefix)
+        frames = scan_completed_frames(prefix, total_frames)
+        completed = frames if completed is None else completed & frames
+    return completed or set()
+
+def process_with_resume(image_path, output_dir, workflow, total_frames):
+    """
+    Render only the frames of the job that do not have a valid output yet.
+    Missing frames are submitted as contiguous ranges through the
+    skip_first_images/image_load_cap inputs of VHS_LoadImagesPath and the
+    results are stitched back into the full sequence.
+    """
+    comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
+    completed = get_completed_frames(workflow, total_frames)
+    missing_ranges = find_missing_ranges(completed, total_frames)
+
+    missing_count = sum(count for start, count in missing_ranges)
+    log_to_file(f"Resume: {len(completed)}/{total_frames} frames already rendered, "
+                f"{missing_count} missing in {len(missing_ranges)} range(s): {missing_ranges[:10]}")
+
+    for start, count in missing_ranges:
+        log_to_file(f"Resume: submitting frames {start + 1}-{start + count}")
+        range_workflow = apply_frame_range(workflow, start, count)
+        result = process_with_comfyui_api_with_workflow(image_path, output_dir, range_workflow)
+        if result is None:
+            log_to_file(f"Resume: range starting at frame {start + 1} returned no result")
+        for prefix in get_save_prefixes(workflow):
+            stitch_resumed_outputs(prefix)
+
+    completed = get_completed_frames(workflow, total_frames)
+    still_missing = find_missing_ranges(completed, total_frames)
+    if still_missing:
+        log_to_file(f"Resume: frames still missing after resubmission: {still_missing[:10]}")
+        return None
+
+    log_to_file(f"Resume: all {total_frames} frames rendered")
+    return comfla_dir
+
+#---------------------------------------------
+# [Preview Mode]
+#---------------------------------------------
+# Settings of the last preview, used by "Promote Preview to Full Resolution"
+PREVIEW_STATE_NAME = "last_preview.json"
+
+# Suffix added to the SaveImage prefixes of a preview, so it imports as its own version
+PREVIEW_SUFFIX = "_preview"
+
+# Nodes whose width/height inputs set the processing resolution
+RESOLUTION_NODE_TYPES = ["ImageResizeKJ", "ImageScale", "EmptyLatentImage", "EmptySD3LatentImage"]
+
+def get_preview_state_path():
+    """Return the path of the file holding the last preview's settings"""
+    return os.path.join(TEMP_DIR, PREVIEW_STATE_NAME)
+
+def get_preview_settings():
+    """Resolution fraction and frame step for previews, from the config"""
+    scale = min(max(float(CONFIG.get("preview_scale", 0.5)), 0.05), 1.0)
+    every_nth = max(int(CONFIG.get("preview_every_nth", 1)), 1)
+    return scale, every_nth
+
+def apply_preview_settings(workflow, scale, every_nth):
+    """
+    Return a copy of the workflow that loads every Nth frame, works at `scale`
+    of its fixed resize/latent sizes and saves under PREVIEW_SUFFIX prefixes.
+    """
+    preview_workflow = copy.deepcopy(workflow)
+    for node_id, node in preview_workflow.items():
+        class_type = node.get("class_type")
+        inputs = node.setdefault("inputs", {})
+        if class_type == "VHS_LoadImagesPath":
+            inputs["select_every_nth"] = every_nth
+        elif class_type in RESOLUTION_NODE_TYPES:
+            # Latents and most models want sizes divisible by 8
+            step = max(int(inputs.get("divisible_by", 8) or 8), 8)
+            for key in ("width", "height"):
+                if isinstance(inputs.get(key), (int, float)) and inputs[key] > 0:
+                    inputs[key] = max(step, int(round(inputs[key] * scale / step)) * step)
+        elif class_type in SAVE_IMAGE_NODE_TYPES and isinstance(inputs.get("filename_prefix"), str):
+            inputs["filename_prefix"] = f"{inputs['filename_prefix']}{PREVIEW_SUFFIX}"
+    return preview_workflow
+
+def write_preview_state(clip_name, workflow_name, workflow, frame_range):
+    """Remember the settings of a preview so they can be promoted to a full render"""
+    state_path = get_preview_state_path()
     try:
-        # Create a dialog window using our embedded components with larger sizes
-        window = PyFlameDialogWindow(
-            title=f"Text Inputs for {workflow_name}",
-            width=600,  # Increased width
-            height=100 + (len(text_nodes) * 70),  # Increased height per row
-            line_color=LineColor.BLUE
-        )
-        
-        # Add a title/info label
-        info_label = PyFlameLabel(
-            text="Enter text for the prompts in this workflow:"
-        )
-        window.grid_layout.addWidget(info_label, 0, 0, 1, 2)
-        
-        # Set column stretch to give the entry field more space (20% for label, 80% for text field)
-        window.grid_layout.setColumnStretch(0, 2)  # Label column gets 20% weight
-        window.grid_layout.setColumnStretch(1, 8)  # Text field column gets 80% weight
-        
-        # Create text entry fields for each text node
-        text_entries = {}
-        row = 1  # Start at row 1 after the info label
-        
-        for i, node in enumerate(text_nodes):
-            # Create label for the text node
-            label_text = node["title"]
-            
-            # Handle different node types with more friendly labels
-            if "prompt" in label_text.lower():
-                label_text = f"Prompt {i+1}"
-            elif "negative" in label_text.lower():
-                label_text = f"Negative Prompt {i+1}"
-            elif "input_name" in node:
-                # For custom inputs, show the input field name
-                label_text = f"{node['class_type']} - {node['input_name']}"
-            
-            label = PyFlameLabel(
-                text=label_text,
-                width=140,  # Slightly reduced width for label
-                height=40
-            )
-            
-            # Create text entry that expands with the window
-            # For custom inputs, create a proper node_id+input_field key
-            node_key = f"{node['node_id']}.{node['input_name']}" if "input_name" in node else node["node_id"]
-            
-            text_entry = PyFlameEntry(
-                text=node["text"],
-                height=40,   # Only specify height, not width
-                max_width=True  # Allow it to expand to full width
-            )
-            
-            # Store the entry widget with the proper key
-            text_entries[node_key] = text_entry
-            
-            # Add widgets to layout
-            window.grid_layout.addWidget(label, row, 0)
-            window.grid_layout.addWidget(text_entry, row, 1)
-            row += 1
-        
-        # Add buttons with larger sizes - SWAPPED POSITIONS
-        cancel_button = PyFlameButton(
-            text="Cancel",
-            connect=window.reject,
-            width=150,
-            height=40
-        )
-        
-        confirm_button = PyFlameButton(
-            text="Confirm",
-            connect=window.accept,
-            width=150,
-            height=40,
-            color=Color.BLUE  # Make confirm button blue
-        )
-        
-        # Create a horizontal layout for the buttons
-        button_layout = QtWidgets.QHBoxLayout()
-        button_layout.addWidget(cancel_button)
-        button_layout.addStretch()  # Add space between buttons
-        button_layout.addWidget(confirm_button)
-        
-        # Add the button layout to the main grid
-        window.grid_layout.addLayout(button_layout, row, 0, 1, 2)
-        
-        # Show the dialog
-        result = window.exec_()
-        
-        if result:
-            # Collect text inputs
-            text_values = {}
-            for node_id, entry in text_entries.items():
-                text_value = entry.text()
-                text_values[node_id] = text_value
-                log_to_file(f"Got text input for {node_id}: {text_value[:30]}...")  # Log only first 30 chars
-            return text_values
-        else:
-            return None
-            
+        state = {
+            "clip_name": clip_name,
+            "workflow_name": workflow_name,
+            "workflow": workflow,
+            "frame_range": frame_range,
+            "preview_prefixes": [f"{prefix}{PREVIEW_SUFFIX}" for prefix in get_save_prefixes(workflow)],
+            "created": time.strftime("%Y-%m-%d %H:%M:%S")
+        }
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f, indent=2)
+        os.replace(tmp_path, state_path)
+        log_to_file(f"Saved preview settings for {clip_name} ({workflow_name})")
+        return True
     except Exception as e:
-        log_to_file(f"Error showing text input dialog: {str(e)}")
-        log_to_file(traceback.format_exc())
+        log_to_file(f"Error saving preview settings: {str(e)}")
+        return False
+
+def load_preview_state():
+    """Load the last preview's settings, or None if there is none"""
+    state_path = get_preview_state_path()
+    if not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, 'r') as f:
+            return json.load(f)
+    except Exception as e:
+        log_to_file(f"Error reading preview settings: {str(e)}")
         return None
 
-# Modified function to process with ComfyUI API - FIX JOB ID ERROR
-def process_with_comfyui_api_with_workflow(image_path, output_dir, workflow):
-    """Process an image sequence with ComfyUI API using a provided workflow"""
+def archive_preview_outputs(state):
+    """Move the imported preview frames out of the way of the full render"""
+    comfy_output_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
+    if not os.path.exists(comfy_output_dir):
+        return True
+    names = [os.path.basename(prefix) for prefix in state.get("preview_prefixes", [])]
+    preview_files = [f for f in os.listdir(comfy_output_dir)
+                     if f.endswith('.png') and any(f.startswith(name) for name in names)]
+    if not preview_files:
+        return True
+    return archive_existing_outputs(comfy_output_dir, preview_files)
+
+def preview_with_comfyui(selection):
+    """Run a workflow at preview resolution and import the result as a preview version"""
+    process_with_comfyui(selection, preview=True)
+
+def promote_comfyui_preview(selection):
+    """Render the last preview's workflow, text inputs and frame range at full resolution"""
+    state = load_preview_state()
+    if not state:
+        show_flame_message("No preview to promote.\nRun 'Preview with ComfyUI' first.")
+        return
+    if not selection or str(selection[0].name) != state["clip_name"]:
+        log_to_file(f"Promote: selection does not match preview clip {state['clip_name']}")
+        show_flame_message(f"Select the clip the preview was made from:\n{state['clip_name']}")
+        return
+    log_to_file(f"Promoting preview of {state['clip_name']} ({state['workflow_name']}, {state['created']})")
+    archive_preview_outputs(state)
+    frame_range = tuple(state["frame_range"]) if state.get("frame_range") else None
+    process_with_comfyui(selection, workflow=state["workflow"], workflow_name=state["workflow_name"],
+                         frame_range=frame_range)
+
+#---------------------------------------------
+# [Region of Interest]
+#---------------------------------------------
+# Clip names that mark the matte of a plate/matte selection
+MATTE_NAME_HINTS = ("matte", "alpha", "mask")
+
+def parse_region(text):
+    """(x, y, width, height) from "x, y, width, height", or None"""
     try:
-        log_to_file(f"Processing sequence with ComfyUI. First image: {image_path}")
-        
-        if not is_comfyui_running():
-            log_to_file("ComfyUI server is not running")
-            return None
-        
-        # Generate a unique job ID - THIS WAS MISSING
-        job_id = str(uuid.uuid4())
-        log_to_file(f"Job ID: {job_id}")
-        
-        # Use the provided workflow
-        if not workflow:
-            log_to_file(f"Error: No valid workflow provided")
-            show_flame_message(f"Error: No valid workflow provided")
-            
-            # Let's create a basic workflow as a last resort
-            workflow = {
-                "4": {
-                    "inputs": {
-                        "torchscript_jit": "default",
-                        "image": ["5", 0]
-                    },
-                    "class_type": "InspyrenetRembg",
-                    "_meta": {"title": "Inspyrenet Rembg"}
-                },
-                "5": {
-                    "inputs": {
-                        "directory": "output/flacom/",
-                        "image_load_cap": 0,
-                        "skip_first_images": 0,
-                        "select_every_nth": 1
-                    },
-                    "class_type": "VHS_LoadImagesPath",
-                    "_meta": {"title": "Load Images (Path) 🎥🅥🅗🅢"}
-                },
-                "13": {
-                    "inputs": {
-                        "filename_prefix": "comfla/img",
-                        "images": ["4", 0]
-                    },
-                    "class_type": "SaveImage",
-                    "_meta": {"title": "Save Image"}
-                }
-            }
-            
-            log_to_file("Created inline workflow as last resort")
-                
-        # Ensure directory exists in ComfyUI path
-        if not os.path.exists(COMFYUI_FLACOM_DIR):
-            os.makedirs(COMFYUI_FLACOM_DIR)
-            log_to_file(f"Created directory: {COMFYUI_FLACOM_DIR}")
-        
-        # Check how many frames we have 
-        files = [f for f in os.listdir(COMFYUI_FLACOM_DIR) if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))]
-        log_to_file(f"Processing {len(files)} frames in {COMFYUI_FLACOM_DIR}")
+        values = [int(round(float(v))) for v in re.split(r'[,;x\s]+', str(text).strip()) if v]
+    except ValueError:
+        return None
+    if len(values) != 4 or values[2] <= 0 or values[3] <= 0 or values[0] < 0 or values[1] < 0:
+        return None
+    return tuple(values)
+
+def ask_region(clip):
+    """Ask the artist for a rectangle in plate pixels; None if cancelled or invalid"""
+    width, height = int(clip.width), int(clip.height)
+    fields = [{"node_id": "region", "input_name": "x, y, width, height", "class_type": "Region",
+               "title": "Region", "text": f"0, 0, {width}, {height}"}]
+    values = show_text_input_dialog(fields, "Region of Interest")
+    if not values:
+        return None
+    region = parse_region(values.get("region.x, y, width, height", ""))
+    if not region or region[0] + region[2] > width or region[1] + region[3] > height:
+        show_flame_message(f"Invalid region: {values.get('region.x, y, width, height')}\n"
+                           f"Expected x, y, width, height inside {width}x{height}")
+        return None
+    return region
+
+def split_plate_and_matte(selection):
+    """The plate and, when two clips are selected, the matte (by name, else the second)"""
+    if len(selection) < 2:
+        return selection[0], None
+    first, second = selection[0], selection[1]
+    if any(hint in str(first.name).lower() for hint in MATTE_NAME_HINTS):
+        return second, first
+    return first, second
+
+def get_matte_region(matte, plate, job_dir, frame_range=None):
+    """Bounding box of the matte over the frames that will be processed, or None"""
+    preset = resolve_export_preset(("png", "tiff", "jpeg"))
+    if not preset:
+        return None
+    matte_dir = os.path.join(job_dir, "matte")
+    os.makedirs(matte_dir, exist_ok=True)
+    with trace_span("matte_bbox"):
+        export_clip_ranges(matte, preset, matte_dir, plan_export_ranges(plate, frame_range=frame_range))
+        region = RegionOfInterest.from_matte(RegionOfInterest.list_frames(matte_dir),
+                                             float(CONFIG.get("roi_matte_threshold", 0.01)))
+    log_to_file(f"Matte {matte.name} bounding box: {region}")
+    return region
+
+def get_region(selection, job_dir, frame_range=None):
+    """Padded region to process: from the matte clip when one is selected, else asked for"""
+    plate, matte = split_plate_and_matte(selection)
+    region = get_matte_region(matte, plate, job_dir, frame_range) if matte else ask_region(plate)
+    if not region:
+        return None
+    padded = RegionOfInterest.pad(region, int(CONFIG.get("roi_padding", 32)), int(plate.width), int(plate.height))
+    log_to_file(f"Region {region} padded to {padded} of {plate.width}x{plate.height}")
+    return padded
+
+def crop_region_frames(plate_dir, clip_dir, region):
+    """Write the region of the exported plate frames to ComfyUI's input directory"""
+    try:
+        with trace_span("crop"):
+            cropped = RegionOfInterest.crop_frames(plate_dir, clip_dir, region)
+        log_to_file(f"Cropped {cropped} frames to {region[2]}x{region[3]} at {region[0]},{region[1]}")
+        return cropped
+    except Exception as e:
+        log_to_file(f"Error cropping frames: {str(e)}")
+        log_to_file(traceback.format_exc())
+        return 0
+
+def recomposite_region_outputs(workflow, plate_dir, region):
+    """
+    Turn ComfyUI's region outputs into full frames, in place (see RegionOfInterest.recomposite).
+    Output frame N goes over plate frame N; a sequence without one output per plate frame
+    is left alone and fails the job.
+    """
+    plates = RegionOfInterest.list_frames(plate_dir)
+    recomposited = 0
+    mismatched = []
+    feather = int(CONFIG.get("roi_padding", 32))
+    with trace_span("recomposite"):
+        for prefix in get_save_prefixes(workflow):
+            directory, base = _split_save_prefix(prefix)
+            if not os.path.exists(directory):
+                continue
+            pattern = re.compile(rf'^{re.escape(base)}_(\d{{5}})_\.png$')
+            outputs = sorted(f for f in os.listdir(directory) if pattern.match(f))
+            if len(outputs) != len(plates):
+                log_to_file(f"{base}: {len(outputs)} outputs for {len(plates)} plate frames, "
+                            "not recomposited", "ERROR")
+                mismatched.append(base)
+                continue
+            for filename, plate in zip(outputs, plates):
+                try:
+                    if RegionOfInterest.recomposite(os.path.join(directory, filename), plate, region, feather):
+                        recomposited += 1
+                except Exception as e:
+                    log_to_file(f"Error recompositing {filename}: {str(e)}")
+    log_to_file(f"Recomposited {recomposited} region outputs into full frames")
+    if mismatched:
+        raise RuntimeError(f"{', '.join(mismatched)}: outputs don't match the {len(plates)} plate frames")
+    return recomposited
+
+def process_region_with_comfyui(selection):
+    """Process only a region of the plate (a rectangle, or a selected matte's bounding box)"""
+    process_with_comfyui(selection, region=True)
+
+#---------------------------------------------
+# [Tiled Processing]
+#---------------------------------------------
+def get_server_pool():
+    """ComfyUI servers that share the tiles of a job: comfyui_url, then CONFIG["comfyui_servers"]"""
+    servers = [COMFYUI_URL] + [url for url in CONFIG.get("comfyui_servers", []) if url]
+    return list(dict.fromkeys(url.rstrip('/') for url in servers))
+
+def should_tile(image_path, workflow):
+    """
+    Tile upscale workflows on frames of CONFIG["tile_above_pixels"] or more: they only
+    look at neighbouring pixels, so tiles give the same result as the whole frame
+    """
+    threshold = int(CONFIG.get("tile_above_pixels", 0) or 0)
+    if TiledProcessor is None or threshold <= 0:
+        return False
+    try:
+        from PIL import Image
+        with Image.open(image_path) as image:
+            width, height = image.size
+    except Exception as e:
+        log_to_file(f"Cannot read frame size for tiling: {str(e)}", "DEBUG")
+        return False
+    if width * height < threshold:
+        return False
+    workflow_type = SmartMediaManager.classify_workflow(workflow)
+    if workflow_type != 'upscale':
+        log_to_file(f"{width}x{height} frames not tiled: {workflow_type or 'this'} workflow needs whole frames")
+        return False
+    if not TiledProcessor.can_tile(workflow):
+        log_to_file("Frames not tiled: the workflow needs one image loader and a SaveImage node")
+        return False
+    log_to_file(f"Tiling {width}x{height} frames across {len(get_server_pool())} server(s)")
+    return True
 
-        # Find and update the VHS_LoadImagesPath node in the workflow
-        vhs_node_found = False
-        for node_id, node in workflow.items():
-            if node.get("class_type") == "VHS_LoadImagesPath":
-                # Make sure the directory matches where we exported the frames
-                node["inputs"]["directory"] = "output/flacom"
-                log_to_file(f"Updated VHS_LoadImagesPath node with directory: output/flacom")
-                vhs_node_found = True
-                break
+def process_with_tiles(workflow):
+    """Process the exported frames as tiles across the server pool (see TiledProcessor)"""
+    frames = sorted(os.path.join(COMFYUI_FLACOM_DIR, f) for f in os.listdir(COMFYUI_FLACOM_DIR)
+                    if f.endswith(('.jpg', '.jpeg', '.png', '.tif', '.tiff')))
+    servers = get_server_pool()
+    processor = TiledProcessor(servers, workflow, tile_size=int(CONFIG.get("tile_size", 1024)),
+                               overlap=int(CONFIG.get("tile_overlap", 128)))
+    try:
+        with trace_span("tiles", servers=len(servers), frames=len(frames)):
+            written = processor.process_frames(frames, COMFYUI_OUTPUT_DIR)
+    except Exception as e:
+        log_to_file(f"Error in tiled processing: {str(e)}")
+        log_to_file(traceback.format_exc())
+        return None
 
-        # Look for SaveImage node to determine output location
-        save_node_found = False
-        save_prefix = "comfla/img"  # Default prefix
-        
-        for node_id, node in workflow.items():
-            if node.get("class_type") == "SaveImage":
-                save_node_found = True
-                if "inputs" in node and "filename_prefix" in node["inputs"]:
-                    save_prefix = node["inputs"]["filename_prefix"]
-                    log_to_file(f"Found SaveImage node with prefix: {save_prefix}")
-                break
+    log_to_file(f"Tiled processing: {written}/{len(frames)} frames, {processor.stats['tiles']} tiles "
+                f"({processor.stats['retries']} retried, {processor.stats['failed_tiles']} failed), "
+                f"per server: {processor.stats['tiles_per_server']}")
+    if processor.stats['retries']:
+        record_metric('inc', 'flame_comfyui_retries_total', processor.stats['retries'], operation="tile")
+    if written < len(frames):
+        record_metric('inc', 'flame_comfyui_failures_total', stage="tiles")
+    return os.path.join(COMFYUI_OUTPUT_DIR, "comfla") if written else None
 
-        log_to_file(f"Will look for output images with prefix: {save_prefix}")
-        
-        if not vhs_node_found:
-            log_to_file("ERROR: No VHS_LoadImagesPath node found in workflow!")
-            show_flame_message("Workflow does not have the required VHS_LoadImagesPath node")
-            return None
-            
-        # Create API request
-        api_request = {
-            "prompt": workflow,
-            "client_id": f"flame_comfyui_{job_id}"
-        }
+#---------------------------------------------
+# [Held Frames]
+#---------------------------------------------
+# Node class substrings (lowercase) of workflows whose output frames depend on
+# neighbouring frames, so held frames can't be skipped
+TEMPORAL_NODE_MARKERS = ("animatediff", "ade_", "vfi", "rife", "temporal", "opticalflow", "optical_flow")
 
-        # Continue with the existing code to send the request to ComfyUI
-        # ...existing code from process_with_comfyui_api...
-        
-        # Send request
-        request_data = json.dumps(api_request)
-        
-        # Log a sample of the request for debugging
-        log_to_file(f"API Request sample (first 500 chars): {request_data[:500]}...")
-        
-        # Log if we have any text nodes/inputs in the workflow
-        text_nodes_in_workflow = detect_text_input_nodes(workflow)
-        if text_nodes_in_workflow:
-            log_to_file(f"Workflow contains {len(text_nodes_in_workflow)} text inputs:")
-            for node in text_nodes_in_workflow:
-                node_id = node["node_id"]
-                text = node["text"]
-                log_to_file(f"  Node {node_id}: '{text[:50]}...'")
-        else:
-            log_to_file("WARNING: No text inputs detected in workflow being sent to ComfyUI")
-        
-        curl_cmd = [
-            'curl', '-s', 
-            '-X', 'POST', 
-            f'{COMFYUI_URL}/prompt', 
-            '-H', 'Content-Type: application/json', 
-            '-d', request_data
-        ]
-        
-        # ...existing code...
-        
-        # Execute the curl command
-        try:
-            log_to_file(f"Running command: curl -X POST {COMFYUI_URL}/prompt ...")
-            result = subprocess.run(curl_cmd, capture_output=True, text=True)
-            
-            log_to_file(f"Command stdout: {result.stdout}")
-            if result.stderr:
-                log_to_file(f"Command stderr: {result.stderr}")
-                
-            # ...rest of the existing function...
-            if result.returncode != 0:
-                log_to_file(f"Error submitting workflow: Return code {result.returncode}")
-                if result.stderr:
-                    log_to_file(f"Error details: {result.stderr}")
-                return None
-                
-            if not result.stdout.strip():
-                log_to_file("Empty response from ComfyUI server")
-                return None
-                
-            try:
-                response = json.loads(result.stdout)
-                prompt_id = response.get('prompt_id')
-                
-                if not prompt_id:
-                    log_to_file("No prompt_id in response")
-                    log_to_file(f"Full response: {response}")
-                    return None
-                    
-                log_to_file(f"Prompt ID: {prompt_id}")
-                
-                # Wait for job completion - INCREASED TIMEOUT
-                max_retries = 9000  # 10 minutes (up from 180 seconds)
-                retry_count = 0
-                
-                while retry_count < max_retries:
-                    time.sleep(1)
-                    
-                    # Only log every 10th check to reduce log verbosity
-                    if retry_count % 10 == 0:
-                        log_to_file(f"Checking status: retry {retry_count+1}/{max_retries}")
-                    
-                    check_cmd = ['curl', '-s', f'{COMFYUI_URL}/history/{prompt_id}']
-                    result = subprocess.run(check_cmd, capture_output=True, text=True)
-                    
-                    # ...remaining code from original function...
-                    if result.returncode != 0:
-                        log_to_file(f"Error checking status: {result.stderr}")
-                        retry_count += 1
-                        continue
+def workflow_is_temporal(workflow):
+    """Check whether any node of the workflow works across neighbouring frames"""
+    return any(marker in str(node.get("class_type", "")).lower()
+               for node in workflow.values() for marker in TEMPORAL_NODE_MARKERS)
 
-                    try:
-                        history = json.loads(result.stdout)
-                        
-                        if prompt_id in history:
-                            # Check if outputs contain images
-                            outputs = history[prompt_id].get('outputs', {})
-                            
-                            for node_id, output in outputs.items():
-                                if 'images' in output:
-                                    images = output['images']
-                                    
-                                    if images:
-                                        # Return the first image as our result
-                                        image_data = images[0]
-                                        image_filename = image_data.get('filename')
-                                        
-                                        if image_filename:
-                                            output_path = os.path.join(COMFYUI_OUTPUT_DIR, image_filename)
-                                            
-                                            if os.path.exists(output_path):
-                                                log_to_file(f"Found processed image at: {output_path}")
-                                                return output_path
-                                            
-                                            # Try to download if not found directly
-                                            local_output_path = os.path.join(output_dir, image_filename)
-                                            image_url = f"{COMFYUI_URL}/view?filename={image_filename}&type=output"
-                                            download_cmd = ['curl', '-s', '-o', local_output_path, image_url]
-                                            
-                                            dl_result = subprocess.run(download_cmd, capture_output=True)
-                                            
-                                            if dl_result.returncode == 0 and os.path.exists(local_output_path):
-                                                log_to_file(f"Image saved to: {local_output_path}")
-                                                return local_output_path
-                    
-                    except json.JSONDecodeError:
-                        log_to_file("Invalid JSON in history response")
-                    
-                    retry_count += 1
-                
-                # We've timed out, but let's check for output files directly
-                log_to_file("Timed out waiting for ComfyUI, checking for output files directly")
-                
-                # Look specifically for PNG files with the pattern from the SaveImage node
-                comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
-                if os.path.exists(comfla_dir):
-                    png_files = [f for f in os.listdir(comfla_dir) if f.endswith('.png') and f.startswith('img_')]
-                    if png_files:
-                        log_to_file(f"Found {len(png_files)} PNG files with alpha in {comfla_dir}")
-                        # Return the directory path
-                        return comfla_dir
-                
-                # No files found
-                log_to_file(f"No output files found in {comfla_dir}")
-                return None
-                
-            except json.JSONDecodeError as e:
-                log_to_file(f"Error parsing JSON response: {str(e)}")
-                log_to_file(f"Raw response: {result.stdout}")
-                return None
-            
+def workflow_maps_frames(workflow):
+    """
+    Check that output frame N of the workflow is input frame N: one loader that
+    loads every frame, no node changing the frame count and a SaveImage node.
+    """
+    loader_count = 0
+    for node_id, node in workflow.items():
+        class_type = node.get("class_type")
+        if class_type in FRAME_COUNT_CHANGING_NODES:
+            return False
+        if class_type == "VHS_LoadImagesPath":
+            loader_count += 1
+            inputs = node.get("inputs", {})
+            if (inputs.get("skip_first_images", 0) not in (0, None) or inputs.get("image_load_cap", 0) not in (0, None)
+                    or inputs.get("select_every_nth", 1) not in (1, None)):
+                return False
+    return loader_count == 1 and bool(get_save_prefixes(workflow))
+
+def workflow_is_per_frame(workflow):
+    """Check that output frame N of the workflow only depends on input frame N"""
+    return not workflow_is_temporal(workflow) and workflow_maps_frames(workflow)
+
+def dedup_exported_frames(workflow, job_dir):
+    """
+    Move held frames out of ComfyUI's input directory so each distinct image is
+    rendered once. Returns the frame mapping for expand_held_frames (frame index ->
+    index of the frame it repeats), or None when every frame is rendered.
+    """
+    if not CONFIG.get("dedup_frames", True) or FrameDeduplicator is None or not workflow_is_per_frame(workflow):
+        return None
+    files = sorted(f for f in os.listdir(COMFYUI_FLACOM_DIR) if f.endswith(('.jpg', '.jpeg', '.png', '.tif', '.tiff')))
+    if len(files) < 2:
+        return None
+
+    try:
+        with trace_span("dedup", frames=len(files)):
+            mapping = FrameDeduplicator.find_duplicates([os.path.join(COMFYUI_FLACOM_DIR, f) for f in files],
+                                                        float(CONFIG.get("dedup_perceptual_threshold", 0.0)))
+    except Exception as e:
+        log_to_file(f"Held frame detection skipped: {str(e)}", "WARNING")
+        return None
+    held = [index for index, source in enumerate(mapping) if source != index]
+    if not held:
+        return None
+
+    held_dir = os.path.join(job_dir, "held")
+    moved = []
+    try:
+        os.makedirs(held_dir, exist_ok=True)
+        for index in held:
+            shutil.move(os.path.join(COMFYUI_FLACOM_DIR, files[index]), os.path.join(held_dir, files[index]))
+            moved.append(files[index])
+    except Exception as e:
+        log_to_file(f"Error setting held frames aside, rendering every frame: {str(e)}")
+        for filename in moved:
+            shutil.move(os.path.join(held_dir, filename), os.path.join(COMFYUI_FLACOM_DIR, filename))
+        return None
+
+    log_to_file(f"{len(held)} of {len(files)} frames are held frames: rendering {len(files) - len(held)}")
+    return mapping
+
+def link_or_copy(source, target):
+    """Hard-link source to target, copying when the file system can't link"""
+    if os.path.exists(target):
+        os.remove(target)
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def expand_held_frames(workflow, mapping):
+    """
+    Give the outputs of the distinct frames their frame numbers back and fill the
+    held frames with links to the frame they repeat. Returns the number of
+    sequences expanded.
+    """
+    distinct = [index for index, source in enumerate(mapping) if source == index]
+    expanded = 0
+    for prefix in get_save_prefixes(workflow):
+        directory, base = _split_save_prefix(prefix)
+        if not os.path.exists(directory):
+            continue
+        pattern = re.compile(rf'^{re.escape(base)}_(\d{{5}})_\.png$')
+        outputs = sorted(f for f in os.listdir(directory) if pattern.match(f))
+        if len(outputs) != len(distinct):
+            log_to_file(f"{base}: {len(outputs)} outputs for {len(distinct)} distinct frames, "
+                        "held frames not filled in", "WARNING")
+            continue
+        try:
+            # Through temporary names, so renumbering never overwrites an output
+            for filename in outputs:
+                os.replace(os.path.join(directory, filename), os.path.join(directory, f".{filename}.held"))
+            for filename, index in zip(outputs, distinct):
+                os.replace(os.path.join(directory, f".{filename}.held"),
+                           os.path.join(directory, f"{base}_{index + 1:05d}_.png"))
+            for index, source in enumerate(mapping):
+                if source != index:
+                    link_or_copy(os.path.join(directory, f"{base}_{source + 1:05d}_.png"),
+                                 os.path.join(directory, f"{base}_{index + 1:05d}_.png"))
+            expanded += 1
         except Exception as e:
-            log_to_file(f"Error processing with ComfyUI: {str(e)}")
-            return None
-            
+            log_to_file(f"Error filling in held frames for {base}: {str(e)}")
+    log_to_file(f"Filled in {len(mapping) - len(distinct)} held frames in {expanded} sequence(s)")
+    return expanded
+
+#---------------------------------------------
+# [Chunked Processing]
+#---------------------------------------------
+def detect_scene_cuts(frame_paths):
+    """Indices of the exported frames that start a new shot, or [] when detection is off or fails"""
+    threshold = float(CONFIG.get("scene_cut_threshold", 0.35) or 0)
+    if threshold <= 0 or SceneCutDetector is None or len(frame_paths) < 2:
+        return []
+    try:
+        with trace_span("scene_cuts", frames=len(frame_paths)):
+            cuts = SceneCutDetector.find_cuts(frame_paths, threshold, int(CONFIG.get("scene_cut_min_shot", 8)))
     except Exception as e:
-        log_to_file(f"Error in process_with_comfyui_api_with_workflow: {str(e)}")
+        log_to_file(f"Scene cut detection skipped: {str(e)}", "WARNING")
+        return []
+    log_to_file(f"Found {len(cuts)} scene cut(s) in {len(frame_paths)} frames: {[c + 1 for c in cuts[:20]]}")
+    return cuts
+
+def plan_chunks(total_frames, cuts, chunk_frames, overlap):
+    """
+    Split frames [0, total_frames) into (start, count, lead) chunks of at most
+    chunk_frames frames (0 = no limit). Chunks never straddle a cut. A chunk that
+    continues a shot also loads the `lead` frames before it, up to `overlap`, and
+    their outputs are discarded: they only give the temporal nodes context. A chunk
+    that starts on a cut needs no lead.
+    """
+    edges = [0] + sorted(c for c in set(cuts) if 0 < c < total_frames) + [total_frames]
+    chunk_frames = chunk_frames if chunk_frames > 0 else total_frames
+    chunks = []
+    for shot_start, shot_end in zip(edges, edges[1:]):
+        for start in range(shot_start, shot_end, chunk_frames):
+            chunks.append((start, min(chunk_frames, shot_end - start), min(overlap, start - shot_start)))
+    return chunks
+
+def plan_job_chunks(workflow):
+    """
+    Chunks to render a temporal workflow in, aligned with the cuts in the exported
+    frames, or None when the job goes to ComfyUI as one prompt.
+    """
+    if not workflow_is_temporal(workflow) or not workflow_maps_frames(workflow):
+        return None
+    frame_paths = [os.path.join(COMFYUI_FLACOM_DIR, f) for f in sorted(os.listdir(COMFYUI_FLACOM_DIR))
+                   if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))]
+    chunk_frames = max(int(CONFIG.get("temporal_chunk_frames", 96) or 0), 0)
+    overlap = max(int(CONFIG.get("temporal_chunk_overlap", 8) or 0), 0)
+
+    chunks = plan_chunks(len(frame_paths), detect_scene_cuts(frame_paths), chunk_frames, overlap)
+    if len(chunks) < 2:
+        return None
+    lead_frames = sum(lead for start, count, lead in chunks)
+    log_to_file(f"Rendering {len(frame_paths)} frames in {len(chunks)} chunks with {lead_frames} overlap frames")
+    return chunks
+
+def discard_lead_outputs(prefix, range_start, lead):
+    """Remove the outputs of a chunk's lead frames before it is stitched"""
+    directory, base = _split_save_prefix(prefix)
+    for index in range(1, lead + 1):
+        path = os.path.join(directory, f"{base}_r{range_start:05d}_{index:05d}_.png")
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except Exception as e:
+            log_to_file(f"Error removing lead frame {path}: {str(e)}")
+
+def process_in_chunks(image_path, output_dir, workflow, chunks, total_frames):
+    """
+    Render the job chunk by chunk through the same frame ranges as
+    process_with_resume. Chunks whose frames all have a valid output are
+    skipped, so a chunked job resumes chunk by chunk.
+    """
+    comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
+    completed = get_completed_frames(workflow, total_frames)
+
+    for start, count, lead in chunks:
+        if all(frame in completed for frame in range(start, start + count)):
+            log_to_file(f"Chunk {start + 1}-{start + count} already rendered")
+            continue
+        log_to_file(f"Chunk: submitting frames {start + 1}-{start + count} with {lead} lead frames")
+        chunk_workflow = apply_frame_range(workflow, start - lead, count + lead)
+        with trace_span("chunk", first_frame=start + 1, frames=count, lead=lead):
+            result = process_with_comfyui_api_with_workflow(image_path, output_dir, chunk_workflow)
+        if result is None:
+            log_to_file(f"Chunk starting at frame {start + 1} returned no result")
+        for prefix in get_save_prefixes(workflow):
+            discard_lead_outputs(prefix, start - lead, lead)
+            stitch_resumed_outputs(prefix)
+
+    missing_ranges = find_missing_ranges(get_completed_frames(workflow, total_frames), total_frames)
+    if missing_ranges:
+        log_to_file(f"Chunks: frames still missing: {missing_ranges[:10]}")
         return None
 
+    log_to_file(f"Chunks: all {total_frames} frames rendered")
+    return comfla_dir
+
 # Add a function to detect Flame version
 def get_flame_version():
     """Detect Flame version to adjust processing behavior"""
@@ -3173,43 +3389,65 @@ def get_flame_version():
         return "2023.2"  # Default to older version to be safe
 
 # Updated process_with_comfyui function to avoid threading for Flame 2023.2
-def process_with_comfyui(selection):
-    """Process selected clips with ComfyUI and import results - WITHOUT threading for 2023.2"""
-    log_to_file(f"process_with_comfyui called with {len(selection)} items")
+def process_with_comfyui(selection, preview=False, workflow=None, workflow_name=None, frame_range=None,
+                         region=False):
+    """
+    Process selected clips with ComfyUI and import results - WITHOUT threading for 2023.2
+    With preview=True the frames are scaled down (and subsampled) and the result is
+    imported as a preview version; promote_comfyui_preview passes the previewed
+    workflow and frame range back in for the full-resolution render.
+    With region=True only a region of the plate is processed (see process_region_with_comfyui).
+    """
+    log_to_file(f"process_with_comfyui called with {len(selection)} items{' (preview)' if preview else ''}")
     
     # First check for existing files
-    if not check_existing_outputs():
+    # Previews never reuse existing outputs
+    existing_choice = check_existing_outputs(allow_resume=not preview)
+    if not existing_choice:
         log_to_file("User cancelled due to existing files")
         return
-    
-    # Show workflow selection dialog
-    selected_workflow_path = show_workflow_selection_dialog()
-    if selected_workflow_path is None:
-        log_to_file("Workflow selection cancelled or no workflow selected")
-        show_flame_message("Processing cancelled - no workflow selected")
-        return
-    
-    # Load the selected workflow
-    workflow = load_workflow(selected_workflow_path)
-    if not workflow:
-        log_to_file(f"Failed to load workflow: {selected_workflow_path}")
-        show_flame_message(f"Failed to load workflow: {os.path.basename(selected_workflow_path)}")
-        return
-    
-    # Check for text input nodes and show dialog if needed
-    text_nodes = detect_text_input_nodes(workflow)
-    if text_nodes:
+    resume_requested = existing_choice == "resume"
+    
+    if workflow is None:
+        # Show workflow selection dialog
+        selected_workflow_path = show_workflow_selection_dialog()
+        if selected_workflow_path is None:
+            log_to_file("Workflow selection cancelled or no workflow selected")
+            show_flame_message("Processing cancelled - no workflow selected")
+            return
         workflow_name = get_workflow_name(selected_workflow_path)
-        text_values = show_text_input_dialog(text_nodes, workflow_name)
         
-        if text_values is None:
-            log_to_file("Text input dialog cancelled")
-            show_flame_message("Processing cancelled - text input dialog closed")
+        # Load the selected workflow
+        workflow = load_workflow(selected_workflow_path)
+        if not workflow:
+            log_to_file(f"Failed to load workflow: {selected_workflow_path}")
+            show_flame_message(f"Failed to load workflow: {os.path.basename(selected_workflow_path)}")
             return
         
-        # Update workflow with text inputs
-        workflow = update_workflow_with_text_inputs(workflow, text_values)
+        # Check for text input nodes and show dialog if needed
+        text_nodes = detect_text_input_nodes(workflow)
+        if text_nodes:
+            text_values = show_text_input_dialog(text_nodes, workflow_name)
+            
+            if text_values is None:
+                log_to_file("Text input dialog cancelled")
+                show_flame_message("Processing cancelled - text input dialog closed")
+                return
+            
+            # Update workflow with text inputs
+            workflow = update_workflow_with_text_inputs(workflow, text_values)
+
+    workflow_name = workflow_name or "Workflow"
+
+    # Previews run a reduced copy; the workflow as chosen is kept for promotion
+    chosen_workflow = workflow
+    if preview:
+        preview_scale, preview_every_nth = get_preview_settings()
+        workflow = apply_preview_settings(workflow, preview_scale, preview_every_nth)
+        log_to_file(f"Preview at {preview_scale:.0%} resolution, every {preview_every_nth} frame(s)")
     
+    # finish_trace of a job that has been counted but not handed to its processing yet
+    unfinished_job = None
     try:
         if not selection:
             show_flame_message("No items selected")
@@ -3236,16 +3474,157 @@ def process_with_comfyui(selection):
             log_to_file("ComfyUI server is not running")
             show_flame_message("Error: ComfyUI server is not running at " + COMFYUI_URL)
             return
-            
+
+        roi = None
+        if region:
+            if RegionOfInterest is None:
+                log_to_file(f"Region processing needs comfyui_extensions: {EXTENSIONS_IMPORT_ERROR}", "ERROR")
+                show_flame_message("Region processing is not available\nCheck log")
+                return
+            item = split_plate_and_matte(selection)[0]
+            roi = get_region(selection, job_dir, frame_range)
+            if not roi:
+                log_to_file("No region to process")
+                show_flame_message("Processing cancelled - no region")
+                return
+            
+        # Time every stage of the job (see JobTracer)
+        tracer = None
+        if JobTracer:
+            tracer = JobTracer(job_id, trace_dir=os.path.join(TEMP_DIR, "traces"),
+                               chrome_trace=CONFIG.get("chrome_trace", False),
+                               attributes={'clip': str(item.name), 'workflow': workflow_name, 'preview': preview})
+        trace_state = {"status": "completed", "stage": "processing", "frames": 0, "finished": False}
+        workflow_label = workflow_name
+
+        def finish_trace(status=None):
+            if trace_state["finished"]:
+                return
+            trace_state["finished"] = True
+            if status:
+                trace_state["status"] = status
+            record_metric('inc', 'flame_comfyui_jobs', -1, state="processing")
+            record_metric('inc', 'flame_comfyui_jobs_finished_total', workflow=workflow_label, status=trace_state["status"])
+            if trace_state["status"] != "completed":
+                record_metric('inc', 'flame_comfyui_failures_total', stage=trace_state["stage"])
+            if not tracer:
+                return
+            summary = tracer.finish(trace_state["status"])
+            log_to_file(tracer.format_summary(summary))
+            if trace_state["status"] == "completed" and trace_state["frames"]:
+                stages = summary["stages"]
+                render_time = sum(stages[name]["total"] for name in ("execute", "queue_wait_and_execute") if name in stages)
+                record_metric('inc', 'flame_comfyui_frames_total', trace_state["frames"], workflow=workflow_label)
+                if render_time > 0:
+                    record_metric('set', 'flame_comfyui_frames_per_second', trace_state["frames"] / render_time,
+                                  workflow=workflow_label)
+
+        # From here on the outer except finishes the job if it fails before processing starts
+        record_metric('inc', 'flame_comfyui_jobs', state="processing")
+        unfinished_job = finish_trace
+
         # Export frames from clip - now returns the path to the first image
-        export_successful, image_path = export_frame(item, job_dir)
+        with use_tracer(tracer), trace_span("export"):
+            export_successful, image_path = export_frame(item, job_dir, workflow, frame_range=frame_range, region=roi,
+                                                         scale=preview_scale if preview else None)
         
         if not export_successful or not image_path:
             log_to_file("Failed to export frames from clip")
             show_flame_message("Failed to export frames from clip")
+            trace_state["status"] = "failed"
+            trace_state["stage"] = "export"
+            finish_trace()
             return
         
         log_to_file(f"Image exported to: {image_path}")
+
+        if preview:
+            ranges = plan_export_ranges(item, frame_range=frame_range)
+            write_preview_state(str(item.name), workflow_name, chosen_workflow,
+                                [ranges[0][0], ranges[-1][1]] if ranges else None)
+
+        # Very large frames of per-pixel workflows are split across the server pool
+        tiled = should_tile(image_path, workflow)
+
+        # Held frames are rendered once and filled in afterwards (see dedup_exported_frames)
+        frame_map = dedup_exported_frames(workflow, job_dir)
+
+        # Temporal workflows are rendered shot by shot (see plan_job_chunks)
+        chunks = plan_job_chunks(workflow)
+
+        # Identify the job so that a later run can resume from the first missing frame
+        total_frames = len([f for f in os.listdir(COMFYUI_FLACOM_DIR) if f.endswith(('.jpg', '.jpeg', '.dpx', '.exr', '.png', '.tif', '.tiff'))])
+        # Preview and region frames must never be reused by a full-resolution render
+        resume_supported = (not preview and not roi and not tiled and not frame_map
+                            and workflow_supports_resume(workflow))
+        namespace = get_resume_namespace(item.name, workflow, total_frames)
+        resume_job = False
+        trace_state["frames"] = total_frames
+
+        if resume_requested:
+            manifest = load_resume_manifest()
+            if resume_supported and manifest and manifest.get("namespace") == namespace:
+                resume_job = True
+                log_to_file(f"Resuming job {namespace} ({total_frames} frames)")
+            else:
+                log_to_file(f"Cannot resume: existing outputs do not belong to job {namespace}")
+                show_flame_message("Existing outputs belong to a different clip or workflow.\nThey will be archived and all frames rendered.")
+                comfy_output_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
+                archive_existing_outputs(comfy_output_dir, [f for f in os.listdir(comfy_output_dir) if f.endswith('.png')])
+
+        if resume_supported:
+            write_resume_manifest(namespace, str(item.name), workflow_name,
+                                  total_frames, get_save_prefixes(workflow))
+
+        def run_processing():
+            """Render the job (shot by shot for temporal workflows), or only its missing frames when resuming"""
+            with log_context(job=job_id[:8]), use_tracer(tracer):
+                if chunks:
+                    output_path = process_in_chunks(image_path, job_dir, workflow, chunks, total_frames)
+                elif resume_job:
+                    return process_with_resume(image_path, job_dir, workflow, total_frames)
+                elif tiled:
+                    output_path = process_with_tiles(workflow)
+                else:
+                    output_path = process_with_comfyui_api_with_workflow(image_path, job_dir, workflow)
+                if frame_map and output_path:
+                    expand_held_frames(workflow, frame_map)
+                if roi and output_path:
+                    recomposite_region_outputs(workflow, os.path.join(job_dir, "plate"), roi)
+                return output_path
+
+        def render_is_complete():
+            """Refuse to import partial or corrupt renders; resumable ones can be resumed instead"""
+            if not resume_supported:
+                # Frame count is only known when output frame N is input frame N
+                expected_frames = len(frame_map) if frame_map else total_frames
+                invalid = find_invalid_outputs(workflow, expected_frames if workflow_maps_frames(workflow) else None)
+                if not invalid:
+                    return True
+                trace_state["status"] = "incomplete"
+                trace_state["stage"] = "render"
+                log_to_file(f"Render has {len(invalid)} invalid frames: "
+                            + "; ".join(f"{os.path.basename(path)}: {reason}" for path, reason in sorted(invalid.items())[:10]))
+                show_flame_message(f"{len(invalid)} rendered frames are missing, corrupt or at the wrong resolution.\n"
+                                   "Process the clip again.")
+                return False
+            missing_ranges = find_missing_ranges(get_completed_frames(workflow, total_frames), total_frames)
+            if not missing_ranges:
+                return True
+            missing_count = sum(count for start, count in missing_ranges)
+            trace_state["status"] = "incomplete"
+            trace_state["stage"] = "render"
+            log_to_file(f"Render incomplete: {missing_count}/{total_frames} frames missing: {missing_ranges[:10]}")
+            show_flame_message(f"{missing_count} of {total_frames} frames are missing or invalid.\n"
+                               "Run 'Process with ComfyUI' again and choose 'Resume Missing Frames'.")
+            return False
+
+        if preview:
+            imported_message = ("Preview imported.\nUse 'Promote ComfyUI Preview to Full Resolution' "
+                                "to render it at full resolution.")
+        else:
+            imported_message = "Successfully imported PNG sequence!"
+
         show_flame_message("Starting ComfyUI processing... Please wait and don't close Flame.")
         
         # Get Flame version to decide on threading approach
@@ -3259,7 +3638,9 @@ def process_with_comfyui(selection):
             try:
                 # Process with ComfyUI using the workflow
                 log_to_file("Starting synchronous ComfyUI processing")
-                output_path = process_with_comfyui_api_with_workflow(image_path, job_dir, workflow)
+                output_path = run_processing()
+                if not render_is_complete():
+                    return
                 
                 # After processing with ComfyUI:
                 comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
@@ -3271,9 +3652,10 @@ def process_with_comfyui(selection):
                         log_to_file(f"Found {len(png_files)} PNG files in {comfla_dir}")
                         try:
                             # Import results directly
-                            import_result = import_png_sequence(selection)
+                            with use_tracer(tracer), trace_span("import"):
+                                import_result = import_png_sequence(selection)
                             if import_result:
-                                show_flame_message("Successfully imported PNG sequence!")
+                                show_flame_message(imported_message)
                             else:
                                 show_flame_message("Failed to import PNG sequence.")
                         except Exception as e:
@@ -3290,16 +3672,22 @@ def process_with_comfyui(selection):
                 log_to_file(f"Error in synchronous processing: {str(e)}")
                 log_to_file(traceback.format_exc())
                 show_flame_message(f"Error during processing: {str(e)}")
+                trace_state["status"] = "failed"
+            finally:
+                finish_trace()
         else:
             # For newer Flame versions, use background threading as before
             log_to_file(f"Using background threading for Flame {flame_version}")
             
             # Create a callback function for the background process
             def background_process():
+                import_scheduled = False
                 try:
                     # Process with ComfyUI using the workflow
                     # Pass the loaded workflow directly instead of the path
-                    output_path = process_with_comfyui_api_with_workflow(image_path, job_dir, workflow)
+                    output_path = run_processing()
+                    if not render_is_complete():
+                        return
 
                     # After processing with ComfyUI:
                     comfla_dir = os.path.join(COMFYUI_OUTPUT_DIR, "comfla")
@@ -3313,14 +3701,19 @@ def process_with_comfyui(selection):
                                 # Create a callback for importing the results
                                 def import_results():
                                     try:
-                                        import_result = import_png_sequence(selection)
+                                        with log_context(job=job_id[:8]), use_tracer(tracer), trace_span("import"):
+                                            import_result = import_png_sequence(selection)
                                         if import_result:
-                                            show_flame_message("Successfully imported PNG sequence!")
+                                            show_flame_message(imported_message)
                                         else:
                                             show_flame_message("Failed to import PNG sequence.")
                                     except Exception as e:
                                         log_to_file(f"Error in import callback: {str(e)}")
                                         show_flame_message(f"Error during import: {str(e)}")
+                                        trace_state["status"] = "failed"
+                                        trace_state["stage"] = "import"
+                                    finally:
+                                        finish_trace()
                                 
                                 # Use PyCallback to run import on main thread
                                 if hasattr(flame, 'PyCallback'):
@@ -3328,6 +3721,7 @@ def process_with_comfyui(selection):
                                 else:
                                     # Fallback to direct call if PyCallback not available
                                     import_results()
+                                import_scheduled = True
                                 
                             except Exception as e:
                                 log_to_file(f"Error scheduling import: {str(e)}")
@@ -3343,11 +3737,18 @@ def process_with_comfyui(selection):
                     log_to_file(f"Error in background process: {str(e)}")
                     log_to_file(traceback.format_exc())
                     show_flame_message(f"Error during processing: {str(e)}")
+                    trace_state["status"] = "failed"
+                finally:
+                    # Otherwise the import callback closes the trace
+                    if not import_scheduled:
+                        finish_trace()
             
             # Create and start background thread
             background_thread = threading.Thread(target=background_process)
             background_thread.daemon = True  # Make thread daemon so it doesn't block program exit
             background_thread.start()
+            # The thread finishes the job now
+            unfinished_job = None
             
             show_flame_message("Processing started in background.\nYou can continue working while ComfyUI processes your frames.")
         
@@ -3355,5 +3756,7 @@ def process_with_comfyui(selection):
         log_to_file(f"Error in process_with_comfyui: {str(e)}")
         log_to_file(traceback.format_exc())
         show_flame_message(f"Error: {str(e)}")
+        if unfinished_job:
+            unfinished_job("failed")
 
 # ...existing code...
\ No newline at end of file
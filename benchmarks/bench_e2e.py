@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+End-to-end benchmark against mock ComfyUI servers
+
+Runs N frames x M jobs x K servers through:
+  client - RobustComfyUIClient submit + /history polling, jobs spread over the servers
+  queue  - ComfyUIQueueManager in parallel mode driving the same submit/poll
+  hook   - network_comfyui.process_with_comfyui_api_with_workflow (first server only)
+
+Usage:
+    python bench_e2e.py --frames 100 --jobs 8 --servers 2 --node-latency InspyrenetRembg=0.002
+    python bench_e2e.py --scenarios client,queue --json results.json
+"""
+
+import os
+import sys
+import copy
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(BENCH_DIR), "ComfyUI_Flame_2023-2025.2.x")
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, PACKAGE_DIR)
+
+from mock_comfyui_server import MockComfyUI, make_png, parse_latency
+
+DEFAULT_WORKFLOW = os.path.join(PACKAGE_DIR, "workflows", "flacom_rembg_comfla_api_workflow.json")
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+def summarize(name: str, latencies: List[float], failures: int, wall: float, frames: int, servers: int) -> Dict:
+    jobs = len(latencies)
+    return {
+        'scenario': name,
+        'jobs': jobs,
+        'failures': failures,
+        'servers': servers,
+        'frames_per_job': frames,
+        'wall_s': wall,
+        'p50_s': percentile(latencies, 0.5),
+        'p95_s': percentile(latencies, 0.95),
+        'max_s': max(latencies) if latencies else 0.0,
+        'jobs_per_s': jobs / wall if wall else 0.0,
+        'frames_per_s': jobs * frames / wall if wall else 0.0
+    }
+
+def prepare_workflow(path: str) -> Dict:
+    with open(path, 'r') as f:
+        workflow = json.load(f)
+    for node in workflow.values():
+        if node.get('class_type') == 'VHS_LoadImagesPath':
+            node['inputs']['directory'] = 'output/flacom'
+    return workflow
+
+def write_input_frames(root: str, frames: int) -> str:
+    directory = os.path.join(root, "output", "flacom")
+    os.makedirs(directory, exist_ok=True)
+    png = make_png(64, 64, alpha=False)
+    for index in range(1, frames + 1):
+        with open(os.path.join(directory, f"frame.{index:05d}.png"), 'wb') as f:
+            f.write(png)
+    return directory
+
+# =============================================================================
+# SCENARIOS
+# =============================================================================
+
+def submit_and_wait(client, workflow: Dict, client_id: str, poll_interval: float, timeout: float = 600.0) -> bool:
+    """Submit a prompt through RobustComfyUIClient and poll /history until it finishes"""
+    response = client.call_api_with_retry('/prompt', {'prompt': workflow, 'client_id': client_id})
+    if not response or 'prompt_id' not in response:
+        return False
+    prompt_id = response['prompt_id']
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        history = client.call_api_with_retry(f'/history/{prompt_id}', method='GET') or {}
+        entry = history.get(prompt_id)
+        if entry:
+            return entry.get('status', {}).get('status_str') == 'success'
+        time.sleep(poll_interval)
+    return False
+
+def run_client(servers: List[MockComfyUI], workflow: Dict, jobs: int, frames: int, poll_interval: float) -> Dict:
+    from comfyui_extensions import RobustComfyUIClient
+
+    clients = [RobustComfyUIClient(server.url, max_retries=3, retry_delay=0.05) for server in servers]
+    latencies, failures = [], []
+
+    def run_job(index: int):
+        started = time.time()
+        ok = submit_and_wait(clients[index % len(clients)], copy.deepcopy(workflow), f"bench_{index}", poll_interval)
+        (latencies if ok else failures).append(time.time() - started)
+
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=len(servers)) as pool:
+        list(pool.map(run_job, range(jobs)))
+    return summarize('client', latencies, len(failures), time.time() - started, frames, len(servers))
+
+def run_queue(servers: List[MockComfyUI], workflow: Dict, jobs: int, frames: int, poll_interval: float) -> Dict:
+    from comfyui_extensions import ComfyUIQueueManager, QueueMode, RobustComfyUIClient
+
+    clients = [RobustComfyUIClient(server.url, max_retries=3, retry_delay=0.05) for server in servers]
+    manager = ComfyUIQueueManager(max_parallel_jobs=len(servers), mode=QueueMode.PARALLEL, history_file=None)
+    done = threading.Event()
+    manager.register_callback('on_queue_complete', lambda: done.set())
+    latencies = {}
+
+    def process(job, progress_callback):
+        started = time.time()
+        index = job.parameters.get('index', 0)
+        ok = submit_and_wait(clients[index % len(clients)], copy.deepcopy(workflow), job.job_id, poll_interval)
+        progress_callback(100.0)
+        latencies[job.job_id] = time.time() - started
+        return f"mock://{job.job_id}" if ok else None
+
+    for index in range(jobs):
+        manager.add_job(None, DEFAULT_WORKFLOW, {'index': index})
+
+    started = time.time()
+    manager.process_queue(process)
+    done.wait(timeout=3600)
+    wall = time.time() - started
+    manager.events.flush()
+    completed = [latencies[job.job_id] for job in manager.completed_jobs]
+    return summarize('queue', completed, len(manager.failed_jobs), wall, frames, len(servers))
+
+def run_hook(servers: List[MockComfyUI], workflow: Dict, jobs: int, frames: int, work_dir: str) -> Dict:
+    server = servers[0]
+    config_path = os.path.join(work_dir, "hook_config.json")
+    with open(config_path, 'w') as f:
+        json.dump({
+            "comfyui_url": server.url,
+            "input_dir": os.path.join(server.root, "output", "flacom"),
+            "output_dir": server.output_dir,
+            "workflows_dir": os.path.dirname(DEFAULT_WORKFLOW),
+            "temp_dir": os.path.join(work_dir, "hook_temp"),
+            "metrics_port": 0
+        }, f)
+    os.environ["FLAME_COMFYUI_CONFIG"] = config_path
+
+    try:
+        import network_comfyui as hook
+        hook.initialize()
+    except Exception as e:
+        return {'scenario': 'hook', 'skipped': f"cannot import network_comfyui: {e}"}
+
+    input_dir = os.path.join(server.root, "output", "flacom")
+    first_image = os.path.join(input_dir, sorted(os.listdir(input_dir))[0])
+    latencies, failures = [], 0
+    started = time.time()
+    for index in range(jobs):
+        job_dir = os.path.join(work_dir, "hook_jobs", str(index))
+        os.makedirs(job_dir, exist_ok=True)
+        job_started = time.time()
+        result = hook.process_with_comfyui_api_with_workflow(first_image, job_dir, copy.deepcopy(workflow))
+        if result:
+            latencies.append(time.time() - job_started)
+        else:
+            failures += 1
+    return summarize('hook', latencies, failures, time.time() - started, frames, 1)
+
+# =============================================================================
+# MAIN
+# =============================================================================
+
+def print_table(results: List[Dict]):
+    columns = ('scenario', 'jobs', 'failures', 'servers', 'frames_per_job', 'wall_s', 'p50_s', 'p95_s',
+               'max_s', 'jobs_per_s', 'frames_per_s')
+    print("  ".join(f"{c:>14}" for c in columns))
+    for result in results:
+        if 'skipped' in result:
+            print(f"{result['scenario']:>14}  skipped: {result['skipped']}")
+            continue
+        print("  ".join(f"{result[c]:>14.3f}" if isinstance(result[c], float) else f"{result[c]:>14}" for c in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end benchmark against mock ComfyUI servers")
+    parser.add_argument('--frames', type=int, default=50, help='Frames per job (N)')
+    parser.add_argument('--jobs', type=int, default=4, help='Jobs per scenario (M)')
+    parser.add_argument('--servers', type=int, default=1, help='Mock servers (K)')
+    parser.add_argument('--workflow', default=DEFAULT_WORKFLOW)
+    parser.add_argument('--scenarios', default='client,queue,hook')
+    parser.add_argument('--node-latency', action='append', metavar='CLASS=SECONDS')
+    parser.add_argument('--default-latency', type=float, default=0.0005)
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--http-error-rate', type=float, default=0.0)
+    parser.add_argument('--poll-interval', type=float, default=0.05)
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory')
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="comfyui_bench_")
+    servers = []
+    try:
+        for index in range(args.servers):
+            root = os.path.join(work_dir, f"server{index}")
+            server = MockComfyUI(port=0, root=root, node_latency=parse_latency(args.node_latency),
+                                 default_latency=args.default_latency, failure_rate=args.failure_rate,
+                                 http_error_rate=args.http_error_rate, seed=index).start()
+            write_input_frames(root, args.frames)
+            servers.append(server)
+
+        workflow = prepare_workflow(args.workflow)
+        import comfyui_extensions
+        results = []
+        for scenario in [s.strip() for s in args.scenarios.split(',') if s.strip()]:
+            if scenario in ('client', 'queue') and comfyui_extensions.optional_import("requests") is None:
+                # RobustComfyUIClient needs requests
+                results.append({'scenario': scenario, 'skipped': "requests is not installed"})
+            elif scenario == 'client':
+                results.append(run_client(servers, workflow, args.jobs, args.frames, args.poll_interval))
+            elif scenario == 'queue':
+                results.append(run_queue(servers, workflow, args.jobs, args.frames, args.poll_interval))
+            elif scenario == 'hook':
+                results.append(run_hook(servers, workflow, args.jobs, args.frames, work_dir))
+            else:
+                print(f"Unknown scenario: {scenario}")
+
+        print_table(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    finally:
+        for server in servers:
+            server.stop()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Transport format benchmark for frames sent from Flame to ComfyUI
+
+Measures, per resolution, the encode + transfer + decode cost of one frame as
+JPEG, PNG and uncompressed TIFF through a directory (SmartMediaManager.
+benchmark_formats), then shows which format the hook picks for each workflow
+class. Use --transfer-mbps to see the choice for a slower link (e.g. an NFS
+share) without having one.
+
+Usage:
+    python bench_formats.py --dir ~/ComfyUI/output/flacom
+    python bench_formats.py --resolutions 1920x1080,4096x2160 --transfer-mbps 100 --json formats.json
+"""
+
+import os
+import sys
+import json
+import argparse
+import importlib.util
+import tempfile
+from typing import Dict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(BENCH_DIR), "ComfyUI_Flame_2023-2025.2.x")
+sys.path.insert(0, PACKAGE_DIR)
+
+from comfyui_extensions import SmartMediaManager
+
+def apply_transfer_rate(results: Dict, mbps: float) -> Dict:
+    """Recompute transfer costs for a link of `mbps` megabits per second each way"""
+    bps = mbps * 1000 * 1000 / 8
+    results = dict(results, write_bps=bps, read_bps=bps)
+    for cost in results['formats'].values():
+        cost['transfer_s'] = 2 * cost['bytes'] / bps
+        cost['total_s'] = cost['encode_s'] + cost['transfer_s'] + cost['decode_s']
+    return results
+
+def pick(results: Dict, workflow_type) -> str:
+    candidates = SmartMediaManager.TRANSPORT_FORMATS[workflow_type]
+    return min((f.value for f in candidates), key=lambda name: results['formats'][name]['total_s'])
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark transport formats for frames sent to ComfyUI")
+    parser.add_argument('--dir', default=tempfile.gettempdir(), help='Directory frames go through')
+    parser.add_argument('--resolutions', default='1280x720,1920x1080,3840x2160')
+    parser.add_argument('--samples', type=int, default=2)
+    parser.add_argument('--transfer-mbps', type=float, help='Assume this link speed instead of measuring --dir')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    if importlib.util.find_spec("PIL") is None:
+        print("Pillow is required: pip install Pillow")
+        sys.exit(1)
+
+    all_results = []
+    for resolution in [r.strip() for r in args.resolutions.split(',') if r.strip()]:
+        width, height = (int(v) for v in resolution.lower().split('x'))
+        results = SmartMediaManager.benchmark_formats(os.path.expanduser(args.dir), width, height,
+                                                      samples=args.samples)
+        if args.transfer_mbps:
+            results = apply_transfer_rate(results, args.transfer_mbps)
+        all_results.append(results)
+
+        read = f"{results['read_bps'] / 1e6:.0f} MB/s" if 'read_bps' in results else "not measured"
+        print(f"\n{width}x{height}  write {results['write_bps'] / 1e6:.0f} MB/s  read {read}")
+        print(f"{'format':>8}  {'encode ms':>10}  {'transfer ms':>11}  {'decode ms':>10}  {'total ms':>9}  {'MB':>7}")
+        for name, cost in results['formats'].items():
+            print(f"{name:>8}  {cost['encode_s'] * 1000:>10.1f}  {cost['transfer_s'] * 1000:>11.1f}  "
+                  f"{cost['decode_s'] * 1000:>10.1f}  {cost['total_s'] * 1000:>9.1f}  {cost['bytes'] / 1e6:>7.2f}")
+        choices = ", ".join(f"{workflow_type or 'other'}: {pick(results, workflow_type)}"
+                            for workflow_type in SmartMediaManager.TRANSPORT_FORMATS)
+        print(f"  picks -> {choices}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': all_results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
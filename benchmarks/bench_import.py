@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Import-time budget for the hook
+
+Flame imports every hook on startup and on each Shift-Ctrl-H-P reload, so
+importing network_comfyui and calling get_media_panel_custom_ui_actions must
+stay cheap and side-effect free. Each run happens in a fresh interpreter
+(with the headless flame module from fake_flame/, and the standard library
+modules Flame has already loaded) and checks that:
+  - import + menu registration stays under the time budget (median of runs)
+  - no heavy module is loaded (Qt, Pillow, requests, websocket, the extensions)
+  - no thread is started, no directory is created and the log is not touched
+
+Exits with status 1 when a check fails, so it can run in CI or before a release.
+
+Usage:
+    python bench_import.py
+    python bench_import.py --runs 10 --budget-ms 40 --json import.json
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import statistics
+import subprocess
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(BENCH_DIR), "ComfyUI_Flame_2023-2025.2.x")
+
+# Loaded on first use only
+LAZY_MODULES = ('PySide2', 'PySide6', 'PIL', 'numpy', 'requests', 'websocket', 'urllib.request',
+                'http.client', 'comfyui_extensions', 'comfyui_pyflame_ui')
+
+CHILD_SCRIPT = r'''
+import json, os, sys, threading, time
+sys.path.insert(0, {package_dir!r})
+sys.path.insert(0, {fake_flame_dir!r})
+import flame
+# Flame's interpreter has these loaded long before it scans the hooks
+import base64, contextlib, copy, datetime, hashlib, json, platform, re, shutil, socket
+import subprocess, tempfile, traceback, uuid
+
+log_path = "/tmp/flame_comfyui_final.log"
+log_mtime = os.path.getmtime(log_path) if os.path.exists(log_path) else None
+threads = threading.active_count()
+modules = set(sys.modules)
+
+started = time.perf_counter()
+import network_comfyui
+imported = time.perf_counter()
+actions = network_comfyui.get_media_panel_custom_ui_actions()
+registered = time.perf_counter()
+
+print(json.dumps({{
+    'import_ms': (imported - started) * 1000.0,
+    'register_ms': (registered - imported) * 1000.0,
+    'actions': len(actions),
+    'new_modules': sorted(set(sys.modules) - modules),
+    'new_threads': threading.active_count() - threads,
+    'log_touched': (os.path.getmtime(log_path) if os.path.exists(log_path) else None) != log_mtime,
+    'initialized': network_comfyui._initialized,
+}}))
+'''
+
+def run_once(work_dir: str) -> Dict:
+    """Import the hook in a fresh interpreter and return its measurements"""
+    config_path = os.path.join(work_dir, "hook_config.json")
+    with open(config_path, 'w') as f:
+        json.dump({
+            "input_dir": os.path.join(work_dir, "created", "input"),
+            "output_dir": os.path.join(work_dir, "created", "output"),
+            "temp_dir": os.path.join(work_dir, "created", "temp"),
+            "workflows_dir": os.path.join(work_dir, "created", "workflows")
+        }, f)
+    env = dict(os.environ, FLAME_COMFYUI_CONFIG=config_path, PYTHONDONTWRITEBYTECODE="1")
+    script = CHILD_SCRIPT.format(package_dir=PACKAGE_DIR, fake_flame_dir=os.path.join(BENCH_DIR, "fake_flame"))
+    output = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True)
+    if output.returncode != 0:
+        raise RuntimeError(f"Hook import failed:\n{output.stderr}")
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result['created_dirs'] = os.path.exists(os.path.join(work_dir, "created"))
+    return result
+
+def check(results: List[Dict], budget_ms: float) -> List[str]:
+    """Budget violations, as readable lines"""
+    problems = []
+    median_ms = statistics.median(r['import_ms'] + r['register_ms'] for r in results)
+    if median_ms > budget_ms:
+        problems.append(f"import + registration took {median_ms:.1f} ms (budget {budget_ms:.1f} ms)")
+
+    first = results[0]
+    loaded = sorted({m for r in results for m in r['new_modules']
+                     if m.split('.')[0] in LAZY_MODULES or m in LAZY_MODULES})
+    if loaded:
+        problems.append(f"modules loaded at import: {', '.join(loaded)}")
+    if first['new_threads']:
+        problems.append(f"{first['new_threads']} thread(s) started at import")
+    if first['created_dirs']:
+        problems.append("config directories created at import")
+    if first['log_touched']:
+        problems.append("log file written at import")
+    if first['initialized']:
+        problems.append("initialize() ran at import")
+    if not first['actions']:
+        problems.append("get_media_panel_custom_ui_actions returned no actions")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the hook's import time and import side effects")
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to measure')
+    parser.add_argument('--budget-ms', type=float, default=60.0, help='Median import + registration budget')
+    parser.add_argument('--json', help='Write results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for _ in range(args.runs):
+        work_dir = tempfile.mkdtemp(prefix="comfyui_bench_import_")
+        try:
+            results.append(run_once(work_dir))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    import_ms = [r['import_ms'] for r in results]
+    register_ms = [r['register_ms'] for r in results]
+    print(f"import:       median {statistics.median(import_ms):7.2f} ms  max {max(import_ms):7.2f} ms")
+    print(f"registration: median {statistics.median(register_ms):7.2f} ms  max {max(register_ms):7.2f} ms")
+    print(f"modules loaded by the hook: {len(results[0]['new_modules'])}")
+
+    problems = check(results, args.budget_ms)
+    for problem in problems:
+        print(f"FAIL: {problem}")
+    if not problems:
+        print(f"OK: within {args.budget_ms:.1f} ms and no import side effects")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'results': results, 'problems': problems}, f, indent=2)
+    sys.exit(1 if problems else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+File-system and import benchmark for the hook, against the headless flame module
+
+Times the hook's own code around Flame at 100 to 100,000 frames:
+  export   - export_frame (clear the input directory, PyExporter, list the frames)
+  extract  - extract_sequence_for_vhs (export + rename to frame_%04d.jpg)
+  prepare  - prepare_sequence_for_flame on SaveImage-named outputs
+  import   - import_png_sequence (prepare + one import_clips call per sequence)
+  per_file - import_sequence_to_flame (the directory importer: one import_clips call per
+             sequence, file by file only as a last resort)
+
+The fake flame module in fake_flame/ charges a per-call and per-file import
+cost and can pace exports, so the numbers show the hook's overhead on top of
+a fixed Flame cost.
+
+Usage:
+    python bench_io.py --sizes 100,1000,10000
+    python bench_io.py --sizes 100000 --stages prepare,import --import-file-cost 0 --json io.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from typing import Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PACKAGE_DIR = os.path.join(os.path.dirname(BENCH_DIR), "ComfyUI_Flame_2023-2025.2.x")
+sys.path.insert(0, PACKAGE_DIR)
+# The fake module has to win over any real flame on the path
+sys.path.insert(0, os.path.join(BENCH_DIR, "fake_flame"))
+
+import flame
+
+STAGES = ('export', 'extract', 'prepare', 'import', 'per_file')
+
+def load_hook(work_dir: str):
+    """Import network_comfyui with its directories under work_dir"""
+    config_path = os.path.join(work_dir, "hook_config.json")
+    with open(config_path, 'w') as f:
+        json.dump({
+            "comfyui_url": "http://127.0.0.1:9",
+            "input_dir": os.path.join(work_dir, "input", "flacom"),
+            "output_dir": os.path.join(work_dir, "output"),
+            "workflows_dir": os.path.join(PACKAGE_DIR, "workflows"),
+            "temp_dir": os.path.join(work_dir, "hook_temp"),
+            "metrics_port": 0
+        }, f)
+    os.environ["FLAME_COMFYUI_CONFIG"] = config_path
+    for directory in ("input/flacom", "output/comfla", "hook_temp"):
+        os.makedirs(os.path.join(work_dir, directory), exist_ok=True)
+
+    import network_comfyui
+    network_comfyui.initialize()
+    return network_comfyui
+
+def write_saveimage_outputs(directory: str, frames: int, prefixes=("comfla",)):
+    """Files named like ComfyUI's SaveImage: <prefix>_00001_.png"""
+    for name in os.listdir(directory):
+        os.remove(os.path.join(directory, name))
+    data = flame.synthetic_frame('png', flame.settings['width'], flame.settings['height'])
+    for prefix in prefixes:
+        for index in range(1, frames + 1):
+            with open(os.path.join(directory, f"{prefix}_{index:05d}_.png"), 'wb') as f:
+                f.write(data)
+
+def run_stage(hook, stage: str, frames: int, work_dir: str) -> Dict:
+    """Set up, then time one stage at one size"""
+    flame.reset_project()
+    clip = flame.add_clip("plate", frames=frames)
+    input_dir = hook.COMFYUI_FLACOM_DIR
+    output_dir = os.path.join(hook.CONFIG["output_dir"], "comfla")
+
+    if stage == 'export':
+        call = lambda: hook.export_frame(clip, input_dir)
+    elif stage == 'extract':
+        extract_dir = os.path.join(work_dir, "extract")
+        shutil.rmtree(extract_dir, ignore_errors=True)
+        os.makedirs(extract_dir)
+        call = lambda: hook.extract_sequence_for_vhs(extract_dir, clip, 1, frames)
+    elif stage == 'prepare':
+        write_saveimage_outputs(output_dir, frames)
+        call = lambda: hook.prepare_sequence_for_flame(output_dir)
+    elif stage == 'import':
+        write_saveimage_outputs(output_dir, frames)
+        call = lambda: hook.import_png_sequence([clip])
+    elif stage == 'per_file':
+        write_saveimage_outputs(output_dir, frames)
+        call = lambda: hook.import_sequence_to_flame(output_dir)
+    else:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    flame.reset_stats()
+    started = time.perf_counter()
+    ok = call()
+    elapsed = time.perf_counter() - started
+    if hook.hook_logger:
+        hook.hook_logger.flush()
+
+    return {
+        'stage': stage,
+        'frames': frames,
+        'ok': bool(ok[0] if isinstance(ok, tuple) else ok is not False),
+        'seconds': elapsed,
+        'frames_per_s': frames / elapsed if elapsed else 0.0,
+        'export_calls': flame.stats.get('export_calls', 0),
+        'import_calls': flame.stats.get('import_calls', 0),
+        'imported_files': flame.stats.get('imported_files', 0)
+    }
+
+def print_table(results: List[Dict]):
+    columns = ('stage', 'frames', 'ok', 'seconds', 'frames_per_s', 'export_calls', 'import_calls', 'imported_files')
+    print("  ".join(f"{c:>14}" for c in columns))
+    for result in results:
+        if 'skipped' in result:
+            print(f"{'all':>14}  skipped: {result['skipped']}")
+            continue
+        print("  ".join(f"{result[c]:>14.3f}" if isinstance(result[c], float) else f"{str(result[c]):>14}"
+                        for c in columns))
+
+def main():
+    parser = argparse.ArgumentParser(description="File-system and import benchmark against a headless flame module")
+    parser.add_argument('--sizes', default='100,1000,10000', help='Comma-separated frame counts (up to 100000)')
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--width', type=int, default=256)
+    parser.add_argument('--height', type=int, default=144)
+    parser.add_argument('--export-fps', type=float, default=0.0, help='Pace PyExporter.export (0 = unpaced)')
+    parser.add_argument('--import-call-cost', type=float, default=0.05, help='Seconds per import_clips call')
+    parser.add_argument('--import-file-cost', type=float, default=0.0005, help='Seconds per imported file')
+    parser.add_argument('--json', help='Write results to this file')
+    parser.add_argument('--keep', action='store_true', help='Keep the working directory')
+    args = parser.parse_args()
+
+    flame.configure(width=args.width, height=args.height, export_fps=args.export_fps,
+                    import_call_cost=args.import_call_cost, import_file_cost=args.import_file_cost)
+    work_dir = tempfile.mkdtemp(prefix="comfyui_bench_io_")
+    results = []
+    try:
+        try:
+            hook = load_hook(work_dir)
+        except Exception as e:
+            results.append({'skipped': f"cannot import network_comfyui: {e}"})
+        else:
+            for frames in [int(s) for s in args.sizes.split(',') if s.strip()]:
+                for stage in [s.strip() for s in args.stages.split(',') if s.strip()]:
+                    results.append(run_stage(hook, stage, frames, work_dir))
+
+        print_table(results)
+        if args.json:
+            with open(args.json, 'w') as f:
+                json.dump({'args': vars(args), 'results': results}, f, indent=2)
+    finally:
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Headless stand-in for Flame's `flame` Python module
+
+Implements only what network_comfyui touches: PyExporter (writes synthetic
+frame sequences at a configurable rate and resolution), import_clips (with a
+per-call and per-file cost), projects/workspaces/desktops/reel groups/reels
+and clips, duplicate/delete, ask, PyCallback and the message helpers.
+
+Put this directory first on sys.path, then import the hook:
+
+    sys.path.insert(0, "benchmarks/fake_flame")
+    import flame
+    flame.configure(export_fps=240, import_file_cost=0.0005)
+    clip = flame.add_clip("plate", frames=1000)
+
+Settings can also come from the environment (FAKE_FLAME_EXPORT_FPS, ...).
+"""
+
+import os
+import re
+import glob
+import time
+import struct
+import tempfile
+import threading
+import zlib
+import xml.etree.ElementTree as ElementTree
+from typing import Dict, List
+
+# =============================================================================
+# SETTINGS
+# =============================================================================
+
+settings = {
+    'version': os.getenv('FAKE_FLAME_VERSION', '2025.2'),
+    'width': int(os.getenv('FAKE_FLAME_WIDTH', '256')),
+    'height': int(os.getenv('FAKE_FLAME_HEIGHT', '144')),
+    # Frames written per second by PyExporter.export (0 = as fast as the disk allows)
+    'export_fps': float(os.getenv('FAKE_FLAME_EXPORT_FPS', '0')),
+    # Seconds per import_clips call and per imported file
+    'import_call_cost': float(os.getenv('FAKE_FLAME_IMPORT_CALL_COST', '0.05')),
+    'import_file_cost': float(os.getenv('FAKE_FLAME_IMPORT_FILE_COST', '0.0005')),
+    # Make PyExporter.export write nothing, to exercise the fallback paths
+    'export_fails': os.getenv('FAKE_FLAME_EXPORT_FAILS', '') == '1',
+    # Answer returned by flame.ask
+    'ask_answer': os.getenv('FAKE_FLAME_ASK_ANSWER', 'Create'),
+}
+
+stats: Dict[str, int] = {}
+stats_lock = threading.Lock()
+
+def configure(**kwargs):
+    """Change settings (see `settings`)"""
+    unknown = set(kwargs) - set(settings)
+    if unknown:
+        raise KeyError(f"Unknown fake flame settings: {sorted(unknown)}")
+    settings.update(kwargs)
+
+def count(name: str, amount: int = 1):
+    with stats_lock:
+        stats[name] = stats.get(name, 0) + amount
+
+def reset_stats():
+    with stats_lock:
+        stats.clear()
+
+# =============================================================================
+# SYNTHETIC FRAMES
+# =============================================================================
+
+# Preset directory name -> (extension, bytes per pixel after compression)
+PRESET_FORMATS = {
+    'Jpeg': ('jpg', 0.3),
+    'PNG': ('png', 1.5),
+    'Tiff': ('tif', 3.0),
+    'OpenEXR': ('exr', 3.0),
+    'DPX': ('dpx', 4.0),
+    'Targa': ('tga', 3.0),
+}
+
+_frame_cache: Dict[tuple, bytes] = {}
+
+def synthetic_frame(extension: str, width: int, height: int) -> bytes:
+    """Bytes of a plausible size with a valid signature for the format (cached)"""
+    key = (extension, width, height)
+    if key in _frame_cache:
+        return _frame_cache[key]
+
+    if extension == 'png':
+        def chunk(kind, data):
+            return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+        raw = (b'\x00' + b'\x40\x80\xc0' * width) * height
+        data = (b'\x89PNG\r\n\x1a\n'
+                + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+                + chunk(b'IDAT', zlib.compress(raw, 1)) + chunk(b'IEND', b''))
+    else:
+        bytes_per_pixel = dict(PRESET_FORMATS.values()).get(extension, 3.0)
+        header = {
+            'jpg': b'\xff\xd8\xff\xe0\x00\x10JFIF\x00',
+            'tif': b'II*\x00\x08\x00\x00\x00',
+            'exr': b'\x76\x2f\x31\x01\x02\x00\x00\x00',
+            'dpx': b'SDPX',
+        }.get(extension, b'')
+        trailer = b'\xff\xd9' if extension == 'jpg' else b''
+        size = max(len(header) + len(trailer), int(width * height * bytes_per_pixel))
+        data = header + bytes(size - len(header) - len(trailer)) + trailer
+
+    _frame_cache[key] = data
+    return data
+
+# =============================================================================
+# MEDIA PANEL OBJECTS
+# =============================================================================
+
+class PyTime:
+    def __init__(self, frame: int):
+        self.frame = frame
+
+    def __str__(self):
+        return str(self.frame)
+
+class PyAttribute:
+    """Flame attributes compare and print like their value"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def get_value(self):
+        return self.value
+
+    def set_value(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == (other.value if isinstance(other, PyAttribute) else other)
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def __str__(self):
+        return str(self.value)
+
+    def __repr__(self):
+        return repr(self.value)
+
+class PyClip:
+    def __init__(self, name: str, frames: int = 100, width: int = None, height: int = None,
+                 reel: 'PyReel' = None, paths: List[str] = None):
+        self.name = PyAttribute(name)
+        self.duration = PyTime(frames)
+        self.width = width or settings['width']
+        self.height = height or settings['height']
+        self.frame_rate = "24 fps"
+        self.start_frame = 1
+        self.in_mark = None
+        self.out_mark = None
+        self.reel = reel
+        # Files the clip was imported from
+        self.paths = paths or []
+
+    @property
+    def frames(self) -> int:
+        return self.duration.frame
+
+    def __repr__(self):
+        return f"<PyClip {self.name} {self.frames} frames>"
+
+class PyReel:
+    def __init__(self, name: str, parent: 'PyReelGroup' = None):
+        self.name = PyAttribute(name)
+        self.parent = parent
+        self.clips: List[PyClip] = []
+
+    def clear(self):
+        self.clips.clear()
+
+class PyReelGroup:
+    def __init__(self, name: str, reel_names=("Reel 1",)):
+        self.name = PyAttribute(name)
+        self.reels: List[PyReel] = [PyReel(n, self) for n in reel_names]
+
+    def create_reel(self, name: str) -> PyReel:
+        reel = PyReel(name, self)
+        self.reels.append(reel)
+        return reel
+
+class PyDesktop:
+    def __init__(self):
+        self.name = PyAttribute("Desktop")
+        self.reel_groups: List[PyReelGroup] = [PyReelGroup("Reels")]
+
+    def create_reel_group(self, name: str) -> PyReelGroup:
+        group = PyReelGroup(name)
+        self.reel_groups.append(group)
+        return group
+
+class PyWorkspace:
+    def __init__(self):
+        self.name = PyAttribute("Workspace")
+        self.desktop = PyDesktop()
+
+class PyProject:
+    def __init__(self, name: str = "fake_project"):
+        self.name = PyAttribute(name)
+        self.project_name = name
+        self.current_workspace = PyWorkspace()
+
+class PyProjectSelector:
+    """flame.project: both flame.project.current_project and flame.project.current_workspace work"""
+
+    def __init__(self):
+        self.current_project = PyProject()
+
+    @property
+    def current_workspace(self) -> PyWorkspace:
+        return self.current_project.current_workspace
+
+project = PyProjectSelector()
+
+def reset_project():
+    """Fresh project with one empty reel"""
+    project.current_project = PyProject()
+
+def default_reel() -> PyReel:
+    return project.current_project.current_workspace.desktop.reel_groups[0].reels[0]
+
+def add_clip(name: str = "plate", frames: int = 100, reel: PyReel = None, **kwargs) -> PyClip:
+    """Put a clip on a reel (the first one by default) and return it"""
+    reel = reel or default_reel()
+    clip = PyClip(name, frames, reel=reel, **kwargs)
+    reel.clips.append(clip)
+    return clip
+
+def find_reels(name: str = None) -> List[PyReel]:
+    reels = [r for g in project.current_project.current_workspace.desktop.reel_groups for r in g.reels]
+    return [r for r in reels if name is None or r.name == name]
+
+def duplicate(clip: PyClip) -> PyClip:
+    count('duplicate')
+    copy = PyClip(f"{clip.name}_copy", clip.frames, clip.width, clip.height, clip.reel, list(clip.paths))
+    copy.in_mark, copy.out_mark = clip.in_mark, clip.out_mark
+    if clip.reel:
+        clip.reel.clips.append(copy)
+    return copy
+
+def delete(item) -> bool:
+    count('delete')
+    reel = getattr(item, 'reel', None)
+    if reel and item in reel.clips:
+        reel.clips.remove(item)
+    return True
+
+# =============================================================================
+# EXPORT
+# =============================================================================
+
+def _preset_resize(preset_path: str):
+    """(width, height) from a preset's <resize> settings, None for the source size"""
+    try:
+        resize = ElementTree.parse(preset_path).getroot().find('.//resize')
+        width, height = int(resize.findtext('width')), int(resize.findtext('height'))
+    except Exception:
+        return None
+    return (width, height) if width > 0 and height > 0 else None
+
+class PyExporter:
+    class PresetVisibility:
+        Autodesk = 'Autodesk'
+        Shared = 'Shared'
+        Project = 'Project'
+        User = 'User'
+
+    class PresetType:
+        Image_Sequence = 'file_sequence'
+        Audio = 'audio'
+        Movie = 'movie_file'
+        Sequence_Publish = 'sequence_publish'
+
+    _presets_root = None
+
+    def __init__(self):
+        self.foreground = False
+        self.export_between_marks = False
+        self.include_setups = False
+        self.use_top_video_track = False
+        self.keep_image_files = False
+
+    @staticmethod
+    def get_presets_dir(visibility, preset_type) -> str:
+        """A temporary preset tree with one XML per format"""
+        if PyExporter._presets_root is None:
+            root = tempfile.mkdtemp(prefix="fake_flame_presets_")
+            for directory in PRESET_FORMATS:
+                os.makedirs(os.path.join(root, directory), exist_ok=True)
+            for directory, filename in (('Jpeg', 'Jpeg (8-bit).xml'), ('PNG', 'PNG (8-bit).xml'),
+                                        ('Tiff', 'Tiff (8-bit).xml'), ('OpenEXR', 'OpenEXR (16-bit fp PIZ).xml'),
+                                        ('DPX', 'DPX (10-bit).xml'), ('Targa', 'Targa (8-bit).xml')):
+                with open(os.path.join(root, directory, filename), 'w') as f:
+                    f.write('<?xml version="1.0"?>\n<preset version="12">\n'
+                            f'  <type>image</type>\n  <video>\n    <fileType>{directory}</fileType>\n'
+                            '    <resize>\n      <resizeType>fit</resizeType>\n'
+                            '      <width>0</width>\n      <height>0</height>\n    </resize>\n'
+                            '  </video>\n</preset>\n')
+            PyExporter._presets_root = root
+        return PyExporter._presets_root
+
+    def export(self, sources, preset_path: str, output_directory: str, background_job_settings=None,
+               hooks=None, hooks_user_data=None):
+        """Write the clip's frames as <clip>.<frame:08d>.<ext>, paced to export_fps"""
+        count('export_calls')
+        if settings['export_fails']:
+            return None
+
+        extension = 'jpg'
+        for directory, (ext, _) in PRESET_FORMATS.items():
+            if f"{os.sep}{directory}{os.sep}" in preset_path or os.path.basename(preset_path).startswith(directory):
+                extension = ext
+                break
+        resize = _preset_resize(preset_path)
+
+        os.makedirs(output_directory, exist_ok=True)
+        clips = sources if isinstance(sources, (list, tuple)) else [sources]
+        fps = settings['export_fps']
+        written = 0
+        started = time.perf_counter()
+        for clip in clips:
+            first, last = 1, clip.frames
+            if self.export_between_marks and clip.in_mark is not None and clip.out_mark is not None:
+                first, last = int(clip.in_mark), int(clip.out_mark)
+            data = synthetic_frame(extension, *(resize or (clip.width, clip.height)))
+            for frame in range(first, last + 1):
+                with open(os.path.join(output_directory, f"{clip.name}.{frame:08d}.{extension}"), 'wb') as f:
+                    f.write(data)
+                written += 1
+                if fps > 0:
+                    delay = started + written / fps - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+        count('exported_frames', written)
+        return True
+
+# =============================================================================
+# IMPORT
+# =============================================================================
+
+def _resolve_import_path(path: str) -> List[str]:
+    """Files for a path, a glob, a [#####] padding pattern or a [0001-0100] range"""
+    if os.path.isfile(path):
+        return [path]
+
+    directory, name = os.path.split(path)
+    range_match = re.search(r'\[(\d{2,})-(\d{2,})\]', name)
+    if range_match:
+        first, last = int(range_match.group(1)), int(range_match.group(2))
+        width = len(range_match.group(1))
+        return [os.path.join(directory, name[:range_match.start()] + f"{frame:0{width}d}" + name[range_match.end():])
+                for frame in range(first, last + 1)
+                if os.path.isfile(os.path.join(directory, name[:range_match.start()] + f"{frame:0{width}d}" + name[range_match.end():]))]
+
+    hash_match = re.search(r'\[(#+)\]', name)
+    if hash_match:
+        pattern = re.compile(re.escape(name[:hash_match.start()]) + rf"\d{{{len(hash_match.group(1))}}}"
+                             + re.escape(name[hash_match.end():]) + "$")
+        return sorted(os.path.join(directory, f) for f in os.listdir(directory or ".") if pattern.match(f))
+
+    return sorted(glob.glob(path))
+
+def import_clips(paths, destination=None) -> List[PyClip]:
+    """
+    Import files as clips. A list or pattern of numbered frames becomes one clip.
+    Costs import_call_cost per call plus import_file_cost per file.
+    """
+    count('import_calls')
+    files = []
+    for path in (paths if isinstance(paths, (list, tuple)) else [paths]):
+        files.extend(_resolve_import_path(str(path)))
+
+    time.sleep(settings['import_call_cost'] + settings['import_file_cost'] * len(files))
+    count('imported_files', len(files))
+    if not files:
+        return []
+
+    name = re.sub(r'[._]?\d+[._]*\.\w+$', '', os.path.basename(files[0])) or os.path.basename(files[0])
+    reel = destination if isinstance(destination, PyReel) else default_reel()
+    clip = PyClip(name, len(files), reel=reel, paths=files)
+    reel.clips.append(clip)
+    return [clip]
+
+# =============================================================================
+# UI AND MISC
+# =============================================================================
+
+messages: List[str] = []
+
+def ask(title: str, message: str, buttons=None, *args, **kwargs):
+    count('ask')
+    return settings['ask_answer']
+
+def message(text: str, *args, **kwargs):
+    messages.append(str(text))
+
+def show_message(title: str, text: str = "", *args, **kwargs):
+    messages.append(f"{title}: {text}")
+
+def execute_command(command: str, *args, **kwargs):
+    messages.append(str(command))
+    return True
+
+def PyCallback(function, *args, **kwargs):
+    """Flame runs the callback on its main thread; headless, run it now"""
+    count('callbacks')
+    function(*args, **kwargs)
+
+def get_version() -> str:
+    return settings['version']
+
+def get_version_major() -> str:
+    return settings['version'].split('.')[0]
+
+class _Version:
+    def __str__(self):
+        return settings['version']
+
+version = _Version()
@@ -0,0 +1,599 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Mock ComfyUI server for benchmarking without a GPU
+
+Implements the parts of the ComfyUI HTTP and WebSocket API used by the
+Flame integration: /prompt, /history, /queue, /view, /upload/image,
+/system_stats, /interrupt, /free and /ws. Prompts are "executed" in
+dependency order with configurable per-node latency, optional failure
+injection, and real PNG outputs written the way SaveImage names them.
+
+Usage:
+    python mock_comfyui_server.py --port 8188 --root /tmp/mock_comfyui \\
+        --node-latency KSampler=0.05 --failure-rate 0.1
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import zlib
+import base64
+import random
+import struct
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict, deque
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.tif', '.tiff', '.exr', '.dpx')
+SAVE_NODE_TYPES = ('SaveImage', 'SaveImageWithAlpha')
+# Nodes that report sampling steps (and send previews) while they run
+STEPPED_NODE_HINTS = ('Sampler', 'Upscale', 'VFI', 'Interpolate')
+
+# =============================================================================
+# PNG OUTPUT
+# =============================================================================
+
+_png_cache: Dict[tuple, bytes] = {}
+
+def make_png(width: int = 64, height: int = 64, alpha: bool = True) -> bytes:
+    """Smallest valid RGB(A) PNG of a given size (cached)"""
+    key = (width, height, alpha)
+    if key in _png_cache:
+        return _png_cache[key]
+
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+    channels = 4 if alpha else 3
+    row = b'\x00' + b'\x80' * (width * channels)
+    header = struct.pack('>IIBBBBB', width, height, 8, 6 if alpha else 2, 0, 0, 0)
+    png = (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', header)
+           + chunk(b'IDAT', zlib.compress(row * height, 1)) + chunk(b'IEND', b''))
+    _png_cache[key] = png
+    return png
+
+# =============================================================================
+# WEBSOCKET
+# =============================================================================
+
+class WebSocketClient:
+    """Server side of one /ws connection (unmasked frames out, masked frames in)"""
+
+    def __init__(self, client_id: str, connection, rfile):
+        self.client_id = client_id
+        self.connection = connection
+        self.rfile = rfile
+        self.send_lock = threading.Lock()
+        self.open = True
+
+    def send_frame(self, opcode: int, payload: bytes):
+        length = len(payload)
+        if length < 126:
+            header = struct.pack('>BB', 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack('>BBH', 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack('>BBQ', 0x80 | opcode, 127, length)
+        try:
+            with self.send_lock:
+                self.connection.sendall(header + payload)
+        except OSError:
+            self.open = False
+
+    def send_json(self, message: Dict):
+        self.send_frame(0x1, json.dumps(message).encode('utf-8'))
+
+    def send_binary(self, payload: bytes):
+        self.send_frame(0x2, payload)
+
+    def read_frame(self) -> Optional[tuple]:
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None
+        opcode = header[0] & 0x0f
+        masked = header[1] & 0x80
+        length = header[1] & 0x7f
+        if length == 126:
+            length = struct.unpack('>H', self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack('>Q', self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if masked else b'\x00\x00\x00\x00'
+        payload = bytearray(self.rfile.read(length))
+        for i in range(len(payload)):
+            payload[i] ^= mask[i % 4]
+        return opcode, bytes(payload)
+
+    def serve(self):
+        """Answer pings and closes until the client goes away"""
+        while self.open:
+            try:
+                frame = self.read_frame()
+            except (OSError, struct.error):
+                frame = None
+            if frame is None:
+                break
+            opcode, payload = frame
+            if opcode == 0x8:
+                self.send_frame(0x8, payload[:2])
+                break
+            if opcode == 0x9:
+                self.send_frame(0xA, payload)
+        self.open = False
+
+# =============================================================================
+# MOCK SERVER
+# =============================================================================
+
+class MockComfyUI:
+    """
+    In-process ComfyUI stand-in.
+
+    Args:
+        root: ComfyUI base directory; outputs go to <root>/output, uploads to <root>/input
+        node_latency: class_type -> seconds per frame (default_latency for other nodes)
+        failure_rate: Probability that a prompt fails with execution_error
+        http_error_rate: Probability that POST /prompt answers 500 (exercises client retries)
+        send_previews: Send binary preview frames while stepped nodes run
+        default_frames: Frame count when a prompt has no VHS_LoadImagesPath directory
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8188, root: str = "/tmp/mock_comfyui",
+                 node_latency: Dict[str, float] = None, default_latency: float = 0.001,
+                 failure_rate: float = 0.0, http_error_rate: float = 0.0, send_previews: bool = False,
+                 default_frames: int = 1, output_size: tuple = (64, 64), seed: Optional[int] = None):
+        self.host = host
+        self.port = port
+        self.root = os.path.abspath(root)
+        self.output_dir = os.path.join(self.root, "output")
+        self.input_dir = os.path.join(self.root, "input")
+        self.node_latency = node_latency or {}
+        self.default_latency = default_latency
+        self.failure_rate = failure_rate
+        self.http_error_rate = http_error_rate
+        self.send_previews = send_previews
+        self.default_frames = default_frames
+        self.output_size = output_size
+        self.random = random.Random(seed)
+
+        self.lock = threading.Condition()
+        self.pending: "OrderedDict[str, Dict]" = OrderedDict()
+        self.running: Optional[Dict] = None
+        self.history: Dict[str, Dict] = {}
+        self.clients: List[WebSocketClient] = []
+        self.number = 0
+        self.interrupted = False
+        self.stats = {'prompts': 0, 'frames': 0, 'failures': 0, 'http_errors': 0}
+        self.httpd = None
+        self.stopped = False
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        os.makedirs(self.input_dir, exist_ok=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    # -- lifecycle ---------------------------------------------------------
+
+    def start(self) -> 'MockComfyUI':
+        """Serve on a background thread; port 0 picks a free port"""
+        self.httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, name=f"mock-comfyui-{self.port}", daemon=True).start()
+        threading.Thread(target=self._execute_loop, name=f"mock-executor-{self.port}", daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        if self.httpd:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+        with self.lock:
+            for client in self.clients:
+                client.open = False
+            self.lock.notify_all()
+
+    # -- queue -------------------------------------------------------------
+
+    def submit(self, prompt: Dict, client_id: Optional[str]) -> Dict:
+        prompt_id = str(uuid.uuid4())
+        with self.lock:
+            self.number += 1
+            self.pending[prompt_id] = {
+                'prompt_id': prompt_id,
+                'number': self.number,
+                'prompt': prompt,
+                'client_id': client_id,
+                'submitted': time.time()
+            }
+            self.lock.notify_all()
+        self.broadcast_status()
+        return {'prompt_id': prompt_id, 'number': self.number, 'node_errors': {}}
+
+    def queue_state(self) -> Dict:
+        def entry(item):
+            return [item['number'], item['prompt_id'], item['prompt'], {'client_id': item['client_id']}, []]
+        with self.lock:
+            return {
+                'queue_running': [entry(self.running)] if self.running else [],
+                'queue_pending': [entry(item) for item in self.pending.values()]
+            }
+
+    def _execute_loop(self):
+        while True:
+            with self.lock:
+                while not self.pending:
+                    if self.stopped:
+                        return
+                    self.lock.wait(0.5)
+                _, item = self.pending.popitem(last=False)
+                self.running = item
+                self.interrupted = False
+            try:
+                self._execute(item)
+            except Exception as e:
+                self._finish(item, 'error', {}, [('execution_error', {'exception_message': str(e)})])
+            with self.lock:
+                self.running = None
+            self.broadcast_status()
+
+    def _execute(self, item: Dict):
+        prompt_id = item['prompt_id']
+        prompt = item['prompt']
+        client_id = item['client_id']
+        order = topological_order(prompt)
+        frames = self._frame_count(prompt)
+        fail_at = self.random.randrange(len(order)) if order and self.random.random() < self.failure_rate else None
+
+        self.send(client_id, {'type': 'execution_start', 'data': {'prompt_id': prompt_id, 'timestamp': _ms()}})
+        self.send(client_id, {'type': 'execution_cached', 'data': {'nodes': [], 'prompt_id': prompt_id, 'timestamp': _ms()}})
+
+        outputs: Dict[str, Dict] = {}
+        for index, node_id in enumerate(order):
+            node = prompt[node_id]
+            class_type = node.get('class_type', '')
+            self.send(client_id, {'type': 'executing', 'data': {'node': node_id, 'display_node': node_id, 'prompt_id': prompt_id}})
+
+            if self.interrupted:
+                self._finish(item, 'error', outputs, [('execution_interrupted', {'node_id': node_id})])
+                return
+            if index == fail_at:
+                self.stats['failures'] += 1
+                self._finish(item, 'error', outputs, [('execution_error', {
+                    'node_id': node_id, 'node_type': class_type, 'exception_message': 'Injected failure'
+                })])
+                return
+
+            self._run_node(client_id, prompt_id, node_id, class_type, frames)
+
+            if class_type in SAVE_NODE_TYPES:
+                images = self._write_outputs(node.get('inputs', {}).get('filename_prefix', 'ComfyUI'), frames)
+                outputs[node_id] = {'images': images}
+                self.send(client_id, {'type': 'executed', 'data': {
+                    'node': node_id, 'display_node': node_id, 'output': outputs[node_id], 'prompt_id': prompt_id
+                }})
+
+        self.stats['prompts'] += 1
+        self.stats['frames'] += frames
+        self._finish(item, 'success', outputs, [])
+
+    def _run_node(self, client_id, prompt_id, node_id, class_type, frames):
+        duration = self.node_latency.get(class_type, self.default_latency) * frames
+        if not any(hint in class_type for hint in STEPPED_NODE_HINTS):
+            time.sleep(duration)
+            return
+        steps = max(1, min(frames, 20))
+        for step in range(1, steps + 1):
+            time.sleep(duration / steps)
+            self.send(client_id, {'type': 'progress', 'data': {
+                'value': step, 'max': steps, 'prompt_id': prompt_id, 'node': node_id
+            }})
+            if self.send_previews:
+                # PREVIEW_IMAGE: event type 1, image type 2 (PNG)
+                self.send_binary(client_id, struct.pack('>II', 1, 2) + make_png(32, 32, alpha=False))
+
+    def _finish(self, item: Dict, status: str, outputs: Dict, messages: List[tuple]):
+        prompt_id = item['prompt_id']
+        client_id = item['client_id']
+        for kind, data in messages:
+            self.send(client_id, {'type': kind, 'data': {'prompt_id': prompt_id, 'timestamp': _ms(), **data}})
+        with self.lock:
+            self.history[prompt_id] = {
+                'prompt': [item['number'], prompt_id, item['prompt'], {'client_id': client_id}, list(outputs)],
+                'outputs': outputs,
+                'status': {
+                    'status_str': status,
+                    'completed': status == 'success',
+                    'messages': [[kind, data] for kind, data in messages]
+                }
+            }
+        if status == 'success':
+            self.send(client_id, {'type': 'execution_success', 'data': {'prompt_id': prompt_id, 'timestamp': _ms()}})
+        self.send(client_id, {'type': 'executing', 'data': {'node': None, 'prompt_id': prompt_id}})
+
+    def _frame_count(self, prompt: Dict) -> int:
+        """Frames a VHS_LoadImagesPath node would load, honouring skip/cap/nth"""
+        for node in prompt.values():
+            if not isinstance(node, dict) or node.get('class_type') != 'VHS_LoadImagesPath':
+                continue
+            inputs = node.get('inputs', {})
+            directory = inputs.get('directory', '')
+            if not os.path.isabs(directory):
+                directory = os.path.join(self.root, directory)
+            if not os.path.isdir(directory):
+                return self.default_frames
+            files = sorted(f for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+            files = files[int(inputs.get('skip_first_images', 0) or 0)::max(1, int(inputs.get('select_every_nth', 1) or 1))]
+            cap = int(inputs.get('image_load_cap', 0) or 0)
+            return len(files[:cap] if cap else files)
+        return self.default_frames
+
+    def _write_outputs(self, prefix: str, frames: int) -> List[Dict]:
+        """Write frames the way SaveImage does: <prefix>_<counter:05d>_.png, counter continuing"""
+        subfolder, base = os.path.split(prefix)
+        directory = os.path.join(self.output_dir, subfolder)
+        os.makedirs(directory, exist_ok=True)
+        pattern = re.compile(rf"^{re.escape(base)}_(\d+)_\.png$")
+        with self.lock:
+            counter = max([int(m.group(1)) for m in map(pattern.match, os.listdir(directory)) if m] or [0]) + 1
+            png = make_png(*self.output_size)
+            images = []
+            for index in range(frames):
+                filename = f"{base}_{counter + index:05d}_.png"
+                with open(os.path.join(directory, filename), 'wb') as f:
+                    f.write(png)
+                images.append({'filename': filename, 'subfolder': subfolder, 'type': 'output'})
+        return images
+
+    # -- websocket ---------------------------------------------------------
+
+    def send(self, client_id: Optional[str], message: Dict):
+        """Send to the submitting client (ComfyUI routes prompt events by client_id)"""
+        with self.lock:
+            clients = [c for c in self.clients if c.open and (client_id is None or c.client_id == client_id)]
+        for client in clients:
+            client.send_json(message)
+
+    def send_binary(self, client_id: Optional[str], payload: bytes):
+        with self.lock:
+            clients = [c for c in self.clients if c.open and (client_id is None or c.client_id == client_id)]
+        for client in clients:
+            client.send_binary(payload)
+
+    def broadcast_status(self):
+        with self.lock:
+            remaining = len(self.pending) + (1 if self.running else 0)
+        self.send(None, {'type': 'status', 'data': {'status': {'exec_info': {'queue_remaining': remaining}}}})
+
+    def drop_connections(self):
+        """Close every WebSocket, e.g. to exercise client reconnection"""
+        with self.lock:
+            clients = list(self.clients)
+        for client in clients:
+            client.send_frame(0x8, struct.pack('>H', 1001))
+            try:
+                client.connection.shutdown(2)
+            except OSError:
+                pass
+
+    # -- HTTP --------------------------------------------------------------
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status: int, body, content_type: str = 'application/json'):
+                data = body if isinstance(body, bytes) else json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                path = url.path
+
+                if path == '/ws':
+                    self._websocket(query.get('clientId', [None])[0] or uuid.uuid4().hex)
+                elif path == '/history':
+                    with server.lock:
+                        self._send(200, dict(server.history))
+                elif path.startswith('/history/'):
+                    prompt_id = path[len('/history/'):]
+                    with server.lock:
+                        entry = server.history.get(prompt_id)
+                    self._send(200, {prompt_id: entry} if entry else {})
+                elif path == '/queue':
+                    self._send(200, server.queue_state())
+                elif path == '/view':
+                    self._view(query)
+                elif path == '/system_stats':
+                    self._send(200, {
+                        'system': {'os': 'mock', 'python_version': 'mock', 'embedded_python': False},
+                        'devices': [{'name': 'mock', 'type': 'cpu', 'index': 0,
+                                     'vram_total': 24 * 2**30, 'vram_free': 20 * 2**30,
+                                     'torch_vram_total': 0, 'torch_vram_free': 0}]
+                    })
+                elif path == '/stats':
+                    self._send(200, server.stats)
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def do_POST(self):
+                path = urlparse(self.path).path
+                body = self._body()
+
+                if path == '/prompt':
+                    if server.random.random() < server.http_error_rate:
+                        server.stats['http_errors'] += 1
+                        self._send(500, {'error': 'Injected HTTP error'})
+                        return
+                    try:
+                        request = json.loads(body or b'{}')
+                    except ValueError:
+                        self._send(400, {'error': 'invalid json'})
+                        return
+                    prompt = request.get('prompt')
+                    if not isinstance(prompt, dict) or not prompt:
+                        self._send(400, {'error': {'type': 'no_prompt', 'message': 'No prompt provided'}})
+                        return
+                    self._send(200, server.submit(prompt, request.get('client_id')))
+                elif path == '/queue':
+                    request = json.loads(body or b'{}')
+                    with server.lock:
+                        if request.get('clear'):
+                            server.pending.clear()
+                        for prompt_id in request.get('delete', []):
+                            server.pending.pop(prompt_id, None)
+                    self._send(200, {})
+                elif path == '/interrupt':
+                    server.interrupted = True
+                    self._send(200, {})
+                elif path == '/free':
+                    self._send(200, {})
+                elif path == '/upload/image':
+                    self._upload(body)
+                else:
+                    self._send(404, {'error': 'not found'})
+
+            def _view(self, query):
+                filename = os.path.basename(query.get('filename', [''])[0])
+                subfolder = query.get('subfolder', [''])[0]
+                kind = query.get('type', ['output'])[0]
+                base = {'output': server.output_dir, 'input': server.input_dir}.get(kind, os.path.join(server.root, 'temp'))
+                path = os.path.normpath(os.path.join(base, subfolder, filename))
+                if not path.startswith(base) or not os.path.isfile(path):
+                    self._send(404, {'error': 'not found'})
+                    return
+                with open(path, 'rb') as f:
+                    self._send(200, f.read(), 'image/png')
+
+            def _upload(self, body: bytes):
+                content_type = self.headers.get('Content-Type', '')
+                message = BytesParser(policy=HTTP).parsebytes(
+                    f"Content-Type: {content_type}\r\n\r\n".encode('latin-1') + body)
+                fields = {}
+                for part in message.iter_parts():
+                    name = part.get_param('name', header='content-disposition')
+                    fields[name] = (part.get_filename(), part.get_payload(decode=True))
+                if 'image' not in fields or not fields['image'][0]:
+                    self._send(400, {'error': 'no image'})
+                    return
+                subfolder = (fields.get('subfolder', (None, b''))[1] or b'').decode()
+                filename = os.path.basename(fields['image'][0])
+                directory = os.path.join(server.input_dir, subfolder)
+                os.makedirs(directory, exist_ok=True)
+                with open(os.path.join(directory, filename), 'wb') as f:
+                    f.write(fields['image'][1])
+                self._send(200, {'name': filename, 'subfolder': subfolder, 'type': 'input'})
+
+            def _websocket(self, client_id: str):
+                key = self.headers.get('Sec-WebSocket-Key')
+                if not key:
+                    self._send(400, {'error': 'websocket upgrade required'})
+                    return
+                accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+                self.send_response(101, 'Switching Protocols')
+                self.send_header('Upgrade', 'websocket')
+                self.send_header('Connection', 'Upgrade')
+                self.send_header('Sec-WebSocket-Accept', accept)
+                self.end_headers()
+                self.wfile.flush()
+
+                client = WebSocketClient(client_id, self.connection, self.rfile)
+                with server.lock:
+                    server.clients.append(client)
+                client.send_json({'type': 'status', 'data': {'status': {'exec_info': {'queue_remaining': 0}}, 'sid': client_id}})
+                try:
+                    client.serve()
+                finally:
+                    with server.lock:
+                        server.clients.remove(client)
+                    self.close_connection = True
+
+        return Handler
+
+def topological_order(prompt: Dict) -> List[str]:
+    """Node ids in dependency order (inputs of the form [node_id, output_index])"""
+    dependencies = {}
+    for node_id, node in prompt.items():
+        if not isinstance(node, dict):
+            continue
+        deps = set()
+        for value in node.get('inputs', {}).values():
+            if isinstance(value, list) and len(value) == 2 and str(value[0]) in prompt:
+                deps.add(str(value[0]))
+        dependencies[str(node_id)] = deps
+
+    order = []
+    ready = deque(sorted(n for n, deps in dependencies.items() if not deps))
+    remaining = {n: set(deps) for n, deps in dependencies.items() if deps}
+    while ready:
+        node_id = ready.popleft()
+        order.append(node_id)
+        for other in sorted(remaining):
+            remaining[other].discard(node_id)
+            if not remaining[other]:
+                del remaining[other]
+                ready.append(other)
+    # Cycles: run what is left in file order
+    return order + [n for n in dependencies if n not in order]
+
+def _ms() -> int:
+    return int(time.time() * 1000)
+
+def parse_latency(values: List[str]) -> Dict[str, float]:
+    latency = {}
+    for value in values or []:
+        class_type, _, seconds = value.partition('=')
+        latency[class_type] = float(seconds)
+    return latency
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock ComfyUI server for benchmarks")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8188)
+    parser.add_argument('--root', default='/tmp/mock_comfyui', help='ComfyUI base directory')
+    parser.add_argument('--node-latency', action='append', metavar='CLASS=SECONDS',
+                        help='Seconds per frame for a node class (repeatable)')
+    parser.add_argument('--default-latency', type=float, default=0.001, help='Seconds per frame for other nodes')
+    parser.add_argument('--failure-rate', type=float, default=0.0)
+    parser.add_argument('--http-error-rate', type=float, default=0.0)
+    parser.add_argument('--previews', action='store_true', help='Send binary preview frames')
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = MockComfyUI(args.host, args.port, args.root, parse_latency(args.node_latency), args.default_latency,
+                         args.failure_rate, args.http_error_rate, args.previews, seed=args.seed).start()
+    print(f"Mock ComfyUI listening on {server.url} (root {server.root})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -52,11 +52,14 @@ fi
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 FLAME_PYTHON_DIR="/opt/Autodesk/shared/python"
 WORKFLOWS_DIR="${FLAME_PYTHON_DIR}/comfyui_workflows"
+# Hors du répertoire des hooks: Flame n'y importe rien (ni PySide) au démarrage
+UI_DIR="/opt/Autodesk/shared/comfyui_flame"
 SOURCE_DIR="${SCRIPT_DIR}/ComfyUI_Flame_2023-2025.2.x"
 
 # Chemins des fichiers sources
 HOOK_FILE="${SOURCE_DIR}/network_comfyui.py"
 EXTENSIONS_FILE="${SOURCE_DIR}/comfyui_extensions.py"
+UI_FILE="${SOURCE_DIR}/comfyui_pyflame_ui.py"
 CONFIG_FILE="${SOURCE_DIR}/flame_comfyui_config.json"
 WORKFLOWS_SOURCE="${SOURCE_DIR}/workflows"
 
@@ -156,6 +159,15 @@ install_main_files() {
     $SUDO chmod 755 "${FLAME_PYTHON_DIR}/network_comfyui.py"
     log_success "  Hook installé"
 
+    # Copier les composants d'interface (chargés par le hook à l'ouverture des dialogues)
+    log_info "  • Copie de comfyui_pyflame_ui.py..."
+    $SUDO mkdir -p "$UI_DIR"
+    $SUDO cp "$UI_FILE" "${UI_DIR}/"
+    $SUDO chmod 644 "${UI_DIR}/comfyui_pyflame_ui.py"
+    # Une copie laissée par une installation précédente serait importée par Flame
+    $SUDO rm -f "${FLAME_PYTHON_DIR}/comfyui_pyflame_ui.py"
+    log_success "  Interface installée"
+
     # Copier le module d'extensions
     if [ -f "$EXTENSIONS_FILE" ]; then
         log_info "  • Copie de comfyui_extensions.py..."
@@ -298,6 +310,7 @@ show_post_install_instructions() {
     echo "═══════════════════════════════════════════════════════════════"
     echo ""
     echo "Hook:        ${FLAME_PYTHON_DIR}/network_comfyui.py"
+    echo "Interface:   ${UI_DIR}/comfyui_pyflame_ui.py"
     echo "Extensions:  ${FLAME_PYTHON_DIR}/comfyui_extensions.py"
     echo "Config:      ${FLAME_PYTHON_DIR}/flame_comfyui_config.json"
     echo "Workflows:   ${WORKFLOWS_DIR}/"
@@ -19,6 +19,7 @@ NC='\033[0m'
 # Variables
 FLAME_PYTHON_DIR="/opt/Autodesk/shared/python"
 WORKFLOWS_DIR="${FLAME_PYTHON_DIR}/comfyui_workflows"
+UI_DIR="/opt/Autodesk/shared/comfyui_flame"
 CONFIG_FILE="${FLAME_PYTHON_DIR}/flame_comfyui_config.json"
 LOG_FILE="/tmp/flame_comfyui_final.log"
 
@@ -72,6 +73,8 @@ echo ""
 # Section 1: Fichiers d'installation
 echo -e "${CYAN}━━━ 1. FICHIERS D'INSTALLATION ━━━${NC}"
 test_item "Hook principal installé" "[ -f ${FLAME_PYTHON_DIR}/network_comfyui.py ]"
+test_item "Composants d'interface installés" "[ -f ${UI_DIR}/comfyui_pyflame_ui.py ]"
+test_item "Interface absente du répertoire des hooks" "[ ! -f ${FLAME_PYTHON_DIR}/comfyui_pyflame_ui.py ]"
 test_item "Module d'extensions installé" "[ -f ${FLAME_PYTHON_DIR}/comfyui_extensions.py ]"
 test_item "Configuration installée" "[ -f ${CONFIG_FILE} ]"
 test_item "Répertoire workflows existe" "[ -d ${WORKFLOWS_DIR} ]"